@@ -1,3 +1,4 @@
+from azure.search.documents import SearchClient
 from azure.search.documents.indexes import SearchIndexClient
 from azure.core.credentials import AzureKeyCredential
 from config import get_settings
@@ -10,3 +11,14 @@ def get_search_client():
         endpoint=settings.azure_search_endpoint, credential=credential
     )
     return client
+
+
+def get_documents_client(index_name: str):
+    settings = get_settings()
+    credential = AzureKeyCredential(settings.azure_search_admin_key)
+    client = SearchClient(
+        endpoint=settings.azure_search_endpoint,
+        index_name=index_name,
+        credential=credential,
+    )
+    return client
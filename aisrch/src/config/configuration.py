@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -17,6 +18,29 @@ class Settings(BaseSettings):
     openai_embeddings_deployment_id: str
     openai_embeddings_model_name: str
     openai_resource_uri: str
+    azure_search_indexer_parsing_mode: str = "json"
+    openai_embeddings_dimensions: int = 0
+    azure_search_vector_type: Literal["Single", "Half"] = "Single"
+    azure_search_vector_compression: Literal["none", "scalar", "binary"] = "none"
+    azure_search_vector_rescore: bool = True
+    azure_search_vector_oversampling: float = 0.0
+    azure_search_vector_stored: bool = True
+    azure_search_hnsw_m: int = 4
+    azure_search_hnsw_ef_construction: int = 400
+    azure_search_hnsw_ef_search: int = 500
+    azure_search_indexer_batch_size: int = 0
+    azure_search_indexer_schedule_minutes: int = 0
+    azure_search_indexer_max_failed_items: int = 0
+    azure_search_indexer_max_failed_items_per_batch: int = 0
+    azure_search_indexer_execution_environment: Literal["standard", "private"] = (
+        "standard"
+    )
+    azure_search_alias_name: str = ""
+    azure_search_alias_api_version: str = "2024-05-01-preview"
+    azure_search_deploy_min_document_ratio: float = 0.95
+    azure_search_deploy_max_latency_ms: float = 1000.0
+    azure_search_deploy_sample_queries: int = 10
+    azure_search_deploy_keep_versions: int = 1
 
     class Config:
         env_file = "../.env"
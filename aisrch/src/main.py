@@ -1,21 +1,89 @@
-from services.index_service import create_or_update_index
-from services.datasource_service import create_or_update_datasource
-from services.skillset_service import create_or_update_skillset
-from services.indexer_service import create_or_update_indexer
-
+import argparse
 import logging
+import sys
+
+from services.deployment_service import deploy, drop_unversioned, rollback
+from services.monitor_service import monitor_indexer
+from services.provisioning_service import apply, log_plan, plan
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
+# The requests of the SDK would hide the plan
+logging.getLogger("azure").setLevel(logging.WARNING)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Provisions the index, data source, skillset and indexer of Azure AI Search."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser(
+        "plan", help="Shows the changes that apply would make, without applying them."
+    )
+    apply_parser = subparsers.add_parser(
+        "apply", help="Applies the changes. It is the default command."
+    )
+    apply_parser.add_argument(
+        "--allow-rebuild",
+        action="store_true",
+        help="Deletes and creates the index again if its changes require it, and resets the indexer.",
+    )
+    monitor_parser = subparsers.add_parser(
+        "monitor",
+        help="Reports the throughput, failures and estimated time to completion of the indexer.",
+    )
+    monitor_parser.add_argument(
+        "--interval", type=float, default=10.0, help="Seconds between polls."
+    )
+    monitor_parser.add_argument(
+        "--total",
+        type=int,
+        help="Number of documents to index. Defaults to the documents of the last successful execution.",
+    )
+    monitor_parser.add_argument(
+        "--run", action="store_true", help="Runs the indexer before monitoring it."
+    )
+    deploy_parser = subparsers.add_parser(
+        "deploy",
+        help="Builds a new version of the index alongside the live one, validates it and switches the alias to it.",
+    )
+    deploy_parser.add_argument(
+        "--interval",
+        type=float,
+        default=10.0,
+        help="Seconds between polls of the indexer.",
+    )
+    subparsers.add_parser(
+        "rollback", help="Switches the alias back to the previous version of the index."
+    )
+    subparsers.add_parser(
+        "drop-unversioned",
+        help="Deletes the index without versions once the backend queries the alias.",
+    )
+    return parser.parse_args()
 
 
 def main():
-    create_or_update_index()
-    create_or_update_datasource()
-    create_or_update_skillset()
-    create_or_update_indexer()
+    arguments = parse_arguments()
+    if arguments.command == "monitor":
+        return (
+            0
+            if monitor_indexer(arguments.interval, arguments.total, arguments.run)
+            else 1
+        )
+    if arguments.command == "deploy":
+        return 0 if deploy(arguments.interval) else 1
+    if arguments.command == "rollback":
+        return 0 if rollback() else 1
+    if arguments.command == "drop-unversioned":
+        return 0 if drop_unversioned() else 1
+    plans = plan()
+    log_plan(plans)
+    if arguments.command == "plan":
+        return 0
+    return 0 if apply(plans, getattr(arguments, "allow_rebuild", False)) else 1
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from azure.search.documents.indexes.models import (
     SearchIndex,
     SimpleField,
@@ -19,10 +21,17 @@ from azure.search.documents.indexes.models import (
 )
 
 from config import get_settings
+from models.vector_definition import (
+    COMPRESSION_NAME,
+    get_embedding_dimensions,
+    get_vector_compressions,
+    get_vector_field_type,
+)
 
 
-def get_index_schema() -> SearchIndex:
+def get_index_schema(name: Optional[str] = None) -> SearchIndex:
     settings = get_settings()
+    compressions = get_vector_compressions()
     fields = [
         SimpleField(
             name="id",
@@ -88,6 +97,24 @@ def get_index_schema() -> SearchIndex:
             sortable=False,
             facetable=False,
         ),
+        SimpleField(
+            name="end_page",
+            type=SearchFieldDataType.String,
+            searchable=False,
+            filterable=True,
+            retrievable=True,
+            sortable=False,
+            facetable=False,
+        ),
+        SimpleField(
+            name="duplicate_pages",
+            type=SearchFieldDataType.Collection(SearchFieldDataType.String),
+            searchable=False,
+            filterable=True,
+            retrievable=True,
+            sortable=False,
+            facetable=False,
+        ),
         SearchableField(
             name="content",
             type=SearchFieldDataType.String,
@@ -106,10 +133,23 @@ def get_index_schema() -> SearchIndex:
             sortable=False,
             facetable=False,
         ),
+        # Hash of storage_url, used by process_docs to find the sections of a document
+        SimpleField(
+            name="source_id",
+            type=SearchFieldDataType.String,
+            searchable=False,
+            filterable=True,
+            retrievable=False,
+            sortable=False,
+            facetable=False,
+        ),
         SearchField(
             name="embeddings",
-            type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
-            vector_search_dimensions=3072,
+            type=get_vector_field_type(),
+            # Vectors that are not stored cannot be retrieved
+            hidden=not settings.azure_search_vector_stored,
+            stored=settings.azure_search_vector_stored,
+            vector_search_dimensions=get_embedding_dimensions(),
             vector_search_profile_name="vector-search",
         ),
     ]
@@ -140,8 +180,11 @@ def get_index_schema() -> SearchIndex:
             HnswAlgorithmConfiguration(
                 name="hnsw",
                 kind="hnsw",
-                hnsw_parameters=HnswParameters(
-                    metric="cosine", m=4, ef_construction=400, ef_search=500
+                parameters=HnswParameters(
+                    metric="cosine",
+                    m=settings.azure_search_hnsw_m,
+                    ef_construction=settings.azure_search_hnsw_ef_construction,
+                    ef_search=settings.azure_search_hnsw_ef_search,
                 ),
             )
         ],
@@ -150,8 +193,10 @@ def get_index_schema() -> SearchIndex:
                 name="vector-search",
                 algorithm_configuration_name="hnsw",
                 vectorizer_name="vectorizer-query",
+                compression_name=COMPRESSION_NAME if compressions else None,
             )
         ],
+        # The vectorizer requests query embeddings of the dimensions of the field
         vectorizers=[
             AzureOpenAIVectorizer(
                 vectorizer_name="vectorizer-query",
@@ -164,10 +209,11 @@ def get_index_schema() -> SearchIndex:
                 ),
             )
         ],
+        compressions=compressions,
     )
 
     index = SearchIndex(
-        name=settings.azure_search_index_name,
+        name=name or settings.azure_search_index_name,
         fields=fields,
         scoring_profiles=scoring_profiles,
         similarity=similarity,
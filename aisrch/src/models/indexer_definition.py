@@ -1,30 +1,59 @@
+from datetime import timedelta
+from typing import Optional
+
 from azure.search.documents.indexes.models import (
     SearchIndexer,
-    FieldMapping
+    FieldMapping,
+    IndexingParameters,
+    IndexingParametersConfiguration,
+    IndexingSchedule,
 )
 
 from config import get_settings
 
-def get_indexer_schema():
+PARSING_MODE_EXTENSIONS = {
+    "json": ".json",
+    "jsonLines": ".jsonl",
+}
+
+
+def get_indexer_schema(
+    name: Optional[str] = None,
+    index_name: Optional[str] = None,
+    skillset_name: Optional[str] = None,
+):
     settings = get_settings()
+    parsing_mode = settings.azure_search_indexer_parsing_mode
+    schedule = (
+        IndexingSchedule(
+            interval=timedelta(minutes=settings.azure_search_indexer_schedule_minutes)
+        )
+        if settings.azure_search_indexer_schedule_minutes
+        else None
+    )
     indexer = SearchIndexer(
-        name=settings.azure_search_indexer_name,
+        name=name or settings.azure_search_indexer_name,
         data_source_name=settings.azure_search_datasource_name,
-        target_index_name=settings.azure_search_index_name,
-        skillset_name=settings.azure_search_skillset_name,
-        parameters={
-            "configuration": {
-                "indexedFileNameExtensions": ".json",
-                "dataToExtract": "contentAndMetadata",
-                "parsingMode": "json",
-                "excluded_file_name_extensions": ".pdf, .docx",
-            }
-        },
+        target_index_name=index_name or settings.azure_search_index_name,
+        skillset_name=skillset_name or settings.azure_search_skillset_name,
+        schedule=schedule,
+        parameters=IndexingParameters(
+            batch_size=settings.azure_search_indexer_batch_size or None,
+            max_failed_items=settings.azure_search_indexer_max_failed_items,
+            max_failed_items_per_batch=settings.azure_search_indexer_max_failed_items_per_batch,
+            configuration=IndexingParametersConfiguration(
+                indexed_file_name_extensions=PARSING_MODE_EXTENSIONS[parsing_mode],
+                data_to_extract="contentAndMetadata",
+                parsing_mode=parsing_mode,
+                excluded_file_name_extensions=".pdf, .docx",
+                execution_environment=settings.azure_search_indexer_execution_environment,
+            ),
+        ),
         output_field_mappings=[
             FieldMapping(
-                    source_field_name="/document/embeddings",
-                    target_field_name="embeddings",
-                )
-        ]
+                source_field_name="/document/embeddings",
+                target_field_name="embeddings",
+            )
+        ],
     )
     return indexer
@@ -1,4 +1,6 @@
 # src/models/skillset_definition.py
+from typing import Optional
+
 from azure.search.documents.indexes.models import (
     SearchIndexerSkillset,
     AzureOpenAIEmbeddingSkill,
@@ -6,9 +8,10 @@ from azure.search.documents.indexes.models import (
     OutputFieldMappingEntry,
 )
 from config import get_settings
+from models.vector_definition import get_skill_dimensions
 
 
-def get_skillset() -> SearchIndexerSkillset:
+def get_skillset(name: Optional[str] = None) -> SearchIndexerSkillset:
     settings = get_settings()
 
     embedding_skill = AzureOpenAIEmbeddingSkill(
@@ -19,12 +22,13 @@ def get_skillset() -> SearchIndexerSkillset:
         deployment_name=settings.openai_embeddings_deployment_id,
         api_key=settings.openai_api_key,
         model_name=settings.openai_embeddings_model_name,
+        dimensions=get_skill_dimensions(),
         inputs=[InputFieldMappingEntry(name="text", source="/document/content")],
         outputs=[OutputFieldMappingEntry(name="embedding", target_name="embeddings")],
     )
 
     skillset = SearchIndexerSkillset(
-        name=settings.azure_search_skillset_name,
+        name=name or settings.azure_search_skillset_name,
         description="Document processing",
         skills=[embedding_skill],
     )
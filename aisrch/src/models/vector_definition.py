@@ -0,0 +1,128 @@
+import math
+from typing import List, Optional
+
+from azure.search.documents.indexes.models import (
+    BinaryQuantizationCompression,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
+    SearchFieldDataType,
+    VectorSearchCompression,
+)
+
+from config import get_settings
+
+# Native number of dimensions of the embedding models
+MODEL_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+# Models that can return shortened embeddings through the dimensions parameter
+SHORTENABLE_MODELS = {"text-embedding-3-small", "text-embedding-3-large"}
+
+VECTOR_TYPE_BYTES = {
+    "Single": 4,
+    "Half": 2,
+}
+
+COMPRESSION_NAME = "vector-compression"
+
+
+def get_embedding_dimensions() -> int:
+    """
+    Number of dimensions of the embeddings field, the model default unless OPENAI_EMBEDDINGS_DIMENSIONS
+    shortens them. Raises a ValueError if the model cannot produce that number of dimensions.
+    """
+    settings = get_settings()
+    model = settings.openai_embeddings_model_name
+    dimensions = settings.openai_embeddings_dimensions
+    native_dimensions = MODEL_DIMENSIONS.get(model)
+    if native_dimensions is None:
+        if not dimensions:
+            raise ValueError(
+                f"Unknown embeddings model '{model}', set OPENAI_EMBEDDINGS_DIMENSIONS"
+            )
+        return dimensions
+    if not dimensions:
+        return native_dimensions
+    if dimensions > native_dimensions or (
+        model not in SHORTENABLE_MODELS and dimensions != native_dimensions
+    ):
+        raise ValueError(
+            f"The model '{model}' cannot produce embeddings of {dimensions} dimensions"
+        )
+    return dimensions
+
+
+def get_skill_dimensions() -> Optional[int]:
+    """
+    The dimensions parameter of the embedding skill, only set for the models that support it.
+    """
+    if get_settings().openai_embeddings_model_name not in SHORTENABLE_MODELS:
+        return None
+    return get_embedding_dimensions()
+
+
+def get_vector_field_type() -> str:
+    return SearchFieldDataType.Collection(
+        f"Edm.{get_settings().azure_search_vector_type}"
+    )
+
+
+def get_vector_compressions() -> List[VectorSearchCompression]:
+    """
+    The compression of the vector index. The quantized vectors are searched first and, with rescoring,
+    the oversampled candidates are rescored with the full precision vectors.
+    """
+    settings = get_settings()
+    compression = settings.azure_search_vector_compression
+    rescoring = dict(
+        compression_name=COMPRESSION_NAME,
+        rerank_with_original_vectors=settings.azure_search_vector_rescore,
+        default_oversampling=settings.azure_search_vector_oversampling or None,
+    )
+    if compression == "scalar":
+        return [
+            ScalarQuantizationCompression(
+                parameters=ScalarQuantizationParameters(quantized_data_type="int8"),
+                **rescoring,
+            )
+        ]
+    if compression == "binary":
+        return [BinaryQuantizationCompression(**rescoring)]
+    return []
+
+
+def estimate_vector_bytes(
+    documents: int,
+    dimensions: int,
+    vector_type: str = "Single",
+    compression: str = "none",
+    stored: bool = True,
+    hnsw_m: int = 4,
+) -> dict:
+    """
+    Estimates the size of the embeddings field of an index. The vector index, which counts towards the
+    vector quota of the service, holds the quantized vectors and the HNSW graph, about 2 * m neighbors of
+    4 bytes per vector. The full precision vectors are always kept on disk to build the index and rescore,
+    and a second copy is kept for retrieval unless the field is not stored.
+
+    Returns:
+        dict: The bytes of the vector index, the full precision vectors, the retrievable copy and their total.
+    """
+    full_precision_bytes = documents * dimensions * VECTOR_TYPE_BYTES[vector_type]
+    if compression == "scalar":
+        quantized_bytes = documents * dimensions
+    elif compression == "binary":
+        quantized_bytes = documents * math.ceil(dimensions / 8)
+    else:
+        quantized_bytes = full_precision_bytes
+    vector_index_bytes = quantized_bytes + documents * 2 * hnsw_m * 4
+    retrievable_bytes = full_precision_bytes if stored else 0
+    return {
+        "vector_index_bytes": vector_index_bytes,
+        "full_precision_bytes": full_precision_bytes,
+        "retrievable_bytes": retrievable_bytes,
+        "total_bytes": vector_index_bytes + full_precision_bytes + retrievable_bytes,
+    }
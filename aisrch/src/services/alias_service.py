@@ -0,0 +1,106 @@
+import re
+from typing import List, Optional
+
+from azure.core.exceptions import HttpResponseError
+from azure.core.rest import HttpRequest
+from pydantic.dataclasses import dataclass
+
+from clients.search_client import get_search_client
+from config import get_settings
+
+
+@dataclass
+class ResourceNames:
+    """
+    Names of the resources of a version of the index. The data source is shared by every version
+
+    Attributes:
+        version (Optional[int]): Version of the resources, None for the resources without a version
+        index (str): Name of the index
+        skillset (str): Name of the skillset
+        indexer (str): Name of the indexer
+    """
+
+    version: Optional[int]
+    index: str
+    skillset: str
+    indexer: str
+
+
+def versioned_name(name: str, version: Optional[int]) -> str:
+    return f"{name}-v{version}" if version is not None else name
+
+
+def parse_version(name: str, versioned: str) -> Optional[int]:
+    """
+    The version of a versioned name of a resource, None if it is not a version of the resource.
+    """
+    match = re.fullmatch(rf"{re.escape(name)}-v(\d+)", versioned)
+    return int(match.group(1)) if match else None
+
+
+def get_resource_names(version: Optional[int]) -> ResourceNames:
+    settings = get_settings()
+    return ResourceNames(
+        version=version,
+        index=versioned_name(settings.azure_search_index_name, version),
+        skillset=versioned_name(settings.azure_search_skillset_name, version),
+        indexer=versioned_name(settings.azure_search_indexer_name, version),
+    )
+
+
+def send_alias_request(method: str, alias: str, body: Optional[dict] = None):
+    # Aliases are only available in the preview versions of the API, which the SDK does not cover
+    request = HttpRequest(
+        method,
+        f"/aliases('{alias}')",
+        params={"api-version": get_settings().azure_search_alias_api_version},
+        json=body,
+    )
+    response = get_search_client().send_request(request)
+    if response.status_code == 404:
+        return None
+    if response.status_code >= 400:
+        raise HttpResponseError(
+            message=f"{method} alias '{alias}' -> {response.status_code} {response.text()}",
+            response=response,
+        )
+    return response.json() if response.content else None
+
+
+def get_alias_indexes(alias: str) -> Optional[List[str]]:
+    """
+    Returns:
+        Optional[List[str]]: The indexes the alias points to, None if the alias does not exist.
+    """
+    definition = send_alias_request("GET", alias)
+    return definition["indexes"] if definition else None
+
+
+def set_alias(alias: str, index: str):
+    """
+    Points the alias to the index. The queries switch to the index atomically.
+    """
+    send_alias_request("PUT", alias, {"name": alias, "indexes": [index]})
+
+
+def get_alias_name() -> str:
+    """
+    The name of the alias that points to the live version, AZURE_SEARCH_ALIAS_NAME or the name of the index.
+    """
+    settings = get_settings()
+    return settings.azure_search_alias_name or settings.azure_search_index_name
+
+
+def get_live_version() -> Optional[int]:
+    """
+    The version of the index that the alias points to, None if the index is not versioned.
+    """
+    indexes = get_alias_indexes(get_alias_name())
+    if not indexes:
+        return None
+    return parse_version(get_settings().azure_search_index_name, indexes[0])
+
+
+def get_live_resource_names() -> ResourceNames:
+    return get_resource_names(get_live_version())
@@ -5,14 +5,16 @@ from clients.indexer_client import get_indexer_client
 from models.datasource_definition import get_datasource
 
 
-def create_or_update_datasource():
+def create_or_update_datasource() -> bool:
     client = get_indexer_client()
     datasource = get_datasource()
     try:
         client.create_data_source_connection(datasource)
         logging.info(f"Datasource '{datasource.name}' created.")
     except ResourceExistsError:
-        client.create_or_update_index(datasource)
+        client.create_or_update_data_source_connection(datasource)
         logging.info(f"Datasource '{datasource.name}' updated.")
     except Exception as e:
         logging.error(f"Failed to create or update datasource '{datasource.name}': {e}")
+        return False
+    return True
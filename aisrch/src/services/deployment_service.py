@@ -0,0 +1,299 @@
+import logging
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from azure.core.exceptions import ResourceNotFoundError
+
+from clients.indexer_client import get_indexer_client
+from clients.search_client import get_documents_client, get_search_client
+from config import get_settings
+from models.index_definition import get_index_schema
+from models.indexer_definition import get_indexer_schema
+from models.skillset_definition import get_skillset
+from services.alias_service import (
+    ResourceNames,
+    get_alias_indexes,
+    get_alias_name,
+    get_live_version,
+    get_resource_names,
+    parse_version,
+    set_alias,
+)
+from services.datasource_service import create_or_update_datasource
+from services.index_service import create_or_update_index
+from services.indexer_service import create_or_update_indexer
+from services.monitor_service import monitor_indexer
+from services.skillset_service import create_or_update_skillset
+
+# The document count of a new index is refreshed a few seconds after the indexer finishes
+COUNT_RETRIES = 6
+COUNT_RETRY_SECONDS = 5
+
+# Timed executions of every sample query, after a first one that warms the index
+QUERY_REPEATS = 3
+
+# Words of the content of a section used as a sample query
+QUERY_WORDS = 8
+
+
+def list_versions() -> List[int]:
+    """
+    The versions of the index that exist in the service, in ascending order.
+    """
+    name = get_settings().azure_search_index_name
+    versions = (
+        parse_version(name, index) for index in get_search_client().list_index_names()
+    )
+    return sorted(version for version in versions if version is not None)
+
+
+def index_exists(name: str) -> bool:
+    try:
+        get_search_client().get_index(name)
+    except ResourceNotFoundError:
+        return False
+    return True
+
+
+def document_count(index: str) -> int:
+    return get_documents_client(index).get_document_count()
+
+
+def sample_queries(index: str, count: int) -> List[str]:
+    """
+    Distinct queries built from the titles and the first words of the content of the sections of the
+    index, which must find documents.
+    """
+    queries = []
+    for document in get_documents_client(index).search(
+        search_text="*", select=["title", "content"], top=count * 5
+    ):
+        title = os.path.splitext(document.get("title") or "")[0].strip()
+        words = (document.get("content") or "").split()[:QUERY_WORDS]
+        for query in (title, " ".join(words)):
+            if query and query not in queries and len(queries) < count:
+                queries.append(query)
+        if len(queries) == count:
+            break
+    return queries
+
+
+def validate(names: ResourceNames, live_count: int) -> bool:
+    """
+    Checks that the new version has the documents of the live one and answers the sample queries with
+    results and within the latency budget.
+
+    Args:
+        names (ResourceNames): Names of the new version
+        live_count (int): Number of documents of the live version, 0 if there is none
+
+    Returns:
+        bool: Whether the new version can be switched to.
+    """
+    settings = get_settings()
+    minimum = int(live_count * settings.azure_search_deploy_min_document_ratio)
+    count = document_count(names.index)
+    for _ in range(COUNT_RETRIES):
+        if count >= minimum and count > 0:
+            break
+        time.sleep(COUNT_RETRY_SECONDS)
+        count = document_count(names.index)
+    if count < minimum or count == 0:
+        logging.error(
+            f"Index '{names.index}' has {count} documents, expected at least {max(minimum, 1)}."
+        )
+        return False
+    logging.info(
+        f"Index '{names.index}' has {count} documents ({live_count} in the live version)."
+    )
+
+    queries = sample_queries(names.index, settings.azure_search_deploy_sample_queries)
+    if not queries:
+        logging.error(f"Index '{names.index}' has no titles or content to query.")
+        return False
+    client = get_documents_client(names.index)
+    latencies = []
+    for query in queries:
+        list(client.search(search_text=query, top=3))
+        for _ in range(QUERY_REPEATS):
+            start = time.perf_counter()
+            results = list(client.search(search_text=query, top=3))
+            latencies.append(1000 * (time.perf_counter() - start))
+        if not results:
+            logging.error(f"Index '{names.index}' found nothing for '{query}'.")
+            return False
+    p95 = statistics.quantiles(latencies, n=20)[-1]
+    logging.info(
+        f"{len(queries)} sample queries: {statistics.mean(latencies):.0f} ms on average, {p95:.0f} ms p95."
+    )
+    if p95 > settings.azure_search_deploy_max_latency_ms:
+        logging.error(
+            f"Index '{names.index}' answers in {p95:.0f} ms p95, "
+            f"more than {settings.azure_search_deploy_max_latency_ms:.0f} ms."
+        )
+        return False
+    return True
+
+
+def delete_version(names: ResourceNames):
+    """
+    Deletes the indexer, the skillset and the index of a version, ignoring the ones already deleted.
+    """
+    indexer_client = get_indexer_client()
+    for delete, name in (
+        (indexer_client.delete_indexer, names.indexer),
+        (indexer_client.delete_skillset, names.skillset),
+        (get_search_client().delete_index, names.index),
+    ):
+        try:
+            delete(name)
+        except ResourceNotFoundError:
+            pass
+    logging.info(
+        f"Index '{names.index}', skillset '{names.skillset}' and indexer '{names.indexer}' deleted."
+    )
+
+
+def collect_garbage(live_version: int, previous_version: Optional[int]):
+    """
+    Deletes the versions up to the previous live one beyond the ones kept for a rollback, and the
+    versions that never went live or were rolled back.
+    """
+    keep = get_settings().azure_search_deploy_keep_versions
+    versions = [version for version in list_versions() if version != live_version]
+    kept = [
+        version
+        for version in versions
+        if previous_version is not None and version <= previous_version
+    ]
+    expired = kept[: len(kept) - keep] if keep > 0 else kept
+    stale = [version for version in versions if version not in kept]
+    for version in expired + stale:
+        delete_version(get_resource_names(version))
+
+
+def switch(alias: str, names: ResourceNames):
+    """
+    Points the alias to the new version. The queries switch to it atomically.
+    """
+    set_alias(alias, names.index)
+    logging.info(f"Alias '{alias}' points to index '{names.index}'.")
+
+
+def deploy(interval: float = 10.0) -> bool:
+    """
+    Builds the next version of the index alongside the live one, waits for its indexer, validates it and
+    switches the alias that the backend queries to it. The versions that are no longer needed are
+    deleted afterwards.
+
+    Returns:
+        bool: Whether the new version is live.
+    """
+    settings = get_settings()
+    name = settings.azure_search_index_name
+    alias = get_alias_name()
+    # An alias cannot take the name of an index, which would have to be deleted while it is queried
+    if get_alias_indexes(alias) is None and index_exists(alias):
+        logging.error(
+            f"Index '{alias}' has no versions and the alias cannot take its name. "
+            "Set AZURE_SEARCH_ALIAS_NAME to another name, deploy, point the backend to the alias "
+            "and then run drop-unversioned."
+        )
+        return False
+    live_version = get_live_version()
+    live_index = get_resource_names(live_version).index
+    live_count = document_count(live_index) if index_exists(live_index) else 0
+    version = max(list_versions() + [live_version or 0]) + 1
+    names = get_resource_names(version)
+    logging.info(
+        f"Deploying version {version} of index '{name}' (live: {live_index}, {live_count} documents)."
+    )
+
+    # The data source is shared by every version
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        created = all(
+            executor.map(
+                lambda create: create(),
+                (
+                    create_or_update_datasource,
+                    lambda: create_or_update_index(get_index_schema(names.index)),
+                    lambda: create_or_update_skillset(get_skillset(names.skillset)),
+                ),
+            )
+        )
+    if not created or not create_or_update_indexer(
+        get_indexer_schema(names.indexer, names.index, names.skillset)
+    ):
+        return False
+    if not monitor_indexer(
+        interval, total=live_count or None, name=names.indexer, created=True
+    ):
+        logging.error(
+            f"Indexer '{names.indexer}' failed, index '{live_index}' stays live."
+        )
+        return False
+    if not validate(names, live_count):
+        logging.error(
+            f"Version {version} is not valid, index '{live_index}' stays live."
+        )
+        return False
+
+    switch(alias, names)
+    collect_garbage(version, live_version)
+    return True
+
+
+def drop_unversioned() -> bool:
+    """
+    Deletes the index without versions, with its skillset and indexer, once the alias points to a version.
+    The backend must query the alias by then: the index is deleted even if it is still queried.
+
+    Returns:
+        bool: Whether the index without versions is deleted.
+    """
+    alias = get_alias_name()
+    names = get_resource_names(None)
+    live_version = get_live_version()
+    if live_version is None:
+        logging.error(
+            f"Alias '{alias}' does not point to a version yet, run deploy first."
+        )
+        return False
+    if not index_exists(names.index):
+        logging.info(f"Index '{names.index}' is already deleted.")
+        return True
+    delete_version(names)
+    return True
+
+
+def rollback() -> bool:
+    """
+    Points the alias back to the most recent version older than the live one.
+
+    Returns:
+        bool: Whether a previous version is live.
+    """
+    name = get_settings().azure_search_index_name
+    alias = get_alias_name()
+    live_version = get_live_version()
+    if live_version is None:
+        logging.error(f"Index '{name}' has no versions to roll back to.")
+        return False
+    previous: Optional[int] = next(
+        (version for version in reversed(list_versions()) if version < live_version),
+        None,
+    )
+    if previous is None:
+        logging.error(
+            f"No version of index '{name}' older than {live_version} is kept, "
+            "see AZURE_SEARCH_DEPLOY_KEEP_VERSIONS."
+        )
+        return False
+    set_alias(alias, get_resource_names(previous).index)
+    logging.info(
+        f"Alias '{alias}' points to version {previous} instead of {live_version}."
+    )
+    return True
@@ -1,13 +1,16 @@
 import logging
+from typing import Optional
+
 from azure.core.exceptions import ResourceExistsError
+from azure.search.documents.indexes.models import SearchIndex
 
 from models.index_definition import get_index_schema
 from clients.search_client import get_search_client
 
 
-def create_or_update_index():
+def create_or_update_index(index: Optional[SearchIndex] = None) -> bool:
     client = get_search_client()
-    index = get_index_schema()
+    index = index or get_index_schema()
     try:
         client.create_index(index)
         logging.info(f"Index '{index.name}' created.")
@@ -16,3 +19,5 @@ def create_or_update_index():
         logging.info(f"Index '{index.name}' updated.")
     except Exception as e:
         logging.error(f"Failed to create or update index '{index.name}': {e}")
+        return False
+    return True
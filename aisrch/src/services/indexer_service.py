@@ -1,18 +1,23 @@
 import logging
+from typing import Optional
+
 from azure.core.exceptions import ResourceExistsError
+from azure.search.documents.indexes.models import SearchIndexer
 
 from clients.indexer_client import get_indexer_client
 from models.indexer_definition import get_indexer_schema
 
 
-def create_or_update_indexer():
+def create_or_update_indexer(indexer: Optional[SearchIndexer] = None) -> bool:
     client = get_indexer_client()
-    indexer = get_indexer_schema()
+    indexer = indexer or get_indexer_schema()
     try:
         client.create_indexer(indexer)
-        print(f"Indexer '{indexer.name}' created.")
+        logging.info(f"Indexer '{indexer.name}' created.")
     except ResourceExistsError:
-        client.create_or_update_index(indexer)
+        client.create_or_update_indexer(indexer)
         logging.info(f"Indexer '{indexer.name}' updated.")
     except Exception as e:
         logging.error(f"Failed to create or update indexer '{indexer.name}': {e}")
+        return False
+    return True
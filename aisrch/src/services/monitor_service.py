@@ -0,0 +1,128 @@
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from azure.search.documents.indexes.models import SearchIndexerStatus
+
+from clients.indexer_client import get_indexer_client
+from services.alias_service import get_live_resource_names
+
+IN_PROGRESS = "inProgress"
+
+# Seconds to wait for a requested execution to be reported
+RUN_START_TIMEOUT = 60
+
+
+def estimate_total(status: SearchIndexerStatus) -> Optional[int]:
+    """
+    The number of documents processed by the last successful execution, used as the total of the
+    current one when it is not known. It is a good estimate after a reset, when every document is
+    processed again.
+    """
+    for execution in status.execution_history or []:
+        if execution.status == "success" and execution.item_count:
+            return execution.item_count
+    return None
+
+
+def log_progress(
+    status: SearchIndexerStatus,
+    previous_items: Optional[int],
+    interval: float,
+    total: Optional[int],
+):
+    result = status.last_result
+    items = result.item_count or 0
+    failed = result.failed_item_count or 0
+    elapsed = (datetime.now(timezone.utc) - result.start_time).total_seconds()
+    average_rate = items / elapsed if elapsed > 0 else 0.0
+    rate = (
+        (items - previous_items) / interval
+        if previous_items is not None
+        else average_rate
+    )
+    if total and average_rate > 0:
+        remaining = max(total - items - failed, 0) / average_rate
+        eta = (
+            f"{remaining:.0f}s left of ~{total} documents"
+            if remaining < 120
+            else f"{remaining / 60:.0f} min left of ~{total} documents"
+        )
+    else:
+        eta = "unknown time left"
+    logging.info(
+        f"{items} documents processed, {failed} failed, {len(result.warnings or [])} warnings, "
+        f"{rate:.1f} documents/s ({average_rate:.1f} on average), {eta}."
+    )
+
+
+def log_result(status: SearchIndexerStatus):
+    result = status.last_result
+    if result is None:
+        logging.info("The indexer has not run yet.")
+        return
+    duration = (
+        (result.end_time - result.start_time).total_seconds()
+        if result.end_time
+        else 0.0
+    )
+    logging.info(
+        f"Last execution: {result.status}, {result.item_count} documents processed, "
+        f"{result.failed_item_count} failed, {len(result.warnings or [])} warnings in {duration:.0f}s"
+        + (f" ({result.item_count / duration:.1f} documents/s)." if duration else ".")
+    )
+    if result.error_message:
+        logging.error(f"\tGot an error while indexing -> {result.error_message}")
+    for error in (result.errors or [])[:5]:
+        logging.error(
+            f"\tGot an error while indexing {error.key} -> {error.error_message}"
+        )
+    for warning in (result.warnings or [])[:5]:
+        logging.warning(f"\t{warning.key} -> {warning.message}")
+
+
+def monitor_indexer(
+    interval: float = 10.0,
+    total: Optional[int] = None,
+    run: bool = False,
+    name: Optional[str] = None,
+    created: bool = False,
+) -> bool:
+    """
+    Polls the status of the indexer every interval seconds while it runs, logging its throughput,
+    failures, warnings and estimated time to completion, and then the result of the execution.
+    The indexer of the live version of the index is monitored unless another name is given. With
+    created, the first execution of a new indexer, which starts on its own, is waited for.
+
+    Returns:
+        bool: Whether the last execution succeeded.
+    """
+    client = get_indexer_client()
+    name = name or get_live_resource_names().indexer
+    status = client.get_indexer_status(name)
+    previous_start = (
+        status.last_result.start_time if status.last_result and not created else None
+    )
+    if run:
+        client.run_indexer(name)
+        logging.info(f"Indexer '{name}' started.")
+    if run or created:
+        # The new execution is reported after a few seconds
+        deadline = time.monotonic() + RUN_START_TIMEOUT
+        while time.monotonic() < deadline and (
+            status.last_result is None
+            or status.last_result.start_time == previous_start
+        ):
+            time.sleep(min(interval, 2.0))
+            status = client.get_indexer_status(name)
+
+    previous_items = None
+    total = total or estimate_total(status)
+    while status.last_result is not None and status.last_result.status == IN_PROGRESS:
+        log_progress(status, previous_items, interval, total)
+        previous_items = status.last_result.item_count or 0
+        time.sleep(interval)
+        status = client.get_indexer_status(name)
+    log_result(status)
+    return status.last_result is not None and status.last_result.status == "success"
@@ -0,0 +1,385 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple
+
+from azure.core.exceptions import ResourceNotFoundError
+from pydantic.dataclasses import dataclass
+
+from clients.indexer_client import get_indexer_client
+from clients.search_client import get_search_client
+from models.datasource_definition import get_datasource
+from models.index_definition import get_index_schema
+from models.indexer_definition import get_indexer_schema
+from models.skillset_definition import get_skillset
+from services.alias_service import ResourceNames, get_live_resource_names
+from services.datasource_service import create_or_update_datasource
+from services.index_service import create_or_update_index
+from services.indexer_service import create_or_update_indexer
+from services.skillset_service import create_or_update_skillset
+
+# Properties the service never returns, they cannot be compared
+SECRET_PROPERTIES = {"connectionString", "apiKey"}
+REDACTED_VALUES = {None, "<redacted>", "<unchanged>"}
+
+# Properties of an existing field that cannot be changed without rebuilding the index
+FIELD_REBUILD_PROPERTIES = {
+    "type",
+    "key",
+    "searchable",
+    "filterable",
+    "sortable",
+    "facetable",
+    "analyzer",
+    "indexAnalyzer",
+    "normalizer",
+    "dimensions",
+    "vectorSearchProfile",
+    "stored",
+    "vectorEncoding",
+    "fields",
+}
+
+# Parameters of an existing HNSW configuration that cannot be changed without rebuilding the index
+HNSW_REBUILD_PARAMETERS = {"m", "efConstruction", "metric"}
+
+# Properties of a skill that do not change its outputs
+SKILL_UPDATE_PROPERTIES = {"description"}
+
+Impact = Literal["update", "reset", "rebuild"]
+
+
+@dataclass
+class Change:
+    """
+    A difference between the current and the desired definition of a resource
+
+    Attributes:
+        path (str): Path of the property, with the names of the items of the lists
+        current (Any): Current value, None if the property is added
+        desired (Any): Desired value, None if the property is removed
+        impact (str): "update" if it can be applied in place, "reset" if the documents already indexed
+            must be processed again to reflect it and "rebuild" if the index must be deleted and created again
+    """
+
+    path: str
+    current: Any
+    desired: Any
+    impact: Impact
+
+
+@dataclass
+class ResourcePlan:
+    """
+    The changes needed to bring a resource to its desired definition
+
+    Attributes:
+        kind (str): Kind of the resource: index, datasource, skillset or indexer
+        name (str): Name of the resource
+        exists (bool): Whether the resource already exists
+        changes (List[Change]): Differences with the current definition
+    """
+
+    kind: str
+    name: str
+    exists: bool
+    changes: List[Change]
+
+    @property
+    def impact(self) -> Optional[Impact]:
+        """
+        The strongest impact of the changes, None if there is nothing to apply.
+        """
+        if not self.exists:
+            return "update"
+        for impact in ("rebuild", "reset", "update"):
+            if any(change.impact == impact for change in self.changes):
+                return impact
+        return None
+
+
+def to_definition(resource) -> Dict:
+    """
+    The REST definition of a model of the SDK, without the properties that identify a version.
+    """
+    generated = (
+        resource._to_generated() if hasattr(resource, "_to_generated") else resource
+    )
+    definition = generated.serialize(keep_readonly=True)
+    definition.pop("@odata.etag", None)
+    definition.pop("@odata.context", None)
+    return definition
+
+
+def diff(current: Any, desired: Any, path: Tuple = ()) -> List[Tuple[Tuple, Any, Any]]:
+    """
+    Compares two definitions. The properties that are not set in the desired definition keep the value
+    chosen by the service, and the items of the lists of named objects are matched by their name.
+
+    Returns:
+        List[Tuple[Tuple, Any, Any]]: The path, current and desired value of every difference.
+    """
+    if desired is None:
+        return []
+    if path and path[-1] in SECRET_PROPERTIES and current in REDACTED_VALUES:
+        return []
+    if isinstance(desired, dict) and isinstance(current, dict):
+        differences = []
+        for key, value in desired.items():
+            differences.extend(diff(current.get(key), value, path + (key,)))
+        return differences
+    if (
+        isinstance(desired, list)
+        and isinstance(current, list)
+        and all(isinstance(item, dict) and "name" in item for item in desired + current)
+    ):
+        current_items = {item["name"]: item for item in current}
+        desired_items = {item["name"]: item for item in desired}
+        differences = []
+        for name, item in desired_items.items():
+            if name in current_items:
+                differences.extend(diff(current_items[name], item, path + (name,)))
+            else:
+                differences.append((path + (name,), None, item))
+        for name, item in current_items.items():
+            if name not in desired_items:
+                differences.append((path + (name,), item, None))
+        return differences
+    if current != desired:
+        return [(path, current, desired)]
+    return []
+
+
+def index_impact(path: Tuple, current: Any, desired: Any) -> Impact:
+    if path[0] == "fields" and len(path) == 2:
+        return "rebuild" if desired is None else "update"
+    if path[0] == "fields" and path[2] in FIELD_REBUILD_PROPERTIES:
+        return "rebuild"
+    if (
+        path[:2] == ("vectorSearch", "algorithms")
+        and path[-1] in HNSW_REBUILD_PARAMETERS
+    ):
+        return "rebuild"
+    if path[:2] == ("vectorSearch", "compressions"):
+        return "rebuild"
+    if path[:2] == ("vectorSearch", "profiles") and (
+        len(path) == 3 or path[3] in {"algorithm", "compression"}
+    ):
+        return "rebuild" if current is not None else "update"
+    if path[0] == "similarity":
+        return "rebuild"
+    return "update"
+
+
+def skillset_impact(path: Tuple, current: Any, desired: Any) -> Impact:
+    # The enrichments of the documents already indexed only change when they are processed again
+    if path[0] == "skills":
+        if len(path) > 2 and path[2] in SKILL_UPDATE_PROPERTIES:
+            return "update"
+        return "reset"
+    if path[0] == "indexProjections":
+        return "reset"
+    return "update"
+
+
+def indexer_impact(path: Tuple, current: Any, desired: Any) -> Impact:
+    if path[0] in {"fieldMappings", "outputFieldMappings", "skillsetName"}:
+        return "reset"
+    return "update"
+
+
+def datasource_impact(path: Tuple, current: Any, desired: Any) -> Impact:
+    if path[0] == "container":
+        return "reset"
+    return "update"
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class Resource:
+    """
+    A resource of the search service that is provisioned from its definition
+
+    Attributes:
+        kind (str): Kind of the resource
+        definition (Callable): Returns the desired definition
+        fetch (Callable): Returns the current definition given the name, raises ResourceNotFoundError if it does not exist
+        apply (Callable): Creates or updates the resource, returns whether it succeeded
+        impact (Callable): Classifies a difference given its path, current and desired value
+    """
+
+    kind: str
+    definition: Callable
+    fetch: Callable
+    apply: Callable
+    impact: Callable
+
+
+def get_resources(names: ResourceNames) -> Dict[str, Resource]:
+    """
+    The resources of the version of the index given by the names.
+    """
+    return {
+        "index": Resource(
+            kind="index",
+            definition=lambda: get_index_schema(names.index),
+            fetch=lambda name: get_search_client().get_index(name),
+            apply=lambda: create_or_update_index(get_index_schema(names.index)),
+            impact=index_impact,
+        ),
+        "datasource": Resource(
+            kind="datasource",
+            definition=get_datasource,
+            fetch=lambda name: get_indexer_client().get_data_source_connection(name),
+            apply=create_or_update_datasource,
+            impact=datasource_impact,
+        ),
+        "skillset": Resource(
+            kind="skillset",
+            definition=lambda: get_skillset(names.skillset),
+            fetch=lambda name: get_indexer_client().get_skillset(name),
+            apply=lambda: create_or_update_skillset(get_skillset(names.skillset)),
+            impact=skillset_impact,
+        ),
+        "indexer": Resource(
+            kind="indexer",
+            definition=lambda: get_indexer_schema(
+                names.indexer, names.index, names.skillset
+            ),
+            fetch=lambda name: get_indexer_client().get_indexer(name),
+            apply=lambda: create_or_update_indexer(
+                get_indexer_schema(names.indexer, names.index, names.skillset)
+            ),
+            impact=indexer_impact,
+        ),
+    }
+
+
+def plan_resource(resource: Resource) -> ResourcePlan:
+    desired = resource.definition()
+    try:
+        current = resource.fetch(desired.name)
+    except ResourceNotFoundError:
+        return ResourcePlan(
+            kind=resource.kind, name=desired.name, exists=False, changes=[]
+        )
+    changes = [
+        Change(
+            path=".".join(path),
+            current=current_value,
+            desired=desired_value,
+            impact=resource.impact(path, current_value, desired_value),
+        )
+        for path, current_value, desired_value in diff(
+            to_definition(current), to_definition(desired)
+        )
+    ]
+    return ResourcePlan(
+        kind=resource.kind, name=desired.name, exists=True, changes=changes
+    )
+
+
+def plan() -> List[ResourcePlan]:
+    """
+    Fetches the current definition of every resource concurrently and compares it with the desired one.
+    When the index is versioned, the resources of the live version are compared.
+    """
+    resources = get_resources(get_live_resource_names())
+    with ThreadPoolExecutor(max_workers=len(resources)) as executor:
+        return list(executor.map(plan_resource, resources.values()))
+
+
+def log_plan(plans: List[ResourcePlan]):
+    for resource_plan in plans:
+        label = f"{resource_plan.kind.capitalize()} '{resource_plan.name}'"
+        if not resource_plan.exists:
+            logging.info(f"{label}: will be created.")
+        elif not resource_plan.changes:
+            logging.info(f"{label}: up to date.")
+        else:
+            logging.info(
+                f"{label}: {len(resource_plan.changes)} changes ({resource_plan.impact})."
+            )
+        for change in resource_plan.changes:
+            log = logging.warning if change.impact != "update" else logging.info
+            log(
+                f"\t[{change.impact}] {change.path}: {change.current} -> {change.desired}"
+            )
+        if resource_plan.impact == "rebuild":
+            logging.warning(
+                f"{label}: the changes require deleting and creating the index again."
+            )
+        elif resource_plan.impact == "reset" and resource_plan.exists:
+            logging.warning(
+                f"{label}: the documents already indexed reflect the changes after the indexer is reset."
+            )
+
+
+def apply(plans: List[ResourcePlan], allow_rebuild: bool = False) -> bool:
+    """
+    Applies the resources with changes. The index, the data source and the skillset are applied
+    concurrently, and then the indexer that depends on them. With allow_rebuild, an index whose
+    changes require it is deleted and created again; otherwise nothing is applied if any change requires
+    a rebuild. A versioned index is never rebuilt in place, a new version must be deployed instead.
+    The indexer is reset after a rebuild or any change that only affects the documents indexed from then
+    on, so that every document is indexed again.
+
+    Returns:
+        bool: Whether every resource was applied.
+    """
+    pending = {
+        resource_plan.kind: resource_plan
+        for resource_plan in plans
+        if resource_plan.impact is not None
+    }
+    rebuild = "index" in pending and pending["index"].impact == "rebuild"
+    reset = rebuild or any(
+        resource_plan.exists and resource_plan.impact == "reset"
+        for resource_plan in pending.values()
+    )
+    names = get_live_resource_names()
+    if rebuild and names.version is not None:
+        logging.error(
+            f"Index '{pending['index'].name}' requires a rebuild, deploy a new version with deploy."
+        )
+        return False
+    if rebuild and not allow_rebuild:
+        logging.error(
+            f"Index '{pending['index'].name}' requires a rebuild, run apply with --allow-rebuild."
+        )
+        return False
+    if not pending:
+        logging.info("Every resource is up to date.")
+        return True
+
+    resources = get_resources(names)
+
+    def apply_resource(kind: str) -> bool:
+        try:
+            if kind == "index" and rebuild:
+                get_search_client().delete_index(pending[kind].name)
+                logging.info(f"Index '{pending[kind].name}' deleted.")
+            return resources[kind].apply()
+        except Exception as e:
+            logging.error(f"Failed to apply {kind} '{pending[kind].name}': {e}")
+            return False
+
+    independent = [
+        kind for kind in ("index", "datasource", "skillset") if kind in pending
+    ]
+    succeeded = True
+    if independent:
+        with ThreadPoolExecutor(max_workers=len(independent)) as executor:
+            succeeded = all(executor.map(apply_resource, independent))
+    if not succeeded:
+        return False
+    if "indexer" in pending and not apply_resource("indexer"):
+        return False
+    if reset:
+        try:
+            get_indexer_client().reset_indexer(names.indexer)
+        except Exception as e:
+            logging.error(f"Failed to reset indexer '{names.indexer}': {e}")
+            return False
+        logging.info(
+            f"Indexer '{names.indexer}' reset, the documents are indexed again on its next run."
+        )
+    return True
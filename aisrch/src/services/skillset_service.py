@@ -1,18 +1,23 @@
 import logging
+from typing import Optional
+
 from azure.core.exceptions import ResourceExistsError
+from azure.search.documents.indexes.models import SearchIndexerSkillset
 
 from clients.indexer_client import get_indexer_client
 from models.skillset_definition import get_skillset
 
 
-def create_or_update_skillset():
+def create_or_update_skillset(skillset: Optional[SearchIndexerSkillset] = None) -> bool:
     client = get_indexer_client()
-    skillset = get_skillset()
+    skillset = skillset or get_skillset()
     try:
         client.create_skillset(skillset)
         logging.info(f"Skillset '{skillset.name}' created.")
     except ResourceExistsError:
-        client.create_or_update_index(skillset)
+        client.create_or_update_skillset(skillset)
         logging.info(f"Skillset '{skillset.name}' updated.")
     except Exception as e:
         logging.error(f"Failed to create or update skillset '{skillset.name}': {e}")
+        return False
+    return True
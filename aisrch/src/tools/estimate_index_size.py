@@ -0,0 +1,78 @@
+import argparse
+import itertools
+import logging
+
+from models.vector_definition import VECTOR_TYPE_BYTES, estimate_vector_bytes
+
+COMPRESSIONS = ["none", "scalar", "binary"]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.estimate_index_size",
+        description="Estimates the size of the embeddings of the index for every vector option.",
+    )
+    parser.add_argument(
+        "--documents", type=int, required=True, help="Number of indexed sections."
+    )
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        nargs="+",
+        default=[3072, 1536, 1024, 512, 256],
+        help="Numbers of dimensions to compare. Defaults to 3072 1536 1024 512 256.",
+    )
+    parser.add_argument(
+        "--hnsw-m", type=int, default=4, help="The m parameter of the HNSW graph."
+    )
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    baseline = None
+    logging.info(
+        "%10s %6s %8s %7s %16s %16s %12s %8s",
+        "dimensions",
+        "type",
+        "compress",
+        "stored",
+        "vector index MiB",
+        "on disk MiB",
+        "total MiB",
+        "of max",
+    )
+    for dimensions, vector_type, compression, stored in itertools.product(
+        sorted(arguments.dimensions, reverse=True),
+        VECTOR_TYPE_BYTES,
+        COMPRESSIONS,
+        [True, False],
+    ):
+        estimate = estimate_vector_bytes(
+            arguments.documents,
+            dimensions,
+            vector_type=vector_type,
+            compression=compression,
+            stored=stored,
+            hnsw_m=arguments.hnsw_m,
+        )
+        # The first row is the largest option, every row is compared with it
+        baseline = baseline or estimate
+        logging.info(
+            "%10d %6s %8s %7s %16.1f %16.1f %12.1f %7.1f%%",
+            dimensions,
+            vector_type,
+            compression,
+            stored,
+            estimate["vector_index_bytes"] / 1024 / 1024,
+            (estimate["full_precision_bytes"] + estimate["retrievable_bytes"])
+            / 1024
+            / 1024,
+            estimate["total_bytes"] / 1024 / 1024,
+            100 * estimate["total_bytes"] / baseline["total_bytes"],
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main()
@@ -0,0 +1,153 @@
+import heapq
+import math
+import random
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def exact_neighbors(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """
+    The k nearest neighbors of every query by cosine similarity, by brute force. The vectors and queries
+    must be normalized.
+
+    Returns:
+        np.ndarray: The indexes of the neighbors of every query, from the nearest.
+    """
+    neighbors = []
+    for start in range(0, len(queries), 256):
+        similarities = queries[start : start + 256] @ vectors.T
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(similarities, top, axis=1), axis=1)
+        neighbors.append(np.take_along_axis(top, order, axis=1))
+    return np.concatenate(neighbors)
+
+
+class HnswIndex:
+    """
+    Hierarchical navigable small world graph over normalized vectors with the cosine distance, with the
+    parameters of the HNSW algorithm of Azure AI Search: every node keeps up to m neighbors on the upper
+    layers and 2 * m on the bottom layer, ef_construction candidates are explored when a node is inserted
+    and ef_search candidates when the graph is searched
+    """
+
+    def __init__(self, vectors: np.ndarray, m: int, ef_construction: int, seed=0):
+        self.vectors = vectors
+        self.m = m
+        self.ef_construction = ef_construction
+        self.level_multiplier = 1 / math.log(m)
+        self.random = random.Random(seed)
+        self.layers: List[Dict[int, List[int]]] = []
+        self.entry_point = -1
+        self.evaluations = 0
+        for node in range(len(vectors)):
+            self.insert(node)
+
+    def distances(self, query: np.ndarray, nodes: List[int]) -> np.ndarray:
+        self.evaluations += len(nodes)
+        return 1 - self.vectors[nodes] @ query
+
+    def search_layer(
+        self, query: np.ndarray, entry_points: List[int], ef: int, layer: int
+    ) -> List[Tuple[float, int]]:
+        """
+        Returns:
+            List[Tuple[float, int]]: The ef nearest nodes found on the layer with their distance, from the nearest.
+        """
+        graph = self.layers[layer]
+        visited = set(entry_points)
+        entry_distances = self.distances(query, entry_points)
+        candidates = [
+            (float(d), node) for d, node in zip(entry_distances, entry_points)
+        ]
+        heapq.heapify(candidates)
+        results = [(-distance, node) for distance, node in candidates]
+        heapq.heapify(results)
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if distance > -results[0][0] and len(results) >= ef:
+                break
+            neighbors = [
+                neighbor for neighbor in graph[node] if neighbor not in visited
+            ]
+            if not neighbors:
+                continue
+            visited.update(neighbors)
+            for neighbor_distance, neighbor in zip(
+                self.distances(query, neighbors).tolist(), neighbors
+            ):
+                if len(results) < ef or neighbor_distance < -results[0][0]:
+                    heapq.heappush(candidates, (neighbor_distance, neighbor))
+                    heapq.heappush(results, (-neighbor_distance, neighbor))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted((-distance, node) for distance, node in results)
+
+    def insert(self, node: int):
+        level = int(-math.log(1 - self.random.random()) * self.level_multiplier)
+        top_level = len(self.layers) - 1
+        while len(self.layers) <= level:
+            self.layers.append({})
+        for layer in range(level + 1):
+            self.layers[layer][node] = []
+        if self.entry_point < 0:
+            self.entry_point = node
+            return
+
+        query = self.vectors[node]
+        entry_points = [self.entry_point]
+        for layer in range(top_level, level, -1):
+            entry_points = [self.search_layer(query, entry_points, 1, layer)[0][1]]
+        for layer in range(min(level, top_level), -1, -1):
+            found = self.search_layer(query, entry_points, self.ef_construction, layer)
+            max_neighbors = 2 * self.m if layer == 0 else self.m
+            graph = self.layers[layer]
+            graph[node] = self.select_neighbors(found, self.m)
+            for neighbor in graph[node]:
+                links = graph[neighbor]
+                links.append(node)
+                if len(links) > max_neighbors:
+                    link_distances = self.distances(self.vectors[neighbor], links)
+                    graph[neighbor] = self.select_neighbors(
+                        sorted(zip(link_distances.tolist(), links)), max_neighbors
+                    )
+            entry_points = [neighbor for _, neighbor in found]
+        if level > top_level:
+            self.entry_point = node
+
+    def select_neighbors(
+        self, candidates: List[Tuple[float, int]], count: int
+    ) -> List[int]:
+        """
+        Selects up to count neighbors among the candidates, sorted from the nearest, with the heuristic of
+        HNSW: a candidate is skipped if it is nearer to an already selected neighbor than to the node, so
+        that the links point in different directions instead of all into the same cluster.
+        """
+        nodes = [node for _, node in candidates]
+        candidate_vectors = self.vectors[nodes]
+        similarities = candidate_vectors @ candidate_vectors.T
+        self.evaluations += len(nodes) * len(nodes)
+        selected = []
+        for i, (distance, node) in enumerate(candidates):
+            if all(1 - similarities[i, j] > distance for j in selected):
+                selected.append(i)
+                if len(selected) == count:
+                    break
+        return [nodes[i] for i in selected]
+
+    def search(self, query: np.ndarray, k: int, ef_search: int) -> List[int]:
+        entry_points = [self.entry_point]
+        for layer in range(len(self.layers) - 1, 0, -1):
+            entry_points = [self.search_layer(query, entry_points, 1, layer)[0][1]]
+        found = self.search_layer(query, entry_points, max(ef_search, k), 0)
+        return [node for _, node in found[:k]]
+
+    def links(self) -> int:
+        return sum(
+            len(neighbors) for graph in self.layers for neighbors in graph.values()
+        )
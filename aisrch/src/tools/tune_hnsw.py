@@ -0,0 +1,224 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import time
+
+import numpy as np
+
+from tools.hnsw import HnswIndex, exact_neighbors, normalize
+
+# Ranges of the HNSW parameters accepted by Azure AI Search
+M_RANGE = range(4, 11)
+EF_RANGE = range(100, 1001)
+
+SETTINGS_VARIABLES = {
+    "m": "AZURE_SEARCH_HNSW_M",
+    "ef_construction": "AZURE_SEARCH_HNSW_EF_CONSTRUCTION",
+    "ef_search": "AZURE_SEARCH_HNSW_EF_SEARCH",
+}
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        prog="python -m tools.tune_hnsw",
+        description="Measures the recall, latency, build time and memory of the HNSW parameters on local embeddings.",
+    )
+    parser.add_argument(
+        "--embeddings",
+        help="Embeddings to index: a .npy matrix, a .f32 matrix of float32 rows such as the ones of the "
+        "embedding cache of process_docs, or a .jsonl file of documents with an embeddings field. "
+        "Synthetic embeddings are generated if it is not set.",
+    )
+    parser.add_argument(
+        "--dimensions",
+        type=int,
+        default=256,
+        help="Dimensions of the .f32 matrix or of the synthetic embeddings.",
+    )
+    parser.add_argument(
+        "--synthetic", type=int, default=2000, help="Number of synthetic embeddings."
+    )
+    parser.add_argument(
+        "--queries",
+        type=int,
+        default=100,
+        help="Number of embeddings held out of the index and used as queries.",
+    )
+    parser.add_argument("--k", type=int, default=10, help="Number of results.")
+    parser.add_argument("--m", type=int, nargs="+", default=[4, 6, 8, 10])
+    parser.add_argument(
+        "--ef-construction", type=int, nargs="+", default=[100, 200, 400]
+    )
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[100, 200, 500])
+    parser.add_argument(
+        "--target-recall",
+        type=float,
+        default=0.95,
+        help="The fastest parameters with this recall are chosen. Defaults to 0.95.",
+    )
+    parser.add_argument("--output", help="Writes the results to this JSON file.")
+    parser.add_argument(
+        "--write-env",
+        help="Writes the chosen parameters to this environment file, such as ../.env.",
+    )
+    arguments = parser.parse_args()
+    for value in arguments.m:
+        if value not in M_RANGE:
+            parser.error(f"m must be between 4 and 10, got {value}")
+    for value in arguments.ef_construction + arguments.ef_search:
+        if value not in EF_RANGE:
+            parser.error(f"ef values must be between 100 and 1000, got {value}")
+    return arguments
+
+
+def load_embeddings(path: str, dimensions: int) -> np.ndarray:
+    if path.endswith(".npy"):
+        return np.load(path).astype(np.float32)
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as embeddings_file:
+            return np.array(
+                [
+                    json.loads(line)["embeddings"]
+                    for line in embeddings_file
+                    if line.strip()
+                ],
+                dtype=np.float32,
+            )
+    return np.fromfile(path, dtype=np.float32).reshape(-1, dimensions)
+
+
+def synthetic_embeddings(count: int, dimensions: int, seed=0) -> np.ndarray:
+    """
+    Embeddings grouped around topics, like the sections of the same subject.
+    """
+    generator = np.random.default_rng(seed)
+    topics = generator.normal(size=(max(count // 40, 1), dimensions))
+    assignments = generator.integers(len(topics), size=count)
+    return (topics[assignments] + generator.normal(size=(count, dimensions))).astype(
+        np.float32
+    )
+
+
+def evaluate(
+    index: HnswIndex, queries: np.ndarray, truth: np.ndarray, k: int, ef_search: int
+) -> dict:
+    latencies = []
+    hits = 0
+    evaluations = index.evaluations
+    for query, neighbors in zip(queries, truth):
+        start = time.perf_counter()
+        found = index.search(query, k, ef_search)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found) & set(neighbors.tolist()))
+    return {
+        "ef_search": ef_search,
+        "recall": hits / truth.size,
+        "mean_latency_ms": 1000 * float(np.mean(latencies)),
+        "p95_latency_ms": 1000 * float(np.percentile(latencies, 95)),
+        "distances_per_query": (index.evaluations - evaluations) / len(queries),
+    }
+
+
+def choose(results: list, target_recall: float) -> dict:
+    """
+    The fastest parameters that reach the target recall, or the ones with the best recall if none does.
+    """
+    eligible = [result for result in results if result["recall"] >= target_recall]
+    if not eligible:
+        return max(results, key=lambda result: result["recall"])
+    return min(
+        eligible,
+        key=lambda result: (result["distances_per_query"], result["graph_bytes"]),
+    )
+
+
+def write_env(path: str, parameters: dict):
+    """
+    Sets the settings of the parameters in the environment file, keeping the rest of its lines.
+    """
+    lines = []
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as env_file:
+            lines = env_file.read().splitlines()
+    for name, variable in SETTINGS_VARIABLES.items():
+        line = f"{variable}={parameters[name]}"
+        for i, existing in enumerate(lines):
+            if existing.split("=", 1)[0].strip() == variable:
+                lines[i] = line
+                break
+        else:
+            lines.append(line)
+    with open(path, "w", encoding="utf-8") as env_file:
+        env_file.write("\n".join(lines) + "\n")
+
+
+def main():
+    arguments = parse_arguments()
+    if arguments.embeddings:
+        embeddings = load_embeddings(arguments.embeddings, arguments.dimensions)
+    else:
+        embeddings = synthetic_embeddings(
+            arguments.synthetic + arguments.queries, arguments.dimensions
+        )
+    embeddings = normalize(embeddings)
+    np.random.default_rng(1).shuffle(embeddings)
+    queries, vectors = embeddings[: arguments.queries], embeddings[arguments.queries :]
+    logging.info(
+        "%d embeddings of %d dimensions, %d queries",
+        len(vectors),
+        vectors.shape[1],
+        len(queries),
+    )
+    truth = exact_neighbors(vectors, queries, arguments.k)
+
+    results = []
+    for m, ef_construction in itertools.product(arguments.m, arguments.ef_construction):
+        start = time.perf_counter()
+        index = HnswIndex(vectors, m, ef_construction)
+        build_seconds = time.perf_counter() - start
+        for ef_search in arguments.ef_search:
+            result = {
+                "m": m,
+                "ef_construction": ef_construction,
+                "build_seconds": build_seconds,
+                # Every link is a 4 bytes node id
+                "graph_bytes": 4 * index.links(),
+                **evaluate(index, queries, truth, arguments.k, ef_search),
+            }
+            results.append(result)
+            logging.info(
+                "m=%-3d efConstruction=%-5d efSearch=%-5d recall@%d=%.3f %8.2f ms/query (p95 %.2f) "
+                "%8.0f distances/query build %7.1fs graph %7.2f MiB",
+                m,
+                ef_construction,
+                ef_search,
+                arguments.k,
+                result["recall"],
+                result["mean_latency_ms"],
+                result["p95_latency_ms"],
+                result["distances_per_query"],
+                build_seconds,
+                result["graph_bytes"] / 1024 / 1024,
+            )
+
+    chosen = choose(results, arguments.target_recall)
+    logging.info(
+        "Chosen: %s",
+        " ".join(
+            f"{variable}={chosen[name]}"
+            for name, variable in SETTINGS_VARIABLES.items()
+        ),
+    )
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output:
+            json.dump({"results": results, "chosen": chosen}, output, indent=2)
+    if arguments.write_env:
+        write_env(arguments.write_env, chosen)
+        logging.info("Wrote the parameters to %s", arguments.write_env)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    main()
@@ -0,0 +1,47 @@
+import pytest
+
+from config import get_settings
+
+from fakes import FakeSearchService, write_certificate
+
+SETTINGS = {
+    "AZURE_SEARCH_ADMIN_KEY": "key",
+    "AZURE_SEARCH_INDEX_NAME": "tutoria-index",
+    "AZURE_SEARCH_INDEXER_NAME": "tutoria-indexer",
+    "AZURE_SEARCH_DATASOURCE_NAME": "tutoria-datasource",
+    "AZURE_SEARCH_SKILLSET_NAME": "tutoria-skillset",
+    "AZURE_STORAGE_CONNECTION_STRING": "UseDevelopmentStorage=true",
+    "AZURE_STORAGE_CONTAINER_NAME": "documents",
+    "AZURE_COGNITIVE_SERVICES_KEY": "key",
+    "OPENAI_API_KEY": "key",
+    "OPENAI_EMBEDDINGS_DEPLOYMENT_ID": "embeddings",
+    "OPENAI_EMBEDDINGS_MODEL_NAME": "text-embedding-3-large",
+    "OPENAI_RESOURCE_URI": "https://openai.local",
+}
+
+
+@pytest.fixture(scope="session")
+def certificate(tmp_path_factory):
+    return write_certificate(str(tmp_path_factory.mktemp("certificate")))
+
+
+@pytest.fixture
+def search_service(monkeypatch, certificate) -> FakeSearchService:
+    """
+    A fake search service, with the settings pointing to it and its certificate trusted.
+    """
+    service = FakeSearchService(*certificate)
+    service.start()
+    monkeypatch.setenv("REQUESTS_CA_BUNDLE", certificate[0])
+    for name, value in SETTINGS.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.setenv("AZURE_SEARCH_ENDPOINT", service.endpoint)
+    get_settings.cache_clear()
+    yield service
+    get_settings.cache_clear()
+    service.stop()
+
+
+@pytest.fixture
+def settings(search_service):
+    return get_settings()
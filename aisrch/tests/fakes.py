@@ -0,0 +1,258 @@
+import copy
+import datetime
+import ipaddress
+import json
+import re
+import ssl
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+PATH = re.compile(
+    r"^/(indexes|datasources|skillsets|indexers|aliases)(?:\('([^']+)'\))?(?:/(.+))?$"
+)
+
+# Properties of an existing field that the service refuses to change
+FIXED_FIELD_PROPERTIES = ("type", "dimensions", "searchable", "filterable", "stored")
+
+
+def write_certificate(directory: str) -> Tuple[str, str]:
+    """
+    Writes a self-signed certificate for 127.0.0.1 and its key, as the SDK only sends keys over TLS.
+
+    Returns:
+        Tuple[str, str]: The paths of the certificate and of the key.
+    """
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+            ),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    certificate_path = f"{directory}/certificate.pem"
+    key_path = f"{directory}/key.pem"
+    with open(certificate_path, "wb") as file:
+        file.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as file:
+        file.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+    return certificate_path, key_path
+
+
+class FakeSearchService:
+    """
+    Management and documents API of Azure AI Search, served over HTTPS on a local port. The resources are
+    kept in memory, secrets are redacted when they are read, and the status of every indexer is taken from
+    the list of status documents set by the test, the last one being repeated.
+    """
+
+    def __init__(self, certificate_path: str, key_path: str):
+        self.resources: Dict[Tuple[str, str], Dict] = {}
+        self.documents: Dict[str, List[Dict]] = {}
+        self.statuses: Dict[str, List[Dict]] = {}
+        self.requests: List[Tuple[str, str]] = []
+        self.failing: Dict[Tuple[str, str], int] = {}
+        self.lock = threading.Lock()
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                service.handle(self)
+
+            def do_PUT(self):
+                service.handle(self)
+
+            def do_POST(self):
+                service.handle(self)
+
+            def do_DELETE(self):
+                service.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certificate_path, key_path)
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        return f"https://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, collection: str, name: str) -> Optional[Dict]:
+        return self.resources.get((collection, name))
+
+    def put(self, collection: str, definition: Dict):
+        self.resources[(collection, definition["name"])] = copy.deepcopy(definition)
+
+    def resolve(self, name: str) -> str:
+        alias = self.resources.get(("aliases", name))
+        return alias["indexes"][0] if alias else name
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        path = urlsplit(request.path).path
+        with self.lock:
+            self.requests.append((request.command, path))
+            length = int(request.headers.get("Content-Length") or 0)
+            body = json.loads(request.rfile.read(length)) if length else None
+            match = PATH.match(path)
+            if match is None:
+                status, response = 404, {"error": {"message": f"No route {path}"}}
+            elif self.failing.get((request.command, path)):
+                self.failing[(request.command, path)] -= 1
+                status, response = 403, {"error": {"message": "Forbidden"}}
+            else:
+                status, response = self.route(request.command, *match.groups(), body)
+        if isinstance(response, str):
+            content, content_type = response.encode("utf-8"), "text/plain"
+        elif response is None:
+            content, content_type = b"", None
+        else:
+            content, content_type = (
+                json.dumps(response).encode("utf-8"),
+                ("application/json"),
+            )
+        request.send_response(status)
+        if content_type:
+            request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(content)))
+        request.end_headers()
+        request.wfile.write(content)
+
+    def route(
+        self,
+        method: str,
+        collection: str,
+        name: Optional[str],
+        action: Optional[str],
+        body: Optional[Dict],
+    ):
+        if action == "search.reset":
+            return 204, None
+        if action == "search.run":
+            return 202, None
+        if action == "search.status":
+            statuses = self.statuses.get(name)
+            if not statuses:
+                return 404, {"error": {"message": f"No status for {name}"}}
+            return 200, statuses[0] if len(statuses) == 1 else statuses.pop(0)
+        if action is not None:
+            return self.route_documents(method, self.resolve(name), action, body)
+        key = (collection, name or (body or {}).get("name"))
+        if method == "GET":
+            if name is None:
+                return 200, {
+                    "value": [
+                        self.redact(collection, definition)
+                        for (kind, _), definition in self.resources.items()
+                        if kind == collection
+                    ]
+                }
+            if key not in self.resources:
+                return 404, {"error": {"message": f"No {collection} {name}"}}
+            return 200, self.redact(collection, self.resources[key])
+        if method == "DELETE":
+            if self.resources.pop(key, None) is None:
+                return 404, {"error": {"message": f"No {collection} {name}"}}
+            self.documents.pop(name, None)
+            return 204, None
+        if method == "POST" and key in self.resources:
+            return 409, {"error": {"message": f"{collection} {key[1]} already exists"}}
+        if collection == "indexes" and key in self.resources:
+            changed = self.fixed_field_changed(self.resources[key], body)
+            if changed:
+                return 400, {
+                    "error": {
+                        "message": f"Existing field '{changed}' cannot be changed"
+                    }
+                }
+        created = key not in self.resources
+        self.resources[key] = copy.deepcopy(body)
+        return 201 if created else 200, self.redact(collection, body)
+
+    def route_documents(
+        self, method: str, index: str, action: str, body: Optional[Dict]
+    ):
+        if ("indexes", index) not in self.resources:
+            return 404, {"error": {"message": f"No index {index}"}}
+        documents = self.documents.get(index, [])
+        if action == "docs/$count":
+            return 200, str(len(documents))
+        if action == "docs/search.post.search":
+            search = body.get("search") or "*"
+            found = [
+                {"@search.score": 1.0, **document}
+                for document in documents
+                if search == "*"
+                or any(
+                    search.lower() in str(value).lower() for value in document.values()
+                )
+            ]
+            return 200, {"value": found[: body.get("top") or 50]}
+        return 404, {"error": {"message": f"No route {action}"}}
+
+    @staticmethod
+    def fixed_field_changed(current: Dict, desired: Dict) -> Optional[str]:
+        fields = {field["name"]: field for field in current.get("fields", [])}
+        for field in desired.get("fields", []):
+            existing = fields.get(field["name"])
+            if existing and any(
+                existing.get(key) != field.get(key) for key in FIXED_FIELD_PROPERTIES
+            ):
+                return field["name"]
+        return None
+
+    @staticmethod
+    def redact(collection: str, definition: Dict) -> Dict:
+        definition = copy.deepcopy(definition)
+        if collection == "datasources":
+            definition.setdefault("credentials", {})["connectionString"] = None
+
+        def redact_keys(value):
+            if isinstance(value, dict):
+                for key in value:
+                    if key == "apiKey":
+                        value[key] = "<redacted>"
+                    else:
+                        redact_keys(value[key])
+            elif isinstance(value, list):
+                for item in value:
+                    redact_keys(item)
+
+        redact_keys(definition)
+        definition["@odata.etag"] = '"0x1"'
+        return definition
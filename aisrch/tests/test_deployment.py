@@ -0,0 +1,97 @@
+import logging
+
+from config import get_settings
+from services.alias_service import get_resource_names
+from services.deployment_service import (
+    deploy,
+    drop_unversioned,
+    sample_queries,
+    validate,
+)
+from test_monitor import execution, indexer_status
+
+SECTIONS = [
+    {
+        "id": f"algebra-{n}",
+        "title": "algebra.pdf",
+        "content": f"Groups rings and fields of order {n} with their homomorphisms and ideals",
+    }
+    for n in range(3)
+] + [{"id": "geometry-0", "title": "geometry.pdf", "content": ""}]
+
+
+def test_sample_queries_use_the_titles_and_the_content(search_service):
+    search_service.put("indexes", {"name": "tutoria-index-v1", "fields": []})
+    search_service.documents["tutoria-index-v1"] = SECTIONS
+
+    queries = sample_queries("tutoria-index-v1", 4)
+
+    assert queries == [
+        "algebra",
+        "Groups rings and fields of order 0 with",
+        "Groups rings and fields of order 1 with",
+        "Groups rings and fields of order 2 with",
+    ]
+
+
+def test_a_version_without_queries_is_not_valid(search_service, caplog):
+    names = get_resource_names(1)
+    search_service.put("indexes", {"name": names.index, "fields": []})
+    search_service.documents[names.index] = [
+        {"id": str(n), "title": "", "content": ""} for n in range(5)
+    ]
+
+    assert not validate(names, live_count=5)
+    assert "has no titles or content to query" in caplog.text
+
+
+def test_deploy_switches_the_alias_to_the_validated_version(search_service, caplog):
+    search_service.documents["tutoria-index-v1"] = SECTIONS
+    search_service.statuses["tutoria-indexer-v1"] = [
+        indexer_status(),
+        indexer_status(execution("success", len(SECTIONS), started_seconds_ago=1)),
+    ]
+
+    with caplog.at_level(logging.INFO):
+        assert deploy(interval=0.01)
+
+    assert search_service.get("aliases", "tutoria-index")["indexes"] == [
+        "tutoria-index-v1"
+    ]
+    messages = [record.message for record in caplog.records if record.name == "root"]
+    assert any(message.startswith("5 sample queries") for message in messages)
+
+
+def test_the_index_without_versions_is_never_deleted_by_deploy(search_service, caplog):
+    search_service.put("indexes", {"name": "tutoria-index", "fields": []})
+    search_service.documents["tutoria-index"] = SECTIONS
+
+    assert not deploy(interval=0.01)
+
+    assert "Set AZURE_SEARCH_ALIAS_NAME" in caplog.text
+    assert search_service.get("indexes", "tutoria-index") is not None
+    assert not any(method != "GET" for method, _ in search_service.requests)
+
+
+def test_the_first_deployment_migrates_to_an_alias_with_another_name(
+    search_service, monkeypatch
+):
+    monkeypatch.setenv("AZURE_SEARCH_ALIAS_NAME", "tutoria")
+    get_settings.cache_clear()
+    search_service.put("indexes", {"name": "tutoria-index", "fields": []})
+    search_service.documents["tutoria-index"] = SECTIONS
+    search_service.documents["tutoria-index-v1"] = SECTIONS
+    search_service.statuses["tutoria-indexer-v1"] = [
+        indexer_status(),
+        indexer_status(execution("success", len(SECTIONS), started_seconds_ago=1)),
+    ]
+
+    assert not drop_unversioned()
+    assert deploy(interval=0.01)
+
+    assert search_service.get("aliases", "tutoria")["indexes"] == ["tutoria-index-v1"]
+    # The backend still queries the index without versions until it is pointed to the alias
+    assert search_service.get("indexes", "tutoria-index") is not None
+    assert drop_unversioned()
+    assert search_service.get("indexes", "tutoria-index") is None
+    assert search_service.get("indexes", "tutoria-index-v1") is not None
@@ -0,0 +1,122 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from services.monitor_service import monitor_indexer
+
+INDEXER = "tutoria-indexer"
+RUN = ("POST", f"/indexers('{INDEXER}')/search.run")
+STATUS = ("GET", f"/indexers('{INDEXER}')/search.status")
+
+
+def execution(
+    status: str,
+    items: int,
+    failed: int = 0,
+    started_seconds_ago: float = 100.0,
+    errors: Optional[List[Dict]] = None,
+) -> Dict:
+    start = datetime.now(timezone.utc) - timedelta(seconds=started_seconds_ago)
+    finished = status != "inProgress"
+    return {
+        "status": status,
+        "errorMessage": None,
+        "startTime": start.isoformat(),
+        "endTime": (start + timedelta(seconds=50)).isoformat() if finished else None,
+        "errors": errors or [],
+        "warnings": [],
+        "itemsProcessed": items,
+        "itemsFailed": failed,
+        "initialTrackingState": None,
+        "finalTrackingState": None,
+    }
+
+
+def indexer_status(*history: Dict) -> Dict:
+    return {
+        "status": "running",
+        "lastResult": history[0] if history else None,
+        "executionHistory": list(history),
+        "limits": {
+            "maxRunTime": "PT2H",
+            "maxDocumentExtractionSize": 1,
+            "maxDocumentContentCharactersToExtract": 1,
+        },
+    }
+
+
+def test_the_execution_is_polled_until_it_finishes(search_service, caplog):
+    previous = execution("success", 1000, started_seconds_ago=3600)
+    search_service.statuses[INDEXER] = [
+        indexer_status(execution("inProgress", 100), previous),
+        indexer_status(execution("inProgress", 500), previous),
+        indexer_status(execution("success", 1000), previous),
+    ]
+
+    with caplog.at_level(logging.INFO):
+        assert monitor_indexer(interval=0.01)
+
+    assert search_service.requests.count(STATUS) == 3
+    progress = [
+        record.message for record in caplog.records if "processed, " in record.message
+    ]
+    assert progress[0].startswith("100 documents processed, 0 failed")
+    assert "1.0 documents/s" in progress[0]
+    assert "of ~1000 documents" in progress[0]
+    assert progress[1].startswith("500 documents processed")
+    assert "Last execution: success, 1000 documents processed" in caplog.text
+
+
+def test_a_failed_execution_reports_its_errors(search_service, caplog):
+    errors = [
+        {"key": f"doc{n}", "errorMessage": "Could not parse", "statusCode": 400}
+        for n in range(8)
+    ]
+    search_service.statuses[INDEXER] = [
+        indexer_status(execution("transientFailure", 90, failed=8, errors=errors))
+    ]
+
+    assert not monitor_indexer(interval=0.01, total=100)
+
+    logged_errors = [
+        record.message for record in caplog.records if record.levelname == "ERROR"
+    ]
+    assert len(logged_errors) == 5
+    assert logged_errors[0] == "\tGot an error while indexing doc0 -> Could not parse"
+
+
+def test_run_waits_for_the_new_execution(search_service):
+    previous = execution("success", 1000, started_seconds_ago=3600)
+    search_service.statuses[INDEXER] = [
+        indexer_status(previous),
+        indexer_status(previous),
+        indexer_status(execution("inProgress", 10, started_seconds_ago=1), previous),
+        indexer_status(execution("success", 1000, started_seconds_ago=1), previous),
+    ]
+
+    assert monitor_indexer(interval=0.01, run=True)
+
+    assert RUN in search_service.requests
+    assert search_service.requests.count(STATUS) == 4
+
+
+def test_a_new_indexer_waits_for_its_first_execution(search_service):
+    search_service.statuses[INDEXER] = [
+        indexer_status(),
+        indexer_status(execution("inProgress", 10, started_seconds_ago=1)),
+        indexer_status(execution("success", 20, started_seconds_ago=1)),
+    ]
+
+    assert monitor_indexer(interval=0.01, created=True)
+
+    assert RUN not in search_service.requests
+    assert search_service.requests.count(STATUS) == 3
+
+
+def test_an_indexer_that_never_ran_is_reported(search_service, caplog):
+    search_service.statuses[INDEXER] = [indexer_status()]
+
+    with caplog.at_level(logging.INFO):
+        assert not monitor_indexer(interval=0.01)
+
+    assert "The indexer has not run yet." in caplog.text
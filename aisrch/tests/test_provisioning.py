@@ -0,0 +1,102 @@
+import pytest
+
+from services.provisioning_service import apply, plan
+
+INDEX = ("indexes", "tutoria-index")
+SKILLSET = ("skillsets", "tutoria-skillset")
+INDEXER = ("indexers", "tutoria-indexer")
+RESET = ("POST", "/indexers('tutoria-indexer')/search.reset")
+
+
+def impacts(plans):
+    return {
+        resource_plan.kind: resource_plan.impact
+        for resource_plan in plans
+        if resource_plan.impact
+    }
+
+
+@pytest.fixture
+def provisioned(search_service):
+    assert apply(plan())
+    search_service.requests.clear()
+    return search_service
+
+
+def test_resources_are_created_and_then_up_to_date(search_service):
+    plans = plan()
+
+    assert [resource_plan.exists for resource_plan in plans] == [False] * 4
+    assert apply(plans)
+    assert {kind for kind, _ in search_service.resources} == {
+        "indexes",
+        "datasources",
+        "skillsets",
+        "indexers",
+    }
+    assert RESET not in search_service.requests
+    assert impacts(plan()) == {}
+
+
+def test_a_skill_description_is_updated_without_reset(provisioned):
+    provisioned.resources[SKILLSET]["skills"][0]["description"] = "Old description"
+
+    plans = plan()
+
+    assert impacts(plans) == {"skillset": "update"}
+    assert apply(plans)
+    assert ("PUT", "/skillsets('tutoria-skillset')") in provisioned.requests
+    assert RESET not in provisioned.requests
+
+
+def test_a_skill_output_change_resets_the_indexer(provisioned):
+    skill = provisioned.resources[SKILLSET]["skills"][0]
+    skill["outputs"][0]["targetName"] = "vector"
+
+    plans = plan()
+
+    assert impacts(plans) == {"skillset": "reset"}
+    assert apply(plans)
+    assert provisioned.requests[-1] == RESET
+
+
+def test_an_output_field_mapping_change_resets_the_indexer(provisioned):
+    provisioned.resources[INDEXER]["outputFieldMappings"] = []
+
+    plans = plan()
+
+    assert impacts(plans) == {"indexer": "reset"}
+    assert apply(plans)
+    assert provisioned.requests[-1] == RESET
+
+
+def test_a_rebuild_is_only_applied_when_allowed(provisioned):
+    field = next(
+        field
+        for field in provisioned.resources[INDEX]["fields"]
+        if field["name"] == "embeddings"
+    )
+    field["dimensions"] = 8
+
+    plans = plan()
+
+    assert impacts(plans) == {"index": "rebuild"}
+    assert not apply(plans)
+    assert not any(method != "GET" for method, _ in provisioned.requests)
+
+    assert apply(plans, allow_rebuild=True)
+    writes = [request for request in provisioned.requests if request[0] != "GET"]
+    assert writes[0] == ("DELETE", "/indexes('tutoria-index')")
+    assert writes[-1] == RESET
+    assert impacts(plan()) == {}
+
+
+def test_a_failed_delete_is_reported(provisioned):
+    provisioned.resources[INDEX]["similarity"] = {
+        "@odata.type": "#Microsoft.Azure.Search.ClassicSimilarity"
+    }
+    provisioned.failing[("DELETE", "/indexes('tutoria-index')")] = 1
+
+    assert not apply(plan(), allow_rebuild=True)
+    assert RESET not in provisioned.requests
+    assert INDEX in provisioned.resources
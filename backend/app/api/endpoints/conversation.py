@@ -1,9 +1,10 @@
+import asyncio
 import os
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from azure.search.documents.aio import SearchClient
 from dotenv import load_dotenv
-from fastapi import APIRouter
-from openai import AzureOpenAI
+from fastapi import APIRouter, HTTPException, Request, Response
+from openai import AsyncAzureOpenAI
 from schemas.conversation import ConversationRequest, ConversationResponse
 from api.utils.prompts import (
     CONDENSE_SYSTEM_PROMPT,
@@ -16,19 +17,35 @@ router = APIRouter()
 
 load_dotenv("../.env")
 
-openai_client = AzureOpenAI(
+# Seconds to answer a question, including both completions and the search
+CONVERSATION_TIMEOUT = float(os.getenv("CONVERSATION_TIMEOUT_SECONDS", "60"))
+# Seconds between the checks of whether the client is still waiting for the answer
+DISCONNECT_POLL_INTERVAL = 0.5
+
+openai_client = AsyncAzureOpenAI(
     azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
     api_key=os.getenv("AZURE_OPENAI_API_KEY"),
     api_version=os.getenv("OPENAI_API_VERSION"),
+    timeout=CONVERSATION_TIMEOUT,
 )
 
 search_client = SearchClient(
     endpoint=os.getenv("AZURE_SEARCH_ENDPOINT"),
     index_name=os.getenv("AZURE_SEARCH_INDEX_NAME"),
     credential=AzureKeyCredential(os.getenv("AZURE_SEARCH_API_KEY")),
+    # The queries through an alias of versioned indexes need a preview version
+    api_version=os.getenv("AZURE_SEARCH_API_VERSION", "2024-07-01"),
 )
 
 
+async def close_clients():
+    await openai_client.close()
+    await search_client.close()
+
+
+router.add_event_handler("shutdown", close_clients)
+
+
 class ChatHistory:
     def __init__(self):
         self.conversations: dict = {}
@@ -55,11 +72,10 @@ class ChatHistory:
 chat_history = ChatHistory()
 
 
-@router.post("", response_model=ConversationResponse)
-def handle_conversation(request: ConversationRequest):
+async def answer(request: ConversationRequest) -> str:
     # Reformulate the question based on the conversation history
     conversation = chat_history.get_conversation(request.conversation_id)
-    condense_completion = openai_client.chat.completions.create(
+    condense_completion = await openai_client.chat.completions.create(
         model=os.environ["AZURE_OPENAI_MODEL"],
         messages=[
             {"role": "system", "content": CONDENSE_SYSTEM_PROMPT},
@@ -81,7 +97,8 @@ def handle_conversation(request: ConversationRequest):
     query = condense_completion.choices[0].message.content
     print(f"Reformulated query: {query}")
 
-    search_results = search_client.search(search_text=query, top=3)
+    search_results = await search_client.search(search_text=query, top=3)
+    sources = [source async for source in search_results]
 
     messages = [
         {
@@ -95,12 +112,12 @@ def handle_conversation(request: ConversationRequest):
         {
             "role": "user",
             "content": ANSWERING_USER_PROMPT.format(
-                sources=[source for source in search_results],
+                sources=sources,
                 question=request.prompt,
             ),
         }
     )
-    answer_completion = openai_client.chat.completions.create(
+    answer_completion = await openai_client.chat.completions.create(
         model=os.environ["AZURE_OPENAI_MODEL"], messages=messages
     )
     answer_text = answer_completion.choices[0].message.content
@@ -113,4 +130,26 @@ def handle_conversation(request: ConversationRequest):
         ],
     )
     print(f"Answer: {answer_text}")
-    return ConversationResponse(response=answer_text)
+    return answer_text
+
+
+@router.post("", response_model=ConversationResponse)
+async def handle_conversation(request: ConversationRequest, http_request: Request):
+    # The answer is cancelled, with its pending requests to OpenAI and Search,
+    # when it takes too long or the client stops waiting for it
+    task = asyncio.create_task(answer(request))
+    try:
+        async with asyncio.timeout(CONVERSATION_TIMEOUT):
+            while not task.done():
+                await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+                if not task.done() and await http_request.is_disconnected():
+                    print("Client disconnected, answer cancelled")
+                    return Response(status_code=499)
+            return ConversationResponse(response=task.result())
+    except TimeoutError:
+        raise HTTPException(
+            status_code=504,
+            detail=f"The answer took longer than {CONVERSATION_TIMEOUT:.0f} seconds",
+        )
+    finally:
+        task.cancel()
@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+# The clients of the endpoint are created when it is imported
+os.environ.update(
+    {
+        "AZURE_OPENAI_ENDPOINT": "https://openai.local",
+        "AZURE_OPENAI_API_KEY": "key",
+        "OPENAI_API_VERSION": "2024-06-01",
+        "AZURE_OPENAI_MODEL": "gpt-4o",
+        "AZURE_SEARCH_ENDPOINT": "https://search.local",
+        "AZURE_SEARCH_INDEX_NAME": "tutoria-index",
+        "AZURE_SEARCH_API_KEY": "key",
+    }
+)
+
+from api.endpoints import conversation  # noqa: E402
+
+from fakes import FakeOpenAI, FakeSearch  # noqa: E402
+
+
+@pytest.fixture
+def openai_service(monkeypatch) -> FakeOpenAI:
+    service = FakeOpenAI()
+    monkeypatch.setattr(conversation, "openai_client", service)
+    return service
+
+
+@pytest.fixture
+def search_service(monkeypatch) -> FakeSearch:
+    service = FakeSearch(sources=[{"title": "algebra.pdf", "content": "Matrices"}])
+    monkeypatch.setattr(conversation, "search_client", service)
+    return service
+
+
+@pytest.fixture(autouse=True)
+def chat_history():
+    conversation.chat_history.delete_all_conversations()
+    yield conversation.chat_history
+    conversation.chat_history.delete_all_conversations()
@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+
+class FakeService:
+    """
+    A remote service answering after a latency, which counts the calls in flight
+    and the calls cancelled before their answer.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = 0
+
+    async def wait(self):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+
+class FakeOpenAI(FakeService):
+    """
+    Chat completions of Azure OpenAI, answering with the last message.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(latency)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model: str, messages: List[dict]):
+        await self.wait()
+        message = SimpleNamespace(content=f"Answer to {messages[-1]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeSearch(FakeService):
+    """
+    Async search client of Azure AI Search, returning the same sources to any query.
+    """
+
+    def __init__(self, latency: float = 0.0, sources: List[dict] = ()):
+        super().__init__(latency)
+        self.sources = list(sources)
+
+    async def search(self, search_text: str, top: int):
+        await self.wait()
+        return self.results(top)
+
+    async def results(self, top: int):
+        for source in self.sources[:top]:
+            yield source
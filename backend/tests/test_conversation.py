@@ -0,0 +1,127 @@
+import asyncio
+import json
+import time
+import uuid
+
+import httpx
+
+from api.endpoints import conversation
+from main import app
+
+CONVERSATION_ID = "6b0c6a8e-8d2b-4a4b-9d55-0a6f0e3c2b11"
+
+
+def post(prompt: str, conversation_id: str = CONVERSATION_ID) -> dict:
+    return {"conversation_id": conversation_id, "prompt": prompt}
+
+
+async def send(*bodies: dict) -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        return await asyncio.gather(
+            *(client.post("/conversation", json=body) for body in bodies)
+        )
+
+
+async def send_and_disconnect(body: dict) -> int:
+    """
+    Sends a conversation request and disconnects as soon as the body is read.
+    Returns the status code of the response.
+    """
+    content = json.dumps(body).encode("utf-8")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/conversation",
+        "raw_path": b"/conversation",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"api"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(content)).encode()),
+        ],
+        "client": ("127.0.0.1", 5000),
+        "server": ("api", 80),
+    }
+    messages = [{"type": "http.request", "body": content, "more_body": False}]
+    responses = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send_message(message):
+        responses.append(message)
+
+    await app(scope, receive, send_message)
+    return responses[0]["status"]
+
+
+def test_the_question_is_answered_from_the_sources(
+    openai_service, search_service, chat_history
+):
+    (response,) = asyncio.run(send(post("What is a matrix?")))
+
+    assert response.status_code == 200
+    answer = response.json()["response"]
+    assert answer.startswith("Answer to ")
+    assert "Matrices" in answer
+    assert openai_service.calls == 2
+    assert search_service.calls == 1
+    assert [
+        message["role"]
+        for message in chat_history.get_conversation(uuid.UUID(CONVERSATION_ID))
+    ] == ["user", "assistant"]
+
+
+def test_a_slow_answer_times_out_and_is_cancelled(
+    openai_service, search_service, monkeypatch
+):
+    monkeypatch.setattr(conversation, "CONVERSATION_TIMEOUT", 0.1)
+    openai_service.latency = 10.0
+
+    start = time.perf_counter()
+    (response,) = asyncio.run(send(post("What is a matrix?")))
+
+    assert response.status_code == 504
+    assert "longer than" in response.json()["detail"]
+    assert time.perf_counter() - start < 2.0
+    assert openai_service.cancelled == 1
+    assert search_service.calls == 0
+
+
+def test_a_disconnected_client_cancels_the_answer(
+    openai_service, search_service, monkeypatch, chat_history
+):
+    monkeypatch.setattr(conversation, "DISCONNECT_POLL_INTERVAL", 0.01)
+    search_service.latency = 10.0
+
+    start = time.perf_counter()
+    status = asyncio.run(send_and_disconnect(post("What is a matrix?")))
+
+    assert status == 499
+    assert time.perf_counter() - start < 2.0
+    assert search_service.cancelled == 1
+    assert openai_service.calls == 1
+    assert chat_history.conversations == {}
+
+
+def test_conversations_are_answered_concurrently(openai_service, search_service):
+    # More conversations than the 40 threads of the threadpool of the sync endpoints
+    conversations = 100
+    openai_service.latency = 0.2
+    search_service.latency = 0.2
+
+    start = time.perf_counter()
+    responses = asyncio.run(
+        send(*(post(f"Question {n}", str(uuid.uuid4())) for n in range(conversations)))
+    )
+
+    assert [response.status_code for response in responses] == [200] * conversations
+    assert openai_service.max_in_flight == conversations
+    assert search_service.max_in_flight == conversations
+    # Three calls of 0.2 seconds, against 60 seconds one conversation at a time
+    assert time.perf_counter() - start < 5.0
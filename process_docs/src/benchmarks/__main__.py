@@ -0,0 +1,151 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+from .suite import (
+    STAGES,
+    changed_outputs,
+    find_regressions,
+    find_scaling_regressions,
+    run_benchmarks,
+)
+from .synthetic import DEFAULT_CORPORA
+
+logger = logging.getLogger("benchmarks")
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmarks the parse, split and clean stages of the ingestion on synthetic documents.",
+    )
+    parser.add_argument(
+        "--corpus",
+        action="append",
+        choices=[corpus.name for corpus in DEFAULT_CORPORA],
+        help="Corpus to benchmark. Can be repeated. Defaults to every corpus.",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiplies the number of pages of every corpus.",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--table-format", choices=["html", "markdown", "tsv"], default="html"
+    )
+    parser.add_argument("--max-tokens-per-section", type=int, default=500)
+    parser.add_argument("--output", help="Writes the report to this JSON file.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Stores the report as the new baseline instead of comparing with it.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative drop of the throughputs. Defaults to 0.2.",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative growth of the peak memory. Defaults to 0.2.",
+    )
+    return parser.parse_args()
+
+
+def log_report(report):
+    for name, corpus in report["corpora"].items():
+        logger.info(
+            "%s: %d pages, %d chars, %d sections",
+            name,
+            corpus["pages"],
+            corpus["content_chars"],
+            corpus["sections"],
+        )
+        for stage in STAGES:
+            result = corpus[stage]
+            logger.info(
+                "\t%-6s %8.3fs %10.1f pages/s %12.0f chars/s %10s sections/s %8.1f MiB peak",
+                stage,
+                result["seconds"],
+                result["pages_per_second"],
+                result["chars_per_second"],
+                f"{result['sections_per_second']:.1f}"
+                if result["sections_per_second"]
+                else "-",
+                result["peak_memory_bytes"] / 1024 / 1024,
+            )
+
+
+def main():
+    arguments = parse_arguments()
+    corpora = [
+        corpus.scaled(arguments.scale)
+        for corpus in DEFAULT_CORPORA
+        if not arguments.corpus or corpus.name in arguments.corpus
+    ]
+    report = run_benchmarks(
+        corpora,
+        repeat=arguments.repeat,
+        table_format=arguments.table_format,
+        max_tokens_per_section=arguments.max_tokens_per_section,
+    )
+    report["settings"]["scale"] = arguments.scale
+    log_report(report)
+
+    if arguments.output:
+        with open(arguments.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2)
+
+    scaling_regressions = find_scaling_regressions(report, arguments.tolerance)
+    for regression in scaling_regressions:
+        logger.error(f"\tRegression -> {regression}")
+
+    if arguments.save_baseline:
+        with open(arguments.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        logger.info("Stored the baseline in %s", arguments.baseline)
+        return 1 if scaling_regressions else 0
+
+    if not os.path.exists(arguments.baseline):
+        logger.warning(
+            "There is no baseline in %s, run with --save-baseline to store one",
+            arguments.baseline,
+        )
+        return 1 if scaling_regressions else 0
+    with open(arguments.baseline, encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("settings") != report["settings"]:
+        logger.warning(
+            "The baseline was run with other settings (%s), the comparison may not be meaningful",
+            baseline.get("settings"),
+        )
+    for name in changed_outputs(report, baseline):
+        logger.warning("The output of the %s corpus changed since the baseline", name)
+    regressions = find_regressions(
+        report, baseline, arguments.tolerance, arguments.memory_tolerance
+    )
+    for regression in regressions:
+        logger.error(f"\tRegression -> {regression}")
+    if regressions or scaling_regressions:
+        return 1
+    logger.info("No regressions against %s", arguments.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    # The progress messages of the stages would be timed too
+    logging.getLogger("ingester").setLevel(logging.WARNING)
+    sys.exit(main())
@@ -0,0 +1,231 @@
+import hashlib
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from azure.core.credentials import AzureKeyCredential
+
+from features.ingestion import IngestionPipeline
+from features.parsers import DocumentAnalysisParser, File, Section
+from features.splitters import SentenceTextSplitter, get_encoder
+
+from .synthetic import SyntheticCorpus, generate_analyze_result
+
+STAGES = ["parse", "split", "clean"]
+
+THROUGHPUT_METRICS = ["pages_per_second", "chars_per_second", "sections_per_second"]
+
+
+def measure(function: Callable, repeat: int) -> Tuple[float, int]:
+    """
+    Runs the function repeat times and once more under tracemalloc.
+
+    Returns:
+        Tuple[float, int]: The best wall time in seconds and the peak of the memory allocated by the function in bytes.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start_time)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def stage_report(
+    seconds: float, peak: int, pages: int, chars: int, sections: int
+) -> Dict:
+    return {
+        "seconds": round(seconds, 6),
+        "pages_per_second": round(pages / seconds, 2),
+        "chars_per_second": round(chars / seconds, 2),
+        "sections_per_second": round(sections / seconds, 2) if sections else None,
+        "peak_memory_bytes": peak,
+    }
+
+
+def benchmark_corpus(
+    corpus: SyntheticCorpus,
+    parser: DocumentAnalysisParser,
+    splitter: SentenceTextSplitter,
+    file: File,
+    repeat: int,
+) -> Dict:
+    """
+    Times the parse, split and clean stages of the ingestion on a synthetic document.
+    """
+    result = generate_analyze_result(corpus)
+    page_count = len(result.pages)
+    report = {"pages": page_count, "content_chars": len(result.content)}
+
+    pages = parser.pages_from_result(result)
+    seconds, peak = measure(lambda: parser.pages_from_result(result), repeat)
+    report["parse"] = stage_report(seconds, peak, page_count, len(result.content), 0)
+
+    split_pages = list(splitter.split_pages(pages))
+    page_chars = sum(len(page.text) for page in pages)
+    seconds, peak = measure(lambda: list(splitter.split_pages(pages)), repeat)
+    report["split"] = stage_report(
+        seconds, peak, page_count, page_chars, len(split_pages)
+    )
+
+    sections = [Section(split_page, content=file) for split_page in split_pages]
+    section_chars = sum(len(split_page.text) for split_page in split_pages)
+
+    def clean():
+        return [
+            IngestionPipeline.build_document(
+                file, section, section_number, parser.table_format
+            )
+            for section_number, section in enumerate(sections)
+        ]
+
+    documents = clean()
+    seconds, peak = measure(clean, repeat)
+    report["clean"] = stage_report(
+        seconds, peak, page_count, section_chars, len(sections)
+    )
+
+    report["sections"] = len(split_pages)
+    report["tolerance"] = corpus.tolerance
+    report["reference"] = corpus.reference
+    # Changes when the output of the stages changes, e.g. after a change of the splitting rules
+    report["output_digest"] = hashlib.sha256(
+        "\x00".join(document["content"] for document in documents).encode("utf-8")
+    ).hexdigest()[:16]
+    return report
+
+
+def run_benchmarks(
+    corpora: List[SyntheticCorpus],
+    repeat: int = 3,
+    table_format: str = "html",
+    max_tokens_per_section: int = 500,
+) -> Dict:
+    """
+    Runs the benchmarks of every corpus.
+
+    Returns:
+        Dict: The report, with the timings, throughputs and peak memory of every stage and corpus.
+    """
+    # The client is never created: only the offline stages of the parser are benchmarked
+    parser = DocumentAnalysisParser(
+        "https://benchmark.cognitiveservices.azure.com/",
+        AzureKeyCredential("benchmark"),
+        table_format=table_format,
+    )
+    splitter = SentenceTextSplitter(
+        max_tokens_per_section=max_tokens_per_section, table_format=table_format
+    )
+    get_encoder()
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+        },
+        "settings": {
+            "repeat": repeat,
+            "table_format": table_format,
+            "max_tokens_per_section": max_tokens_per_section,
+        },
+        "corpora": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for corpus in corpora:
+            path = os.path.join(directory, f"{corpus.name}.pdf")
+            open(path, "wb").close()
+            with open(path, "rb") as content:
+                file = File(
+                    content=content,
+                    url=f"https://benchmark.blob.core.windows.net/documents/benchmarks/synthetic/psychology/book/{corpus.name}.pdf",
+                )
+                report["corpora"][corpus.name] = benchmark_corpus(
+                    corpus, parser, splitter, file, repeat
+                )
+    return report
+
+
+def find_regressions(
+    report: Dict,
+    baseline: Dict,
+    tolerance: float = 0.2,
+    memory_tolerance: float = 0.2,
+) -> List[str]:
+    """
+    Compares a report with a baseline report.
+
+    Args:
+        report (Dict): The report of the current run.
+        baseline (Dict): The stored baseline report.
+        tolerance (float): Allowed relative drop of every throughput, unless the corpus has its own tolerance.
+        memory_tolerance (float): Allowed relative growth of the peak memory of every stage.
+
+    Returns:
+        List[str]: A description of every metric that regressed.
+    """
+    regressions = []
+    for name, baseline_corpus in baseline.get("corpora", {}).items():
+        corpus = report["corpora"].get(name)
+        if corpus is None:
+            continue
+        corpus_tolerance = corpus.get("tolerance") or tolerance
+        for stage in STAGES:
+            current, previous = corpus[stage], baseline_corpus[stage]
+            for metric in THROUGHPUT_METRICS:
+                if not current.get(metric) or not previous.get(metric):
+                    continue
+                if current[metric] < previous[metric] * (1 - corpus_tolerance):
+                    regressions.append(
+                        f"{name}/{stage}: {metric} dropped from {previous[metric]:,.0f} to {current[metric]:,.0f}"
+                    )
+            if current["peak_memory_bytes"] > previous["peak_memory_bytes"] * (
+                1 + memory_tolerance
+            ):
+                regressions.append(
+                    f"{name}/{stage}: peak memory grew from {previous['peak_memory_bytes']:,} to {current['peak_memory_bytes']:,} bytes"
+                )
+    return regressions
+
+
+def find_scaling_regressions(report: Dict, tolerance: float = 0.2) -> List[str]:
+    """
+    Compares the pages per second of every corpus with the ones of its reference corpus in the same
+    report, which needs no baseline. A stage whose work per page grows with the number of pages is
+    slower on the longer corpus.
+
+    Returns:
+        List[str]: A description of every stage that does not scale linearly.
+    """
+    regressions = []
+    for name, corpus in report["corpora"].items():
+        reference = report["corpora"].get(corpus.get("reference"))
+        if reference is None:
+            continue
+        corpus_tolerance = corpus.get("tolerance") or tolerance
+        for stage in STAGES:
+            current = corpus[stage]["pages_per_second"]
+            expected = reference[stage]["pages_per_second"]
+            if current < expected * (1 - corpus_tolerance):
+                regressions.append(
+                    f"{name}/{stage}: {current:,.0f} pages/s for {corpus['pages']:,} pages, {expected:,.0f} for {reference['pages']:,}"
+                )
+    return regressions
+
+
+def changed_outputs(report: Dict, baseline: Dict) -> List[str]:
+    return [
+        name
+        for name, corpus in report["corpora"].items()
+        if name in baseline.get("corpora", {})
+        and corpus["output_digest"] != baseline["corpora"][name]["output_digest"]
+    ]
@@ -0,0 +1,190 @@
+import random
+from typing import Dict, List, Optional
+
+from azure.ai.documentintelligence.models import AnalyzeResult
+from pydantic.dataclasses import dataclass
+
+LATIN_WORDS = [
+    "memory",
+    "attention",
+    "learning",
+    "cognitive",
+    "behaviour",
+    "perception",
+    "the",
+    "of",
+    "and",
+    "in",
+    "response",
+    "stimulus",
+    "experiment",
+    "participants",
+    "results",
+    "theory",
+]
+
+CJK_WORDS = ["心理学", "记忆", "注意", "学习", "认知", "行为", "知觉", "实验", "结果"]
+
+LATIN_SENTENCE_ENDINGS = [".", ".", ".", "?", "!"]
+
+CJK_SENTENCE_ENDINGS = ["。", "。", "？", "！"]
+
+
+@dataclass
+class SyntheticCorpus:
+    """
+    Shape of a synthetic document
+
+    Attributes:
+        name (str): Name of the scenario in the benchmark report
+        pages (int): Number of pages of the document
+        chars_per_page (int): Approximate number of characters of text per page
+        tables_per_page (int): Number of tables per page
+        table_rows (int): Number of rows of every table
+        table_columns (int): Number of columns of every table
+        cjk_ratio (float): Fraction of the sentences written in Chinese
+        seed (int): Seed of the random generator, so every run produces the same document
+        tolerance (Optional[float]): Allowed relative drop of the throughputs of the corpus, instead of the tolerance of the run
+        reference (Optional[str]): Shorter corpus of the same shape. The pages per second of every stage must stay within
+            the tolerance of the ones of the reference in the same run, or the stage does not scale linearly with the pages
+    """
+
+    name: str
+    pages: int = 100
+    chars_per_page: int = 3000
+    tables_per_page: int = 0
+    table_rows: int = 6
+    table_columns: int = 4
+    cjk_ratio: float = 0.0
+    seed: int = 0
+    tolerance: Optional[float] = None
+    reference: Optional[str] = None
+
+    def scaled(self, scale: float) -> "SyntheticCorpus":
+        return SyntheticCorpus(
+            name=self.name,
+            pages=max(1, int(self.pages * scale)),
+            chars_per_page=self.chars_per_page,
+            tables_per_page=self.tables_per_page,
+            table_rows=self.table_rows,
+            table_columns=self.table_columns,
+            cjk_ratio=self.cjk_ratio,
+            seed=self.seed,
+            tolerance=self.tolerance,
+            reference=self.reference,
+        )
+
+
+DEFAULT_CORPORA = [
+    SyntheticCorpus(name="book", pages=300, chars_per_page=3000, tables_per_page=0),
+    # Starts with the pages of the book. A stage whose work per page grows with the length of the
+    # document, such as a linear page lookup per section, is about 3x slower per page here. The
+    # tolerance leaves room for the noise of comparing two corpora of the same run
+    SyntheticCorpus(
+        name="long_book",
+        pages=1000,
+        chars_per_page=3000,
+        tolerance=0.35,
+        reference="book",
+    ),
+    SyntheticCorpus(name="cjk", pages=200, chars_per_page=1500, cjk_ratio=0.8),
+    SyntheticCorpus(
+        name="tables",
+        pages=200,
+        chars_per_page=2000,
+        tables_per_page=3,
+        table_rows=10,
+        table_columns=5,
+    ),
+]
+
+
+def sentence(rnd: random.Random, cjk: bool) -> str:
+    if cjk:
+        words = rnd.choices(CJK_WORDS, k=rnd.randint(4, 16))
+        return "".join(words) + rnd.choice(CJK_SENTENCE_ENDINGS)
+    words = rnd.choices(LATIN_WORDS, k=rnd.randint(6, 24))
+    if rnd.random() < 0.2:
+        words[rnd.randrange(len(words))] += ","
+    return " ".join(words).capitalize() + rnd.choice(LATIN_SENTENCE_ENDINGS) + " "
+
+
+def table(
+    rnd: random.Random, corpus: SyntheticCorpus, page_number: int, offset: int
+) -> Dict:
+    """
+    Builds a table whose cells are laid out in the document content from offset on, as Document
+    Intelligence does. The content of the table is returned in the "text" key.
+    """
+    cells = []
+    parts = []
+    position = offset
+    for row_index in range(corpus.table_rows):
+        for column_index in range(corpus.table_columns):
+            content = " ".join(rnd.choices(LATIN_WORDS, k=rnd.randint(1, 3)))
+            cells.append(
+                {
+                    "kind": "columnHeader" if row_index == 0 else "content",
+                    "rowIndex": row_index,
+                    "columnIndex": column_index,
+                    "content": content,
+                    "spans": [{"offset": position, "length": len(content)}],
+                }
+            )
+            parts.append(content)
+            position += len(content) + 1
+    text = " ".join(parts) + "\n"
+    return {
+        "rowCount": corpus.table_rows,
+        "columnCount": corpus.table_columns,
+        "cells": cells,
+        "boundingRegions": [{"pageNumber": page_number, "polygon": []}],
+        "spans": [{"offset": offset, "length": len(text)}],
+        "text": text,
+    }
+
+
+def generate_analyze_result(corpus: SyntheticCorpus) -> AnalyzeResult:
+    """
+    Generates a Document Intelligence layout result with the shape of the corpus: the content of the
+    document, the span of every page and the tables with their cells and spans.
+    """
+    rnd = random.Random(corpus.seed)
+    content: List[str] = []
+    length = 0
+    pages = []
+    tables = []
+    for page_number in range(1, corpus.pages + 1):
+        page_offset = length
+        table_positions = sorted(
+            rnd.randrange(corpus.chars_per_page) for _ in range(corpus.tables_per_page)
+        )
+        page_length = 0
+        while page_length < corpus.chars_per_page:
+            if table_positions and page_length >= table_positions[0]:
+                table_positions.pop(0)
+                page_table = table(rnd, corpus, page_number, length)
+                text = page_table.pop("text")
+                tables.append(page_table)
+            else:
+                text = sentence(rnd, rnd.random() < corpus.cjk_ratio)
+                if rnd.random() < 0.1:
+                    text += "\n"
+            content.append(text)
+            length += len(text)
+            page_length += len(text)
+        pages.append(
+            {
+                "pageNumber": page_number,
+                "spans": [{"offset": page_offset, "length": length - page_offset}],
+            }
+        )
+    return AnalyzeResult(
+        {
+            "apiVersion": "2024-02-29-preview",
+            "modelId": "prebuilt-layout",
+            "content": "".join(content),
+            "pages": pages,
+            "tables": tables,
+        }
+    )
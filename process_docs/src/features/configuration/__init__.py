@@ -1,3 +1,3 @@
-from .settings import get_app_settings
+from .settings import Settings, get_app_settings
 
-__all__ = ["get_app_settings"]
+__all__ = ["Settings", "get_app_settings"]
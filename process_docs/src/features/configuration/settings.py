@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,6 +10,51 @@ class Settings(BaseSettings):
     storage_account_name: str
     storage_account_container: str
     storage_account_connection_string: str
+    docintelligence_table_format: Literal["html", "markdown", "tsv"] = "html"
+    docintelligence_api_version: str = "2024-02-29-preview"
+    analysis_cache_dir: Optional[str] = None
+    analysis_cache_max_bytes: int = 2 * 1024 * 1024 * 1024
+    analysis_scheduler_enabled: bool = False
+    analysis_max_concurrency: int = 4
+    analysis_max_retries: int = 5
+    analysis_polling_interval: float = 2.0
+    ingestion_max_workers: int = 4
+    ingestion_manifest_blob: str = "manifests/ingestion-manifest.json"
+    ingestion_full_refresh: bool = False
+    ingestion_max_in_flight: int = 8
+    ingestion_spool_dir: Optional[str] = None
+    splitter_processes: int = 0
+    tiktoken_cache_dir: Optional[str] = None
+    dedup_enabled: bool = False
+    dedup_policy: Literal["keep_first", "drop", "merge_metadata"] = "keep_first"
+    dedup_threshold: float = 0.85
+    storage_download_chunk_size: int = 4 * 1024 * 1024
+    storage_download_max_concurrency: int = 1
+    sink_mode: Literal["json", "jsonl", "push"] = "json"
+    sink_batch_size: int = 0
+    sink_max_concurrency: int = 8
+    sink_max_pending: int = 16
+    azure_search_endpoint: Optional[str] = None
+    azure_search_admin_key: Optional[str] = None
+    azure_search_index_name: Optional[str] = None
+    azure_search_alias_api_version: str = "2024-05-01-preview"
+    search_upload_batch_size: int = 1000
+    openai_resource_uri: Optional[str] = None
+    openai_api_key: Optional[str] = None
+    openai_api_version: str = "2024-06-01"
+    openai_embeddings_deployment_id: Optional[str] = None
+    openai_embeddings_dimensions: int = 0
+    embedding_batch_size: int = 256
+    embedding_max_batch_tokens: int = 100_000
+    embedding_max_concurrency: int = 4
+    embedding_tokens_per_minute: int = 0
+    embedding_cache_dir: Optional[str] = None
+    embedding_cache_max_bytes: int = 1024 * 1024 * 1024
+    http_pool_size: int = 16
+    http_connection_timeout: float = 30
+    http_read_timeout: float = 300
+    http_retry_total: int = 5
+    http_retry_backoff_factor: float = 0.8
     model_config = SettingsConfigDict(env_file="../.env")
 
 
@@ -0,0 +1,3 @@
+from .section_deduplicator import SectionDeduplicator
+
+__all__ = ["SectionDeduplicator"]
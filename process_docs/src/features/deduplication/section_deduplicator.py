@@ -0,0 +1,384 @@
+import dataclasses
+import logging
+import threading
+from array import array
+from typing import (
+    Any,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Literal,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from pydantic.dataclasses import dataclass
+
+from features.parsers import File
+
+logger = logging.getLogger("ingester")
+
+SHINGLE_SIZE = 5
+HASH_MASK = (1 << 64) - 1
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """
+    Character shingles of the lowercased text with its whitespace collapsed. Characters rather than words
+    are used so that texts without spaces, such as Chinese, are compared as well.
+    """
+    text = " ".join(text.lower().split())
+    if len(text) <= size:
+        return {text}
+    return {text[i : i + size] for i in range(len(text) - size + 1)}
+
+
+def minhash_signature(text: str, num_hashes: int) -> array:
+    """
+    One permutation MinHash of the shingles of the text: every shingle is hashed once and the hash space
+    is split into num_hashes buckets that keep their minimum. Empty buckets borrow the minimum of the next
+    non-empty bucket, so that the signatures of short texts stay comparable.
+    The signatures use the hash of the process, so they are only comparable within a run.
+    """
+    minimums = [HASH_MASK] * num_hashes
+    for shingle in shingles(text):
+        value = hash(shingle) & HASH_MASK
+        bucket = value % num_hashes
+        if value < minimums[bucket]:
+            minimums[bucket] = value
+    signature = array("Q", minimums)
+    if HASH_MASK in minimums and len(set(minimums)) > 1:
+        for bucket in range(num_hashes):
+            offset = 1
+            while signature[bucket] == HASH_MASK:
+                signature[bucket] = minimums[(bucket + offset) % num_hashes]
+                offset += 1
+    return signature
+
+
+def similarity(signature: array, other: array) -> float:
+    """
+    Estimates the Jaccard similarity of the shingles of two texts from their signatures.
+    """
+    return sum(a == b for a, b in zip(signature, other)) / len(signature)
+
+
+@dataclass
+class DeduplicationGroup:
+    """
+    The first section seen of a group of near-duplicate sections
+
+    Attributes:
+        document_id (str): Id of the search document of the section
+        source (str): Url of the file the section belongs to
+        blob_name (Optional[str]): Name of the blob of the file, when it comes from the storage account
+    """
+
+    document_id: str
+    source: str
+    blob_name: Optional[str] = None
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class SignatureIndex:
+    """
+    Locality sensitive hashing index of MinHash signatures: a signature is a candidate near duplicate of
+    another when one of its bands is identical, and a near duplicate when their estimated similarity reaches
+    the threshold
+
+    Attributes:
+        threshold (float): Estimated Jaccard similarity from which two sections are near duplicates
+        bands (int): Number of bands the signatures are split into
+        rows (int): Number of hashes of every band
+    """
+
+    threshold: float
+    bands: int
+    rows: int
+
+    def __post_init__(self):
+        self.signatures: List[array] = []
+        self.groups: List[DeduplicationGroup] = []
+        self.buckets: List[Dict[int, List[int]]] = [{} for _ in range(self.bands)]
+
+    def band_keys(self, signature: array) -> List[int]:
+        return [
+            hash(tuple(signature[band * self.rows : (band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def find(self, signature: array) -> Optional[DeduplicationGroup]:
+        """
+        Returns the group of the first indexed signature the signature is a near duplicate of, if any.
+        """
+        candidates = set()
+        for band, key in enumerate(self.band_keys(signature)):
+            candidates.update(self.buckets[band].get(key, ()))
+        for candidate in sorted(candidates):
+            if similarity(signature, self.signatures[candidate]) >= self.threshold:
+                return self.groups[candidate]
+        return None
+
+    def add(self, signature: array, group: DeduplicationGroup):
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        self.groups.append(group)
+        for band, key in enumerate(self.band_keys(signature)):
+            self.buckets[band].setdefault(key, []).append(index)
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class SectionDeduplicator:
+    """
+    Detects near-duplicate sections with MinHash signatures and locality sensitive hashing, before they
+    are written. Within a document the policy decides: "keep_first" keeps the first section of every group,
+    "drop" drops every section of the groups, which removes the headers, footers and copyright pages repeated
+    through a document, and "merge_metadata" keeps the first section with the pages where the other sections
+    of its group start in duplicate_pages.
+    When the run covers every document, sections that are near duplicates of a section written for another
+    document are dropped too. The documents take turns in the order they are read, which is the order of
+    their blob names, so the section that is kept does not depend on the scheduling of the workers
+
+    Attributes:
+        policy (str): What to do with the near-duplicate sections of a document
+        threshold (float): Estimated Jaccard similarity from which two sections are near duplicates
+        num_hashes (int): Length of the MinHash signatures
+        bands (int): Number of LSH bands the signatures are split into
+    """
+
+    policy: Literal["keep_first", "drop", "merge_metadata"] = "keep_first"
+    threshold: float = 0.85
+    num_hashes: int = 64
+    bands: int = 16
+    across_files: bool = dataclasses.field(default=False, init=False)
+    sections_seen: int = dataclasses.field(default=0, init=False)
+    sections_dropped: int = dataclasses.field(default=0, init=False)
+    sections_merged: int = dataclasses.field(default=0, init=False)
+    lock: Any = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        if self.num_hashes % self.bands:
+            raise ValueError("num_hashes must be a multiple of bands")
+        self.rows = self.num_hashes // self.bands
+        self.index = self.new_index()
+        self.turn_changed = threading.Condition()
+        self.turns: Dict[str, int] = {}
+        self.finished_turns: Set[int] = set()
+        self.next_turn = 0
+        self.duplicates: Dict[str, Set[str]] = {}
+
+    def config_values(self) -> Tuple:
+        """
+        The settings of the deduplicator that determine the written sections.
+        """
+        return self.policy, self.threshold, self.num_hashes, self.bands
+
+    def new_index(self) -> SignatureIndex:
+        return SignatureIndex(
+            threshold=self.threshold, bands=self.bands, rows=self.rows
+        )
+
+    def start(self, files: Iterable[File], across_files: bool) -> Iterable[File]:
+        """
+        Starts a run over the files. Sections are only compared with the sections of other files when
+        the run covers every document: a near duplicate of a document that is not processed could not be
+        restored if that document changed later.
+
+        Args:
+            files (Iterable[File]): The files of the run, in the order of their blob names.
+            across_files (bool): Whether the files are every document of the container.
+
+        Returns:
+            Iterable[File]: The files, which take turns in that order to compare their sections with the previous files.
+        """
+        self.across_files = across_files
+        self.index = self.new_index()
+        self.turns = {}
+        self.finished_turns = set()
+        self.next_turn = 0
+        self.duplicates = {}
+        if not across_files:
+            return files
+        return self.number_files(files)
+
+    def number_files(self, files: Iterable[File]) -> Generator[File, None, None]:
+        for turn, file in enumerate(files):
+            with self.turn_changed:
+                self.turns[file.url] = turn
+            yield file
+
+    def turn_of(self, file: File) -> Optional[int]:
+        with self.turn_changed:
+            return self.turns.get(file.url)
+
+    def wait_turn(self, file: File):
+        """
+        Blocks until every file read before this one has been deduplicated.
+        """
+        with self.turn_changed:
+            turn = self.turns.get(file.url)
+            if turn is not None:
+                self.turn_changed.wait_for(lambda: self.next_turn >= turn)
+
+    def end_turn(self, file: File):
+        """
+        Lets the next file compare its sections. Files that failed end their turn as well, and ending
+        it twice has no effect.
+        """
+        with self.turn_changed:
+            turn = self.turns.pop(file.url, None)
+            if turn is None:
+                return
+            self.finished_turns.add(turn)
+            while self.next_turn in self.finished_turns:
+                self.finished_turns.remove(self.next_turn)
+                self.next_turn += 1
+            self.turn_changed.notify_all()
+
+    def duplicate_of(self, file: File) -> List[str]:
+        """
+        Returns the blob names of the other documents whose sections made the file drop some of its own.
+        The file has to be processed again if any of them changes.
+        """
+        with self.lock:
+            return sorted(self.duplicates.pop(file.url, ()))
+
+    def signature(self, document: Dict) -> array:
+        return minhash_signature(document["content"], self.num_hashes)
+
+    def new_group(self, file: File, document: Dict) -> DeduplicationGroup:
+        return DeduplicationGroup(
+            document_id=document["id"], source=file.url, blob_name=file.blob_name
+        )
+
+    def drop_duplicate(self, file: File, group: DeduplicationGroup):
+        with self.lock:
+            self.sections_dropped += 1
+            if group.source != file.url and group.blob_name is not None:
+                self.duplicates.setdefault(file.url, set()).add(group.blob_name)
+
+    def filter(
+        self, file: File, documents: Iterable[Dict]
+    ) -> Generator[Dict, None, None]:
+        """
+        Yields the documents of the file that are not dropped as near duplicates. With the "keep_first"
+        policy within the file the documents are streamed; the other policies, and the comparison with the
+        sections of the other files, need all the documents of the file first. The turn of the file ends
+        before the documents are yielded, so the next files never wait for the documents to be written.
+        """
+        try:
+            if self.policy == "keep_first":
+                yield from self.keep_first(file, documents)
+            else:
+                yield from self.group(file, documents)
+        finally:
+            self.end_turn(file)
+
+    def keep_first(
+        self, file: File, documents: Iterable[Dict]
+    ) -> Generator[Dict, None, None]:
+        if self.across_files:
+            yield from self.keep_first_across_files(file, documents)
+            return
+        index = self.new_index()
+        for document in documents:
+            signature = self.signature(document)
+            self.count(seen=1)
+            group = index.find(signature)
+            if group is None:
+                index.add(signature, self.new_group(file, document))
+                yield document
+            else:
+                self.drop_duplicate(file, group)
+
+    def keep_first_across_files(
+        self, file: File, documents: Iterable[Dict]
+    ) -> Generator[Dict, None, None]:
+        # The signatures are computed before the turn, which is only held while they are compared
+        signed = [(document, self.signature(document)) for document in documents]
+        self.wait_turn(file)
+        kept = []
+        for document, signature in signed:
+            with self.lock:
+                self.sections_seen += 1
+                group = self.index.find(signature)
+                if group is None:
+                    self.index.add(signature, self.new_group(file, document))
+            if group is None:
+                kept.append(document)
+            else:
+                self.drop_duplicate(file, group)
+        self.end_turn(file)
+        yield from kept
+
+    def group(
+        self, file: File, documents: Iterable[Dict]
+    ) -> Generator[Dict, None, None]:
+        signed = [(document, self.signature(document)) for document in documents]
+        self.wait_turn(file)
+        index = self.new_index()
+        kept: Dict[str, Tuple[Dict, array]] = {}
+        members: Dict[str, List[Dict]] = {}
+        for document, signature in signed:
+            with self.lock:
+                self.sections_seen += 1
+                group = self.index.find(signature) if self.across_files else None
+            if group is not None:
+                self.drop_duplicate(file, group)
+                continue
+            group = index.find(signature)
+            if group is None:
+                index.add(signature, self.new_group(file, document))
+                kept[document["id"]] = (document, signature)
+                members[document["id"]] = [document]
+            else:
+                members[group.document_id].append(document)
+
+        written = []
+        for document_id, (document, signature) in kept.items():
+            group_members = members[document_id]
+            if len(group_members) == 1:
+                written.append(document)
+            elif self.policy == "drop":
+                self.count(dropped=len(group_members))
+                continue
+            else:
+                # page and end_page stay the range of the kept section
+                duplicate_pages = []
+                for member in group_members[1:]:
+                    if (
+                        member["page"] != document["page"]
+                        and member["page"] not in duplicate_pages
+                    ):
+                        duplicate_pages.append(member["page"])
+                self.count(dropped=len(group_members) - 1, merged=1)
+                written.append({**document, "duplicate_pages": duplicate_pages})
+            # Only the sections that are written can make the sections of the next files duplicates
+            if self.across_files:
+                with self.lock:
+                    self.index.add(signature, self.new_group(file, document))
+        self.end_turn(file)
+        yield from written
+
+    def count(self, seen: int = 0, dropped: int = 0, merged: int = 0):
+        with self.lock:
+            self.sections_seen += seen
+            self.sections_dropped += dropped
+            self.sections_merged += merged
+
+    def reduction(self) -> float:
+        return self.sections_dropped / self.sections_seen if self.sections_seen else 0.0
+
+    def log(self):
+        logger.info(
+            "Deduplication (%s): %d of %d sections dropped as near duplicates (%.1f%% fewer sections), %d sections merged",
+            self.policy,
+            self.sections_dropped,
+            self.sections_seen,
+            100 * self.reduction(),
+            self.sections_merged,
+        )
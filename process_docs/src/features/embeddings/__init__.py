@@ -0,0 +1,4 @@
+from .batch_embedder import BatchEmbedder, TokenBudget
+from .embedding_cache import EmbeddingCache
+
+__all__ = ["BatchEmbedder", "EmbeddingCache", "TokenBudget"]
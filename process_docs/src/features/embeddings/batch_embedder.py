@@ -0,0 +1,203 @@
+import dataclasses
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional, Tuple
+
+from openai import AzureOpenAI
+from pydantic.dataclasses import dataclass
+
+from features.splitters import get_encoder
+
+from .embedding_cache import EmbeddingCache
+
+logger = logging.getLogger("ingester")
+
+# Limit of the Azure OpenAI embeddings API
+MAX_INPUTS_PER_REQUEST = 2048
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class TokenBudget:
+    """
+    Token bucket that keeps the embedding requests under the tokens per minute quota of the deployment.
+    The bucket starts full and refills continuously at tokens_per_minute / 60 tokens per second
+
+    Attributes:
+        tokens_per_minute (int): Tokens that can be spent every minute
+    """
+
+    tokens_per_minute: int
+    available: float = dataclasses.field(default=0.0, init=False)
+    updated_at: float = dataclasses.field(default=0.0, init=False)
+    lock: Any = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        self.available = float(self.tokens_per_minute)
+        self.updated_at = time.monotonic()
+
+    def acquire(self, tokens: int):
+        """
+        Blocks until the tokens can be spent. Requests larger than the whole budget wait for a full bucket.
+        """
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.available = min(
+                    self.tokens_per_minute,
+                    self.available
+                    + (now - self.updated_at) * self.tokens_per_minute / 60,
+                )
+                self.updated_at = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait = (tokens - self.available) * 60 / self.tokens_per_minute
+            time.sleep(wait)
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class BatchEmbedder:
+    """
+    Embeds texts with Azure OpenAI sending many inputs per request. The requests of a call run
+    concurrently, and every request waits for its tokens in the token budget before it is sent
+
+    Attributes:
+        client (AzureOpenAI): Azure OpenAI client. Throttled requests are retried by the client honoring the Retry-After header
+        deployment (str): Name of the embeddings deployment
+        dimensions (Optional[int]): Number of dimensions of the embeddings, for the models that can shorten them
+        batch_size (int): Maximum number of inputs per request
+        max_batch_tokens (int): Maximum number of tokens per request
+        max_concurrency (int): Number of requests sent at the same time
+        token_budget (Optional[TokenBudget]): Tokens per minute budget shared by every request
+        cache (Optional[EmbeddingCache]): Cache of the embeddings of previously embedded texts
+    """
+
+    client: AzureOpenAI
+    deployment: str
+    dimensions: Optional[int] = None
+    batch_size: int = 256
+    max_batch_tokens: int = 100_000
+    max_concurrency: int = 4
+    token_budget: Optional[TokenBudget] = None
+    cache: Optional[EmbeddingCache] = None
+    requests: int = dataclasses.field(default=0, init=False)
+    tokens: int = dataclasses.field(default=0, init=False)
+
+    def __post_init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self.lock = threading.Lock()
+
+    def embed(
+        self, texts: List[str], token_counts: Optional[List[Optional[int]]] = None
+    ) -> List[List[float]]:
+        """
+        Returns the embeddings of the texts, looking them up in the cache first. Only the texts that are
+        not cached are sent to the service, once even if they are repeated.
+
+        Args:
+            texts (List[str]): The texts to embed.
+            token_counts (Optional[List[Optional[int]]]): The number of tokens of every text, when it is already known,
+                e.g. from the splitter. The texts without it are tokenized to batch the requests.
+
+        Returns:
+            List[List[float]]: The embedding of every text, in the order of the texts.
+        """
+        if token_counts is None:
+            token_counts = [None] * len(texts)
+        if self.cache is None:
+            return self.embed_uncached(texts, token_counts)
+        keys = [
+            EmbeddingCache.key(text, self.deployment, self.dimensions) for text in texts
+        ]
+        embeddings = self.cache.get_many(keys)
+        missing = {}
+        for key, text, token_count, embedding in zip(
+            keys, texts, token_counts, embeddings
+        ):
+            if embedding is None:
+                missing.setdefault(key, (text, token_count))
+        if not missing:
+            return embeddings
+        missing_texts, missing_token_counts = zip(*missing.values())
+        computed = dict(
+            zip(
+                missing,
+                self.embed_uncached(list(missing_texts), list(missing_token_counts)),
+            )
+        )
+        self.cache.put_many(list(computed.items()))
+        return [
+            embedding if embedding is not None else computed[key]
+            for key, embedding in zip(keys, embeddings)
+        ]
+
+    def embed_uncached(
+        self, texts: List[str], token_counts: List[Optional[int]]
+    ) -> List[List[float]]:
+        token_counts = [
+            len(get_encoder().encode(text)) if token_count is None else token_count
+            for text, token_count in zip(texts, token_counts)
+        ]
+        batches = self.batches(token_counts)
+        embeddings = []
+        for batch_embeddings in self.executor.map(
+            lambda batch: self.embed_batch(
+                texts[batch[0] : batch[1]], sum(token_counts[batch[0] : batch[1]])
+            ),
+            batches,
+        ):
+            embeddings.extend(batch_embeddings)
+        return embeddings
+
+    def batches(self, token_counts: List[int]) -> List[Tuple[int, int]]:
+        """
+        Groups consecutive texts into requests of at most batch_size inputs and max_batch_tokens tokens.
+
+        Returns:
+            List[Tuple[int, int]]: The start and end index of the texts of every request.
+        """
+        batch_size = min(self.batch_size, MAX_INPUTS_PER_REQUEST)
+        batches = []
+        start = 0
+        batch_tokens = 0
+        for index, token_count in enumerate(token_counts):
+            if index > start and (
+                index - start >= batch_size
+                or batch_tokens + token_count > self.max_batch_tokens
+            ):
+                batches.append((start, index))
+                start = index
+                batch_tokens = 0
+            batch_tokens += token_count
+        if start < len(token_counts):
+            batches.append((start, len(token_counts)))
+        return batches
+
+    def embed_batch(self, texts: List[str], token_count: int) -> List[List[float]]:
+        if self.token_budget is not None:
+            self.token_budget.acquire(token_count)
+        kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+        response = self.client.embeddings.create(
+            input=texts, model=self.deployment, **kwargs
+        )
+        with self.lock:
+            self.requests += 1
+            self.tokens += response.usage.total_tokens
+        return [
+            item.embedding
+            for item in sorted(response.data, key=lambda item: item.index)
+        ]
+
+    def log(self):
+        logger.info("Embeddings: %d tokens in %d requests", self.tokens, self.requests)
+
+    def close(self):
+        self.executor.shutdown()
+        self.client.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,225 @@
+import dataclasses
+import hashlib
+import logging
+import mmap
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic.dataclasses import dataclass
+
+logger = logging.getLogger("ingester")
+
+FLOAT_SIZE = array("f").itemsize
+
+# Part of every key, bump whenever the derivation of the keys changes so the previous entries are never hit
+KEY_VERSION = 2
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class EmbeddingCache:
+    """
+    Persistent, size bounded cache of embeddings keyed by the hash of the NFC normalized text, the embedding
+    model and the number of dimensions. The vectors are stored as float32 rows of a matrix file per number
+    of dimensions, read through a memory map, and an SQLite index maps every key to its row. The least
+    recently used embeddings are evicted when the cache grows over max_bytes and their rows are reused
+
+    Attributes:
+        directory (str): Directory where the matrices and the index are stored
+        max_bytes (int): Maximum size of the stored vectors
+    """
+
+    directory: str
+    max_bytes: int = 1024 * 1024 * 1024
+    hits: int = dataclasses.field(default=0, init=False)
+    misses: int = dataclasses.field(default=0, init=False)
+    lock: Any = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.connection = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite"), check_same_thread=False
+        )
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key BLOB PRIMARY KEY,
+                dimensions INTEGER NOT NULL,
+                row INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+            CREATE TABLE IF NOT EXISTS free_rows (
+                dimensions INTEGER NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (dimensions, row)
+            );
+            """
+        )
+        self.matrices: Dict[int, Tuple[int, Optional[mmap.mmap]]] = {}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalizes the Unicode form of the text. The whitespace is kept: the line breaks and tabs of the
+        markdown and TSV tables change the embedding.
+        """
+        return unicodedata.normalize("NFC", text)
+
+    @classmethod
+    def key(cls, text: str, model: str, dimensions: Optional[int]) -> bytes:
+        return hashlib.sha256(
+            f"{KEY_VERSION}|{model}|{dimensions}|{cls.normalize(text)}".encode("utf-8")
+        ).digest()
+
+    def matrix_path(self, dimensions: int) -> str:
+        return os.path.join(self.directory, f"vectors-{dimensions}.f32")
+
+    def matrix_fd(self, dimensions: int) -> int:
+        if dimensions not in self.matrices:
+            fd = os.open(self.matrix_path(dimensions), os.O_RDWR | os.O_CREAT, 0o644)
+            self.matrices[dimensions] = (fd, None)
+        return self.matrices[dimensions][0]
+
+    def read_row(self, dimensions: int, row: int) -> List[float]:
+        row_bytes = dimensions * FLOAT_SIZE
+        start = row * row_bytes
+        fd = self.matrix_fd(dimensions)
+        mapped = self.matrices[dimensions][1]
+        if mapped is None or len(mapped) < start + row_bytes:
+            # The matrix grew since it was mapped
+            if mapped is not None:
+                mapped.close()
+            mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+            self.matrices[dimensions] = (fd, mapped)
+        return array("f", mapped[start : start + row_bytes]).tolist()
+
+    def get_many(self, keys: Sequence[bytes]) -> List[Optional[List[float]]]:
+        """
+        Returns:
+            List[Optional[List[float]]]: The cached embedding of every key, or None for the keys that are not cached.
+        """
+        if not keys:
+            return []
+        with self.lock:
+            found = {}
+            unique_keys = list(set(keys))
+            for i in range(0, len(unique_keys), 500):
+                chunk = unique_keys[i : i + 500]
+                found.update(
+                    (key, (dimensions, row))
+                    for key, dimensions, row in self.connection.execute(
+                        f"SELECT key, dimensions, row FROM entries WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    )
+                )
+            embeddings = [
+                self.read_row(*found[key]) if key in found else None for key in keys
+            ]
+            now = time.time()
+            self.connection.executemany(
+                "UPDATE entries SET last_used = ? WHERE key = ?",
+                [(now, key) for key in found],
+            )
+            self.connection.commit()
+            self.hits += len(keys) - embeddings.count(None)
+            self.misses += embeddings.count(None)
+        return embeddings
+
+    def put_many(self, items: Sequence[Tuple[bytes, List[float]]]):
+        with self.lock:
+            items = [
+                (key, embedding)
+                for key, embedding in dict(items).items()
+                if not self.connection.execute(
+                    "SELECT 1 FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+            ]
+            # Make room first, so the new embeddings reuse the evicted rows
+            self.evict(sum(len(embedding) for _, embedding in items) * FLOAT_SIZE)
+            now = time.time()
+            for key, embedding in items:
+                dimensions = len(embedding)
+                row = self.allocate_row(dimensions)
+                os.pwrite(
+                    self.matrix_fd(dimensions),
+                    array("f", embedding).tobytes(),
+                    row * dimensions * FLOAT_SIZE,
+                )
+                self.connection.execute(
+                    "INSERT INTO entries (key, dimensions, row, last_used) VALUES (?, ?, ?, ?)",
+                    (key, dimensions, row, now),
+                )
+            self.connection.commit()
+
+    def allocate_row(self, dimensions: int) -> int:
+        """
+        Returns a row freed by an eviction, or a new row at the end of the matrix.
+        """
+        free_row = self.connection.execute(
+            "SELECT row FROM free_rows WHERE dimensions = ? LIMIT 1", (dimensions,)
+        ).fetchone()
+        if free_row is not None:
+            self.connection.execute(
+                "DELETE FROM free_rows WHERE dimensions = ? AND row = ?",
+                (dimensions, free_row[0]),
+            )
+            return free_row[0]
+        matrix_size = os.fstat(self.matrix_fd(dimensions)).st_size
+        return matrix_size // (dimensions * FLOAT_SIZE)
+
+    def size_bytes(self) -> int:
+        (size,) = self.connection.execute(
+            "SELECT COALESCE(SUM(dimensions), 0) FROM entries"
+        ).fetchone()
+        return size * FLOAT_SIZE
+
+    def evict(self, reserved_bytes: int = 0):
+        """
+        Removes the least recently used embeddings until the cache and the reserved bytes fit in max_bytes.
+        """
+        excess = self.size_bytes() + reserved_bytes - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = []
+        for key, dimensions, row in self.connection.execute(
+            "SELECT key, dimensions, row FROM entries ORDER BY last_used"
+        ):
+            if excess <= 0:
+                break
+            evicted.append((key, dimensions, row))
+            excess -= dimensions * FLOAT_SIZE
+        self.connection.executemany(
+            "DELETE FROM entries WHERE key = ?", [(key,) for key, _, _ in evicted]
+        )
+        self.connection.executemany(
+            "INSERT INTO free_rows (dimensions, row) VALUES (?, ?)",
+            [(dimensions, row) for _, dimensions, row in evicted],
+        )
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def log(self):
+        logger.info(
+            "Embedding cache: %d hits, %d misses (%.1f%% hit rate)",
+            self.hits,
+            self.misses,
+            100 * self.hit_rate(),
+        )
+
+    def close(self):
+        with self.lock:
+            for fd, mapped in self.matrices.values():
+                if mapped is not None:
+                    mapped.close()
+                os.close(fd)
+            self.matrices = {}
+            self.connection.close()
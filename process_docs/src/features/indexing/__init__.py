@@ -0,0 +1,13 @@
+from .search_index_sink import (
+    TOKEN_COUNT_FIELD,
+    SearchIndexSink,
+    delete_file_documents,
+    get_alias_index,
+)
+
+__all__ = [
+    "SearchIndexSink",
+    "TOKEN_COUNT_FIELD",
+    "delete_file_documents",
+    "get_alias_index",
+]
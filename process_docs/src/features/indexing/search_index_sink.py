@@ -0,0 +1,216 @@
+import dataclasses
+import logging
+import threading
+from typing import Any, Collection, Dict, Iterable, List, Optional, Tuple
+
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
+from azure.core.rest import HttpRequest
+from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
+from pydantic.dataclasses import dataclass
+
+from features.embeddings import BatchEmbedder
+from features.parsers import File
+from features.transport import SharedHttpTransport
+
+logger = logging.getLogger("ingester")
+
+# Limit of documents per indexing request of Azure AI Search
+MAX_UPLOAD_BATCH_SIZE = 1000
+
+EMBEDDINGS_FIELD = "embeddings"
+
+# Number of tokens of the section counted by the splitter, which spares the embedder from tokenizing it
+# again. It is not a field of the index: the sinks remove it before writing the documents
+TOKEN_COUNT_FIELD = "token_count"
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class SearchIndexSink:
+    """
+    Pushes the processed sections of a document directly into the search index, embedding them
+    on the client, so they are searchable as soon as the document is processed instead of after the next
+    run of the indexer
+
+    Attributes:
+        endpoint (str): Endpoint of the Azure AI Search service
+        credential (AzureKeyCredential): Admin key of the Azure AI Search service
+        index_name (str): Name of the target index
+        embedder (BatchEmbedder): Embedder of the content of the sections
+        batch_size (int): Number of documents per indexing request, at most 1000
+        http_transport (Optional[SharedHttpTransport]): Connection pool shared with the other Azure clients
+    """
+
+    endpoint: str
+    credential: AzureKeyCredential
+    index_name: str
+    embedder: BatchEmbedder
+    batch_size: int = MAX_UPLOAD_BATCH_SIZE
+    http_transport: Optional[SharedHttpTransport] = None
+    client: Optional[Any] = dataclasses.field(default=None, init=False, repr=False)
+    lock: Any = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    mode = "push"
+
+    def config_values(self) -> Tuple:
+        """
+        The settings of the sink that determine the indexed documents.
+        """
+        return (
+            self.mode,
+            self.index_name,
+            self.embedder.deployment,
+            self.embedder.dimensions,
+        )
+
+    def get_client(self) -> SearchClient:
+        with self.lock:
+            if self.client is None:
+                transport_kwargs = (
+                    self.http_transport.client_kwargs() if self.http_transport else {}
+                )
+                self.client = SearchClient(
+                    endpoint=self.endpoint,
+                    index_name=self.index_name,
+                    credential=self.credential,
+                    **transport_kwargs,
+                )
+            return self.client
+
+    def write(self, file: File, documents: Iterable[Dict]) -> int:
+        """
+        Embeds and uploads the documents of a file in batches as they are produced. Raises a RuntimeError
+        if any of the documents could not be indexed.
+
+        Returns:
+            int: The number of documents written.
+        """
+        batch_size = min(self.batch_size, MAX_UPLOAD_BATCH_SIZE)
+        batch = []
+        written = 0
+        for document in documents:
+            batch.append(document)
+            if len(batch) == batch_size:
+                written += self.upload(batch)
+                batch = []
+        if batch:
+            written += self.upload(batch)
+        return written
+
+    def delete(self, file: File, keep_ids: Collection[str] = ()) -> int:
+        """
+        Deletes the documents indexed for the file that were not written again, so that a document with
+        fewer sections than before does not leave the extra ones searchable.
+
+        Args:
+            file (File): The file whose documents are deleted.
+            keep_ids (Collection[str]): The ids of the documents just written for the file.
+
+        Returns:
+            int: The number of documents deleted.
+        """
+        return delete_file_documents(self.get_client(), file, keep=keep_ids)
+
+    def upload(self, documents: List[Dict]) -> int:
+        token_counts = [document.pop(TOKEN_COUNT_FIELD, None) for document in documents]
+        # The embeddings service rejects empty inputs, those documents are indexed without a vector
+        embedded = [
+            (document, token_count)
+            for document, token_count in zip(documents, token_counts)
+            if document["content"]
+        ]
+        for (document, _), embedding in zip(
+            embedded,
+            self.embedder.embed(
+                [document["content"] for document, _ in embedded],
+                [token_count for _, token_count in embedded],
+            ),
+        ):
+            document[EMBEDDINGS_FIELD] = embedding
+        results = self.get_client().merge_or_upload_documents(documents=documents)
+        failed = [result for result in results if not result.succeeded]
+        for result in failed[:5]:
+            logger.error(
+                f"\tGot an error while indexing {result.key} -> {result.status_code} {result.error_message}"
+            )
+        if failed:
+            raise RuntimeError(
+                f"{len(failed)} of {len(documents)} documents could not be indexed"
+            )
+        return len(documents)
+
+    def close(self):
+        self.embedder.close()
+        with self.lock:
+            if self.client is not None:
+                self.client.close()
+            self.client = None
+
+
+def delete_file_documents(
+    client: SearchClient, file: File, keep: Collection[str] = ()
+) -> int:
+    """
+    Deletes the documents of the file from the index of the client, except the ones whose id is in keep.
+    They are found by their source_id, which is unique to the url of the file. The documents indexed
+    before the source_id field existed are found by the fields that the pipeline derives from the url.
+
+    Returns:
+        int: The number of documents deleted.
+    """
+    keys = [
+        {"id": result["id"]}
+        for filter in (file_filter(file), legacy_file_filter(file))
+        for result in client.search(search_text="*", filter=filter, select=["id"])
+        if result["id"] not in keep
+    ]
+    for start in range(0, len(keys), MAX_UPLOAD_BATCH_SIZE):
+        client.delete_documents(documents=keys[start : start + MAX_UPLOAD_BATCH_SIZE])
+    return len(keys)
+
+
+def file_filter(file: File) -> str:
+    """
+    OData filter of the documents of the file.
+    """
+    return f"source_id eq '{file.url_hash()}'"
+
+
+def legacy_file_filter(file: File) -> str:
+    """
+    OData filter of the documents of the file indexed without a source_id. It also matches the ones of
+    the files with the same filename, subject and type, which are indexed again with a source_id as well.
+    """
+    parts = file.url.split("/")
+    values = {"subject": parts[6], "type": parts[7], "title": file.filename()}
+    clauses = ["source_id eq null"]
+    for field, value in values.items():
+        escaped = value.replace("'", "''")
+        clauses.append(f"{field} eq '{escaped}'")
+    return " and ".join(clauses)
+
+
+def get_alias_index(
+    client: SearchIndexClient, name: str, api_version: str
+) -> Optional[str]:
+    """
+    Looks up the alias with the name, such as the ones aisrch creates for its versioned indexes.
+    Aliases are only available in the preview versions of the API, which the SDK does not cover.
+
+    Returns:
+        Optional[str]: The index the alias points to, None if there is no alias with the name.
+    """
+    response = client.send_request(
+        HttpRequest("GET", f"/aliases('{name}')", params={"api-version": api_version})
+    )
+    if response.status_code == 404:
+        return None
+    if response.status_code >= 400:
+        raise HttpResponseError(
+            message=f"GET alias '{name}' -> {response.status_code} {response.text()}",
+            response=response,
+        )
+    return response.json()["indexes"][0]
@@ -0,0 +1,10 @@
+from .manifest import IngestionManifest, ManifestEntry
+from .pipeline import IngestionPipeline
+from .summary import IngestionSummary
+
+__all__ = [
+    "IngestionManifest",
+    "IngestionPipeline",
+    "IngestionSummary",
+    "ManifestEntry",
+]
@@ -0,0 +1,143 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from azure.storage.blob import BlobProperties
+from pydantic import Field
+from pydantic.dataclasses import dataclass
+
+from features.parsers import File
+from features.storage.azure_storage_account import content_md5_hex
+
+logger = logging.getLogger("ingester")
+
+
+@dataclass
+class ManifestEntry:
+    """
+    The version of a source blob that was successfully ingested
+
+    Attributes:
+        etag (Optional[str]): ETag of the blob when it was processed
+        content_md5 (Optional[str]): Hex encoded MD5 of the blob content, when the storage account reports it
+        config_version (str): Version of the parser/splitter configuration used to process the blob
+        sections (int): Number of sections uploaded for the blob
+        processed_at (str): ISO 8601 timestamp of the processing
+        duplicate_of (List[str]): Blobs whose sections made the deduplicator drop sections of this blob
+    """
+
+    etag: Optional[str]
+    content_md5: Optional[str]
+    config_version: str
+    sections: int
+    processed_at: str
+    duplicate_of: List[str] = Field(default_factory=list)
+
+
+@dataclass
+class IngestionManifest:
+    """
+    Keeps track of the source blobs that have already been ingested so that unchanged documents
+    are neither downloaded nor sent to Document Intelligence again
+    """
+
+    config_version: str
+    entries: Dict[str, ManifestEntry] = Field(default_factory=dict)
+
+    def is_up_to_date(self, blob: BlobProperties) -> bool:
+        entry = self.entries.get(blob.name)
+        if entry is None or entry.config_version != self.config_version:
+            return False
+        content_md5 = content_md5_hex(blob)
+        if content_md5 and entry.content_md5:
+            return content_md5 == entry.content_md5
+        return entry.etag is not None and entry.etag == blob.etag
+
+    def partition(
+        self, blobs: Iterable[BlobProperties]
+    ) -> Tuple[List[BlobProperties], List[BlobProperties]]:
+        """
+        Splits the blobs into the ones that have to be processed and the ones that can be skipped.
+        Unchanged blobs that had sections dropped as near duplicates of a blob that changed or was deleted
+        are processed again, so that those sections are written.
+
+        Returns:
+            Tuple[List[BlobProperties], List[BlobProperties]]: The pending and the skipped blobs.
+        """
+        blobs = list(blobs)
+        pending, skipped = [], []
+        for blob in blobs:
+            (skipped if self.is_up_to_date(blob) else pending).append(blob)
+        changed = {blob.name for blob in pending} | (
+            set(self.entries) - {blob.name for blob in blobs}
+        )
+        dependents = {
+            blob.name
+            for blob in skipped
+            if changed.intersection(self.entries[blob.name].duplicate_of)
+        }
+        if dependents:
+            pending = [
+                blob for blob in blobs if blob in pending or blob.name in dependents
+            ]
+            skipped = [blob for blob in skipped if blob.name not in dependents]
+        return pending, skipped
+
+    def record(
+        self, file: File, sections: int, duplicate_of: Optional[List[str]] = None
+    ):
+        if file.blob_name is None:
+            return
+        self.entries[file.blob_name] = ManifestEntry(
+            etag=file.etag,
+            content_md5=file.content_md5,
+            config_version=self.config_version,
+            sections=sections,
+            processed_at=datetime.now(timezone.utc).isoformat(),
+            duplicate_of=duplicate_of or [],
+        )
+
+    def discard(self, blob_name: Optional[str]):
+        """
+        Drops the entry of a blob that could not be processed, so that it is not skipped by the next run.
+        """
+        self.entries.pop(blob_name, None)
+
+    def retain(self, blob_names: Iterable[str]):
+        """
+        Drops the entries of the blobs that no longer exist in the container.
+        """
+        blob_names = set(blob_names)
+        self.entries = {
+            name: entry for name, entry in self.entries.items() if name in blob_names
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            "config_version": self.config_version,
+            "documents": {
+                name: {
+                    "etag": entry.etag,
+                    "content_md5": entry.content_md5,
+                    "config_version": entry.config_version,
+                    "sections": entry.sections,
+                    "processed_at": entry.processed_at,
+                    "duplicate_of": entry.duplicate_of,
+                }
+                for name, entry in self.entries.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict], config_version: str):
+        """
+        Builds the manifest from its serialized form. Entries processed with another configuration
+        are kept, but they are not considered up to date.
+        """
+        if not data:
+            return cls(config_version=config_version)
+        entries = {
+            name: ManifestEntry(**entry)
+            for name, entry in data.get("documents", {}).items()
+        }
+        return cls(config_version=config_version, entries=entries)
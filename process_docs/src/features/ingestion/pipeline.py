@@ -0,0 +1,330 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Generator, Iterable, List, Optional, Tuple, Union
+
+from azure.ai.documentintelligence.models import AnalyzeResult
+from pydantic.dataclasses import dataclass
+
+from features.parsers import (
+    AnalyzeJobScheduler,
+    DocumentAnalysisParser,
+    File,
+    Section,
+    is_table_row,
+)
+from features.deduplication import SectionDeduplicator
+from features.indexing import TOKEN_COUNT_FIELD, SearchIndexSink
+from features.splitters import SentenceTextSplitter
+from features.storage import AzureStorageAccount, SectionSink
+
+from .manifest import IngestionManifest
+from .summary import IngestionSummary
+
+logger = logging.getLogger("ingester")
+
+# Bump whenever the layout or the cleaning of the processed documents changes
+PROCESSING_VERSION = 7
+
+CLEAN_PATTERN = re.compile(r"<[^>]*>|<!--.*?-->|\\n+", flags=re.DOTALL)
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class IngestionPipeline:
+    """
+    Runs files through parsing, splitting and uploading. Several files are processed concurrently
+    so the network bound stages (Document Intelligence and Blob Storage) of one file overlap with the others
+    When an analysis scheduler is set, the analyses run on it and every file is split and uploaded as soon
+    as its analysis finishes
+    """
+
+    parser: DocumentAnalysisParser
+    splitter: SentenceTextSplitter
+    storage_account: AzureStorageAccount
+    sink: Union[SectionSink, SearchIndexSink]
+    max_workers: int = 4
+    max_in_flight: int = 8
+    manifest: Optional[IngestionManifest] = None
+    analysis_scheduler: Optional[AnalyzeJobScheduler] = None
+    deduplicator: Optional[SectionDeduplicator] = None
+
+    def config_version(self) -> str:
+        """
+        Fingerprint of the configuration that determines the processed output of a document.
+        """
+        config = "|".join(
+            str(value)
+            for value in (
+                PROCESSING_VERSION,
+                self.parser.model_id,
+                self.parser.table_format,
+                self.splitter.max_tokens_per_section,
+                self.splitter.max_section_length,
+                self.splitter.section_overlap,
+                *self.sink.config_values(),
+                *(self.deduplicator.config_values() if self.deduplicator else ()),
+            )
+        )
+        return hashlib.sha256(config.encode("utf-8")).hexdigest()[:16]
+
+    def parse_file(
+        self, file: File, analyze_result: Optional[AnalyzeResult] = None
+    ) -> List[Section]:
+        return list(self.iter_sections(file, analyze_result))
+
+    def iter_sections(
+        self, file: File, analyze_result: Optional[AnalyzeResult] = None
+    ) -> Generator[Section, None, None]:
+        """
+        Parse and split stages: yields the sections of the file as the splitter produces them.
+        """
+        if analyze_result is None:
+            pages = self.parser.parse(content=file.content)
+        else:
+            pages = self.parser.pages_from_result(analyze_result)
+        for split_page in self.splitter.split_pages(pages):
+            yield Section(split_page, content=file)
+
+    def iter_documents(
+        self, file: File, sections: Iterable[Section]
+    ) -> Generator[Dict, None, None]:
+        """
+        Clean stage: yields the search document of every section.
+        """
+        for section_number, section in enumerate(sections):
+            yield self.build_document(
+                file, section, section_number, self.parser.table_format
+            )
+
+    def process_file(
+        self, file: File, analyze_result: Optional[AnalyzeResult] = None
+    ) -> int:
+        """
+        Parses, splits, cleans, deduplicates and uploads a single file. The file is analyzed unless its analyze result is given.
+        The sections written for a previous version of the file are replaced, and the ones that were not written
+        again are deleted once every section is written, so a failure leaves the previous sections in place.
+        The stages are chained generators: every section is cleaned, serialized and handed to the sink as
+        soon as it is split, so the uploads of the first sections overlap the splitting of the rest and
+        the sections of the file are never held in memory at the same time.
+
+        Returns:
+            int: The number of sections uploaded for the file.
+        """
+        documents = self.iter_documents(file, self.iter_sections(file, analyze_result))
+        if self.deduplicator is not None:
+            documents = self.deduplicator.filter(file, documents)
+        ids = []
+        sections = self.sink.write(file, record_ids(documents, ids))
+        logger.info("Split '%s' into %d sections", file.filename(), sections)
+        deleted = self.sink.delete(file, ids)
+        if deleted:
+            logger.info("Deleted %d stale sections of '%s'", deleted, file.filename())
+        return sections
+
+    def process_and_close_file(
+        self,
+        file: File,
+        analyze_result: Optional[Union[AnalyzeResult, Exception]] = None,
+    ) -> int:
+        try:
+            if isinstance(analyze_result, Exception):
+                raise analyze_result
+            return self.process_file(file, analyze_result)
+        finally:
+            if self.deduplicator is not None:
+                self.deduplicator.end_turn(file)
+            file.close()
+
+    async def submit_analyzed_files(
+        self, files: Iterable[File], executor: ThreadPoolExecutor
+    ) -> Dict[Future, File]:
+        """
+        Analyzes the files on the analysis scheduler and submits every file to the executor as soon
+        as its analysis finishes. Files that take turns in the deduplicator are submitted in their order,
+        so that the workers never all wait for a file that is still being analyzed.
+        """
+        futures = {}
+        analyzed = {}
+        next_turn = 0
+        async for file, analyze_result in self.analysis_scheduler.analyze_all(files):
+            turn = self.deduplicator.turn_of(file) if self.deduplicator else None
+            if turn is None:
+                futures[
+                    executor.submit(self.process_and_close_file, file, analyze_result)
+                ] = file
+                continue
+            analyzed[turn] = (file, analyze_result)
+            while next_turn in analyzed:
+                file, analyze_result = analyzed.pop(next_turn)
+                futures[
+                    executor.submit(self.process_and_close_file, file, analyze_result)
+                ] = file
+                next_turn += 1
+        return futures
+
+    def run(self, files: Iterable[File], full_run: bool = True) -> IngestionSummary:
+        """
+        Processes the files using a pool of workers. An error in one file is logged and
+        does not stop the processing of the others. Every file is closed as soon as it is processed,
+        which lets lazy sources such as AzureStorageAccount.iter_files download the next one.
+
+        Args:
+            files (Iterable[File]): The files to process, in the order of their blob names.
+            full_run (bool): Whether the files are every document of the container, which lets the
+                deduplicator compare the sections of different files.
+        """
+        summary = IngestionSummary()
+        start_time = time.perf_counter()
+        if self.deduplicator is not None:
+            files = self.deduplicator.start(files, across_files=full_run)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if self.analysis_scheduler is None:
+                futures = {}
+                for file in files:
+                    futures[executor.submit(self.process_and_close_file, file)] = file
+            else:
+                futures = asyncio.run(self.submit_analyzed_files(files, executor))
+            for future in as_completed(futures):
+                file = futures[future]
+                try:
+                    sections = future.result()
+                    summary.sections += sections
+                    summary.files_processed += 1
+                    if self.manifest is not None:
+                        self.manifest.record(
+                            file,
+                            sections,
+                            duplicate_of=(
+                                self.deduplicator.duplicate_of(file)
+                                if self.deduplicator
+                                else None
+                            ),
+                        )
+                except Exception as e:
+                    logger.error(
+                        f"\tGot an error while processing {file.filename()} -> {e} --> skipping file"
+                    )
+                    summary.files_failed.append(file.filename())
+                    if self.manifest is not None:
+                        self.manifest.discard(file.blob_name)
+        summary.elapsed_seconds = time.perf_counter() - start_time
+        return summary
+
+    def run_incremental(
+        self, manifest_blob_name: str, full_refresh: bool = False
+    ) -> IngestionSummary:
+        """
+        Processes only the documents that are new or changed since the last run, according to the
+        ingestion manifest stored in the container. The manifest is updated with the processed documents.
+
+        Args:
+            manifest_blob_name (str): The name of the manifest blob in the container.
+            full_refresh (bool): Whether to process every document regardless of the manifest.
+        """
+        self.manifest = IngestionManifest.from_dict(
+            self.storage_account.download_json(manifest_blob_name),
+            self.config_version(),
+        )
+        documents = self.storage_account.list_documents()
+        if full_refresh:
+            pending, skipped = documents, []
+        else:
+            pending, skipped = self.manifest.partition(documents)
+        logger.info(
+            "%d documents to process, %d unchanged documents skipped",
+            len(pending),
+            len(skipped),
+        )
+
+        failed_downloads = []
+        summary = self.run(
+            self.storage_account.iter_files(
+                pending,
+                max_in_flight=self.max_in_flight,
+                on_error=lambda blob_name, e: failed_downloads.append(blob_name),
+            ),
+            full_run=not skipped,
+        )
+        # The documents that failed are processed again on the next run
+        for blob_name in failed_downloads:
+            summary.files_failed.append(blob_name)
+            self.manifest.discard(blob_name)
+        summary.files_skipped = [document.name for document in skipped]
+
+        self.manifest.retain(document.name for document in documents)
+        self.storage_account.upload_blob(
+            data=self.manifest.to_dict(), blob_name=manifest_blob_name
+        )
+        return summary
+
+    @staticmethod
+    def build_document(
+        file: File, section: Section, section_number: int, table_format: str = "html"
+    ) -> Dict:
+        """
+        Builds the search document of a section. The section spans the pages from page to end_page, which
+        are the same unless it crosses a page break. The id includes the hash of the url that the blob names
+        of the section sink use, so documents with the same filename in different folders do not collide. The token count of the splitter is handed over to the
+        sink, which removes it.
+        """
+        split_page = section.split_page
+        end_page_num = (
+            split_page.page_num
+            if split_page.end_page_num is None
+            else split_page.end_page_num
+        )
+        return {
+            "id": f"{file.filename_to_id()}-{file.url_hash()[:8]}-page-{section_number}",
+            "subject": file.url.split("/")[6],
+            "type": file.url.split("/")[7],
+            "storage_url": file.url,
+            "source_id": file.url_hash(),
+            "title": section.content.filename(),
+            "chapter": "",
+            "section": "",
+            "page": str(split_page.page_num),
+            "end_page": str(end_page_num),
+            # Pages of the near duplicates merged into the section by the deduplicator
+            "duplicate_pages": [],
+            "content": clean_text(split_page.text, table_format),
+            TOKEN_COUNT_FIELD: split_page.token_count,
+        }
+
+
+def record_ids(
+    documents: Iterable[Dict], ids: List[str]
+) -> Generator[Dict, None, None]:
+    """
+    Passes the documents through, appending their ids to the list.
+    """
+    for document in documents:
+        ids.append(document["id"])
+        yield document
+
+
+def clean_text(text: str, table_format: str = "html") -> str:
+    """
+    Removes the HTML tags and comments and the escaped line breaks of the text, and flattens it into one line.
+    The rows of markdown and TSV tables are kept as they are, one per line, as the line breaks separate them.
+    """
+    if table_format == "html":
+        return CLEAN_PATTERN.sub(" ", text).strip().replace("\n", " ")
+    blocks: List[Tuple[bool, List[str]]] = []
+    for line in text.split("\n"):
+        is_table = is_table_row(line, table_format)
+        if blocks and blocks[-1][0] == is_table:
+            blocks[-1][1].append(line)
+        else:
+            blocks.append((is_table, [line]))
+    parts = []
+    for is_table, lines in blocks:
+        if is_table:
+            parts.append("\n".join(lines))
+        else:
+            part = CLEAN_PATTERN.sub(" ", "\n".join(lines)).strip().replace("\n", " ")
+            if part:
+                parts.append(part)
+    return "\n".join(parts)
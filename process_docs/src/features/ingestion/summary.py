@@ -0,0 +1,55 @@
+import logging
+from typing import List
+
+from pydantic import Field
+from pydantic.dataclasses import dataclass
+
+logger = logging.getLogger("ingester")
+
+
+@dataclass
+class IngestionSummary:
+    """
+    Aggregated outcome of an ingestion run
+
+    Attributes:
+        files_processed (int): Number of files that went through the whole pipeline
+        files_failed (List[str]): Names of the files that could not be downloaded or processed and were skipped
+        files_skipped (List[str]): Names of the blobs that were not processed because they did not change since the last run
+        sections (int): Number of sections uploaded across all the processed files
+        elapsed_seconds (float): Wall clock time of the run
+    """
+
+    files_processed: int = 0
+    files_failed: List[str] = Field(default_factory=list)
+    files_skipped: List[str] = Field(default_factory=list)
+    sections: int = 0
+    elapsed_seconds: float = 0.0
+
+    def files_per_second(self) -> float:
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.files_processed / self.elapsed_seconds
+
+    def sections_per_second(self) -> float:
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.sections / self.elapsed_seconds
+
+    def log(self):
+        logger.info(
+            "Processed %d files (%d failed) and %d sections in %.2fs "
+            "-> %.2f files/s, %.2f sections/s",
+            self.files_processed,
+            len(self.files_failed),
+            self.sections,
+            self.elapsed_seconds,
+            self.files_per_second(),
+            self.sections_per_second(),
+        )
+        for filename in self.files_failed:
+            logger.warning("\tFailed to process %s", filename)
+        if self.files_skipped:
+            logger.info("Skipped %d unchanged documents", len(self.files_skipped))
+        for blob_name in self.files_skipped:
+            logger.info("\tSkipped %s", blob_name)
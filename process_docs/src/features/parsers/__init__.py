@@ -1,10 +1,15 @@
-from .parser import DocumentAnalysisParser
+from .parser import DocumentAnalysisParser, is_table_row
+from .analysis_cache import AnalyzeResultCache
+from .analysis_scheduler import AnalyzeJobScheduler
 from .content_management import File, Page, SplitPage, Section
 
 __all__ = [
+    "AnalyzeJobScheduler",
+    "AnalyzeResultCache",
     "DocumentAnalysisParser",
     "Page",
     "File",
     "SplitPage",
     "Section",
+    "is_table_row",
 ]
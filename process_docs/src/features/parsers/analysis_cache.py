@@ -0,0 +1,137 @@
+import dataclasses
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Optional
+
+from pydantic.dataclasses import dataclass
+
+logger = logging.getLogger("ingester")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class AnalyzeResultCache:
+    """
+    Persistent, size bounded cache of Document Intelligence analyze results. Results are stored as
+    gzipped JSON files keyed by the hash of the document content, the model and the API version, and the
+    least recently used ones are evicted when the cache grows over max_bytes
+
+    Attributes:
+        directory (str): Directory where the results are stored
+        max_bytes (int): Maximum size of the cache on disk
+    """
+
+    directory: str
+    max_bytes: int = 2 * 1024 * 1024 * 1024
+    hits: int = dataclasses.field(default=0, init=False)
+    misses: int = dataclasses.field(default=0, init=False)
+    lock: Any = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def __post_init__(self):
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def hash_content(content: io.BufferedReader) -> str:
+        """
+        Hashes the content of the file in chunks, leaving the file at its start.
+        """
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(content_hash: str, model_id: str, api_version: str) -> str:
+        return hashlib.sha256(
+            f"{content_hash}|{model_id}|{api_version}".encode("utf-8")
+        ).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[Dict]:
+        path = self.path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as cached_file:
+                result = json.load(cached_file)
+            # The modification time is used as the last access time for the LRU eviction
+            os.utime(path)
+        except FileNotFoundError:
+            result = None
+        except Exception as e:
+            logger.warning(f"\tDiscarding unreadable cached result {path} -> {e}")
+            self.remove(path)
+            result = None
+        with self.lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, key: str, result: Dict):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so that readers never see a partial result
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8") as temp_file:
+                json.dump(result, temp_file, separators=(",", ":"))
+            os.replace(temp_path, path)
+        except Exception:
+            self.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used results until the cache fits in max_bytes.
+        """
+        with self.lock:
+            entries = []
+            for root, _, filenames in os.walk(self.directory):
+                for filename in filenames:
+                    if not filename.endswith(".json.gz"):
+                        continue
+                    path = os.path.join(root, filename)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                self.remove(path)
+                total_bytes -= size
+
+    @staticmethod
+    def remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def log(self):
+        logger.info(
+            "Analyze result cache: %d hits, %d misses (%.1f%% hit rate)",
+            self.hits,
+            self.misses,
+            100 * self.hit_rate(),
+        )
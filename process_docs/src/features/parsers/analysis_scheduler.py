@@ -0,0 +1,213 @@
+import asyncio
+import dataclasses
+import io
+import logging
+import random
+from typing import Any, AsyncGenerator, Iterable, Optional, Tuple, Union
+
+from azure.ai.documentintelligence.aio import DocumentIntelligenceClient
+from azure.ai.documentintelligence.models import AnalyzeResult
+from azure.core.exceptions import HttpResponseError, ServiceRequestError
+from pydantic.dataclasses import dataclass
+
+from .content_management import File
+from .parser import DocumentAnalysisParser
+
+logger = logging.getLogger("ingester")
+
+RETRYABLE_STATUS_CODES = [408, 429, 500, 502, 503, 504]
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class AnalyzeJobScheduler:
+    """
+    Runs several Document Intelligence analyses at the same time with asyncio, handing every result
+    over as soon as it finishes. Throttled (429) and transient errors are retried honoring the Retry-After
+    header, and the number of concurrent jobs is adapted: it is halved when the service throttles and
+    grows back by one with every successful analysis
+
+    Attributes:
+        parser (DocumentAnalysisParser): Parser whose endpoint, credential, model, API version and cache are used
+        max_concurrency (int): Maximum number of analyses running at the same time
+        max_retries (int): Maximum number of retries of a throttled or failed analysis
+        initial_backoff (float): Seconds to wait after the first throttled request without Retry-After
+        max_backoff (float): Maximum seconds to wait between retries
+        polling_interval (float): Seconds between polls of a running analysis
+    """
+
+    parser: DocumentAnalysisParser
+    max_concurrency: int = 4
+    max_retries: int = 5
+    initial_backoff: float = 1.0
+    max_backoff: float = 60.0
+    polling_interval: float = 2.0
+    concurrency_limit: int = dataclasses.field(default=0, init=False)
+    backoff: float = dataclasses.field(default=0.0, init=False)
+    throttled_until: float = dataclasses.field(default=0.0, init=False)
+    throttled_requests: int = dataclasses.field(default=0, init=False)
+
+    def create_client(self) -> DocumentIntelligenceClient:
+        # Retries are handled by the scheduler so that throttling slows down every job, not only the throttled one
+        transport = self.parser.http_transport
+        timeouts = (
+            {
+                "connection_timeout": transport.connection_timeout,
+                "read_timeout": transport.read_timeout,
+            }
+            if transport
+            else {}
+        )
+        return DocumentIntelligenceClient(
+            endpoint=self.parser.endpoint,
+            credential=self.parser.credential,
+            api_version=self.parser.api_version,
+            retry_total=0,
+            **timeouts,
+        )
+
+    async def analyze_all(
+        self, files: Iterable[File]
+    ) -> AsyncGenerator[Tuple[File, Union[AnalyzeResult, Exception]], None]:
+        """
+        Analyzes the files, yielding every file with its result (or the error that made it fail) in
+        the order the analyses finish. The files are pulled from the iterable lazily in a worker thread,
+        so blocking sources such as AzureStorageAccount.iter_files do not block the event loop.
+        """
+        self.concurrency_limit = self.max_concurrency
+        self.backoff = self.initial_backoff
+        iterator = iter(files)
+        jobs = set()
+        next_file = None
+        exhausted = False
+        async with self.create_client() as client:
+            while True:
+                if (
+                    next_file is None
+                    and not exhausted
+                    and len(jobs) < self.concurrency_limit
+                ):
+                    next_file = asyncio.ensure_future(
+                        asyncio.to_thread(next, iterator, None)
+                    )
+                waiting = jobs | ({next_file} if next_file else set())
+                if not waiting:
+                    break
+                done, _ = await asyncio.wait(
+                    waiting, return_when=asyncio.FIRST_COMPLETED
+                )
+                if next_file in done:
+                    done.discard(next_file)
+                    file = next_file.result()
+                    next_file = None
+                    if file is None:
+                        exhausted = True
+                    else:
+                        jobs.add(asyncio.create_task(self.analyze(client, file)))
+                for job in done:
+                    jobs.discard(job)
+                    yield job.result()
+
+    async def analyze(
+        self, client: DocumentIntelligenceClient, file: File
+    ) -> Tuple[File, Union[AnalyzeResult, Exception]]:
+        cache = self.parser.analysis_cache
+        cache_key = None
+        try:
+            if cache is not None:
+                content_hash = await asyncio.to_thread(cache.hash_content, file.content)
+                cache_key = cache.key(
+                    content_hash, self.parser.model_id, self.parser.api_version
+                )
+                cached_result = await asyncio.to_thread(cache.get, cache_key)
+                if cached_result is not None:
+                    logger.info(
+                        "Using the cached analyze result of '%s'", file.filename()
+                    )
+                    return file, AnalyzeResult(cached_result)
+
+            result = await self.analyze_with_retries(client, file)
+
+            if cache_key is not None:
+                await asyncio.to_thread(cache.put, cache_key, result.as_dict())
+            return file, result
+        except Exception as e:
+            return file, e
+
+    async def analyze_with_retries(
+        self, client: DocumentIntelligenceClient, file: File
+    ) -> AnalyzeResult:
+        # The HTTP transport closes the stream it sends, so every attempt gets its own stream
+        file.content.seek(0)
+        data = await asyncio.to_thread(file.content.read)
+        attempt = 0
+        while True:
+            await self.wait_for_throttling()
+            logger.info(
+                "Extracting text from '%s' using Azure Document Intelligence",
+                file.filename(),
+            )
+            try:
+                poller = await client.begin_analyze_document(
+                    model_id=self.parser.model_id,
+                    analyze_request=io.BytesIO(data),
+                    content_type="application/octet-stream",
+                    polling_interval=self.polling_interval,
+                )
+                result = await poller.result()
+                self.on_success()
+                return result
+            except (HttpResponseError, ServiceRequestError) as e:
+                status_code = getattr(e, "status_code", None)
+                retryable = (
+                    isinstance(e, ServiceRequestError)
+                    or status_code in RETRYABLE_STATUS_CODES
+                )
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = self.on_throttled(getattr(e, "response", None))
+                logger.warning(
+                    f"\tAnalysis of {file.filename()} failed with {status_code or e} -> retrying in {delay:.1f}s ({attempt}/{self.max_retries})"
+                )
+
+    async def wait_for_throttling(self):
+        delay = self.throttled_until - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def on_success(self):
+        self.backoff = max(self.initial_backoff, self.backoff / 2)
+        self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1)
+
+    def on_throttled(self, response: Optional[Any]) -> float:
+        """
+        Registers a throttled or failed request and returns the seconds every job has to wait.
+        """
+        self.throttled_requests += 1
+        retry_after = retry_after_seconds(response)
+        if retry_after is not None:
+            delay = retry_after
+        else:
+            delay = min(self.backoff * (1 + random.random() / 10), self.max_backoff)
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+        self.concurrency_limit = max(1, self.concurrency_limit // 2)
+        self.throttled_until = max(
+            self.throttled_until, asyncio.get_running_loop().time() + delay
+        )
+        return delay
+
+
+def retry_after_seconds(response: Optional[Any]) -> Optional[float]:
+    if response is None:
+        return None
+    headers = response.headers
+    for header, scale in (("retry-after-ms", 1000), ("x-ms-retry-after-ms", 1000)):
+        if headers.get(header):
+            try:
+                return float(headers[header]) / scale
+            except ValueError:
+                pass
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
@@ -1,8 +1,9 @@
 import base64
+import hashlib
 import io
 import os
 import re
-from typing import Optional
+from typing import Callable, Optional
 from pydantic.dataclasses import dataclass
 
 
@@ -11,10 +12,16 @@ class File:
     """
     Represents a file stored in a data lake storage account
     This file might contain access control information about which users or groups can access it
+    The blob attributes identify the version of the source blob the file was downloaded from
+    The on_close callback is called once when the file is closed, e.g. to remove its temporary copy
     """
 
     content: io.BufferedReader
     url: Optional[str] = None
+    blob_name: Optional[str] = None
+    etag: Optional[str] = None
+    content_md5: Optional[str] = None
+    on_close: Optional[Callable[[], None]] = None
 
     def filename(self):
         return os.path.basename(self.content.name)
@@ -30,9 +37,18 @@ class File:
         )
         return f"file-{filename_ascii}-{filename_hash}"
 
+    def url_hash(self) -> str:
+        """
+        SHA-1 of the url of the file, which tells apart files with the same name in different folders.
+        """
+        return hashlib.sha1(self.url.encode("utf-8")).hexdigest()
+
     def close(self):
         if self.content:
             self.content.close()
+        if self.on_close:
+            on_close, self.on_close = self.on_close, None
+            on_close()
 
 
 @dataclass
@@ -55,10 +71,18 @@ class Page:
 class SplitPage:
     """
     A section of a page that has been split into a smaller chunk.
+
+    Attributes:
+        page_num (int): Page where the section starts
+        text (str): The text of the section
+        end_page_num (Optional[int]): Page where the section ends, when it is known
+        token_count (Optional[int]): Number of tokens of the section, when it is known
     """
 
     page_num: int
     text: str
+    end_page_num: Optional[int] = None
+    token_count: Optional[int] = None
 
 
 @dataclass
@@ -1,17 +1,41 @@
+import dataclasses
+import heapq
 import html
 import logging
 import io
+import threading
 
 from azure.ai.documentintelligence import DocumentIntelligenceClient
-from azure.ai.documentintelligence.models import DocumentTable, ContentFormat
+from azure.ai.documentintelligence.models import (
+    AnalyzeResult,
+    DocumentTable,
+    DocumentTableCell,
+)
 from azure.core.credentials import AzureKeyCredential
 from pydantic.dataclasses import dataclass
-from typing import List
+from typing import Any, Dict, List, Literal, Optional, Tuple
 
+from features.transport import SharedHttpTransport
+
+from .analysis_cache import AnalyzeResultCache
 from .content_management import Page
 
 logger = logging.getLogger("ingester")
 
+DEFAULT_API_VERSION = "2024-02-29-preview"
+
+
+def is_table_row(line: str, table_format: str = "html") -> bool:
+    """
+    Whether the line of the page text is a row of a table rendered as markdown or TSV. The rows of
+    HTML tables are not lines, so no line is a row in that format.
+    """
+    if table_format == "markdown":
+        return line.startswith("|")
+    if table_format == "tsv":
+        return "\t" in line
+    return False
+
 
 @dataclass(config=dict(arbitrary_types_allowed=True))
 class DocumentAnalysisParser:
@@ -22,50 +46,148 @@ class DocumentAnalysisParser:
     endpoint: str
     credential: AzureKeyCredential
     model_id: str = "prebuilt-layout"
+    table_format: Literal["html", "markdown", "tsv"] = "html"
+    api_version: str = DEFAULT_API_VERSION
+    http_transport: Optional[SharedHttpTransport] = None
+    analysis_cache: Optional[AnalyzeResultCache] = None
+    client: Optional[Any] = dataclasses.field(default=None, init=False, repr=False)
+    lock: Any = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def get_client(self) -> DocumentIntelligenceClient:
+        """
+        Returns the long-lived Document Intelligence client, creating it on first use.
+        """
+        with self.lock:
+            if self.client is None:
+                transport_kwargs = (
+                    self.http_transport.client_kwargs() if self.http_transport else {}
+                )
+                self.client = DocumentIntelligenceClient(
+                    endpoint=self.endpoint,
+                    credential=self.credential,
+                    api_version=self.api_version,
+                    **transport_kwargs,
+                )
+            return self.client
+
+    def close(self):
+        with self.lock:
+            if self.client is not None:
+                self.client.close()
+            self.client = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def parse(self, content: io.BufferedReader) -> List[Page]:
+        return self.pages_from_result(self.analyze(content))
+
+    def analyze(self, content: io.BufferedReader) -> AnalyzeResult:
+        """
+        Analyzes the document with Azure Document Intelligence. When a cache is configured, the
+        result of a document that was already analyzed with the same model and API version is
+        read from the cache instead.
+        """
+        cache_key = None
+        if self.analysis_cache is not None:
+            cache_key = self.analysis_cache.key(
+                self.analysis_cache.hash_content(content),
+                self.model_id,
+                self.api_version,
+            )
+            cached_result = self.analysis_cache.get(cache_key)
+            if cached_result is not None:
+                logger.info("Using the cached analyze result of '%s'", content.name)
+                return AnalyzeResult(cached_result)
+
         logger.info(
             "Extracting text from '%s' using Azure Document Intelligence", content.name
         )
-
-        document_intelligence_client = DocumentIntelligenceClient(
-            endpoint=self.endpoint, credential=self.credential
-        )
-        poller = document_intelligence_client.begin_analyze_document(
+        poller = self.get_client().begin_analyze_document(
             model_id=self.model_id,
             analyze_request=content,
             content_type="application/octet-stream",
         )
         doc_intelligence_results = poller.result()
 
+        if cache_key is not None:
+            try:
+                self.analysis_cache.put(cache_key, doc_intelligence_results.as_dict())
+            except Exception as e:
+                logger.warning(
+                    f"\tGot an error while caching the analyze result of {content.name} -> {e}"
+                )
+        return doc_intelligence_results
+
+    def pages_from_result(self, doc_intelligence_results) -> List[Page]:
         offset = 0
         pages = []
+        tables_by_page = DocumentAnalysisParser.index_tables_by_page(
+            doc_intelligence_results
+        )
         for page_num, page in enumerate(doc_intelligence_results.pages):
-            tables_on_page = DocumentAnalysisParser.find_tables_on_page(
-                doc_intelligence_results, page_num
-            )
-            table_chars, page_offset = DocumentAnalysisParser.generate_table_chars(
+            tables_on_page = tables_by_page.get(page_num, [])
+            table_spans = DocumentAnalysisParser.generate_table_spans(
                 tables_on_page, page
             )
             page_text = DocumentAnalysisParser.generate_page_text(
-                doc_intelligence_results, page_offset, table_chars, tables_on_page
+                doc_intelligence_results,
+                page,
+                table_spans,
+                tables_on_page,
+                self.table_format,
             )
             pages.append(Page(page_num=page_num, offset=offset, text=page_text))
             offset += len(page_text)
         return pages
 
     @classmethod
-    def table_to_html(cls, table: DocumentTable):
-        table_html = "<table>"
-        rows = [
-            sorted(
-                [cell for cell in table.cells if cell.row_index == i],
-                key=lambda cell: cell.column_index,
-            )
-            for i in range(table.row_count)
-        ]
+    def render_table(cls, table: DocumentTable, table_format: str = "html") -> str:
+        if table_format == "markdown":
+            return DocumentAnalysisParser.table_to_markdown(table)
+        if table_format == "tsv":
+            return DocumentAnalysisParser.table_to_tsv(table)
+        return DocumentAnalysisParser.table_to_html(table)
+
+    @classmethod
+    def table_rows(cls, table: DocumentTable) -> List[List[DocumentTableCell]]:
+        """
+        Groups the cells of the table by row in a single pass, each row sorted by column.
+        """
+        rows = [[] for _ in range(table.row_count)]
+        for cell in table.cells:
+            if 0 <= cell.row_index < table.row_count:
+                rows[cell.row_index].append(cell)
         for row_cells in rows:
-            table_html += "<tr>"
+            row_cells.sort(key=lambda cell: cell.column_index)
+        return rows
+
+    @classmethod
+    def table_grid(cls, table: DocumentTable) -> List[List[str]]:
+        """
+        Lays out the content of the cells in a row_count x column_count grid. The positions covered by
+        cells spanning several rows or columns are left empty.
+        """
+        column_count = max(
+            [table.column_count or 0]
+            + [cell.column_index + (cell.column_span or 1) for cell in table.cells]
+        )
+        grid = [[""] * column_count for _ in range(table.row_count)]
+        for row_index, row_cells in enumerate(DocumentAnalysisParser.table_rows(table)):
+            for cell in row_cells:
+                grid[row_index][cell.column_index] = cell.content
+        return grid
+
+    @classmethod
+    def table_to_html(cls, table: DocumentTable):
+        parts = ["<table>"]
+        for row_cells in DocumentAnalysisParser.table_rows(table):
+            parts.append("<tr>")
             for cell in row_cells:
                 tag = (
                     "th"
@@ -77,46 +199,133 @@ class DocumentAnalysisParser:
                     cell_spans += f" colSpan={cell.column_span}"
                 if cell.row_span is not None and cell.row_span > 1:
                     cell_spans += f" rowSpan={cell.row_span}"
-                table_html += f"<{tag}{cell_spans}>{html.escape(cell.content)}</{tag}>"
-            table_html += "</tr>"
-        table_html += "</table>"
-        return table_html
+                parts.append(f"<{tag}{cell_spans}>{html.escape(cell.content)}</{tag}>")
+            parts.append("</tr>")
+        parts.append("</table>")
+        return "".join(parts)
 
     @classmethod
-    def find_tables_on_page(cls, doc_intelligence_results, page_num):
-        tables_on_page = [
-            table
-            for table in (doc_intelligence_results.tables or [])
-            if table.bounding_regions
-            and table.bounding_regions[0].page_number == page_num + 1
+    def table_to_markdown(cls, table: DocumentTable):
+        """
+        Renders the table as a markdown table, using the first row as the header.
+        """
+        grid = DocumentAnalysisParser.table_grid(table)
+        if not grid or not grid[0]:
+            return ""
+        lines = [
+            "| "
+            + " | ".join(
+                " ".join(content.split()).replace("|", "\\|") for content in row
+            )
+            + " |"
+            for row in grid
         ]
-        return tables_on_page
+        lines.insert(1, "|" + "---|" * len(grid[0]))
+        return "\n" + "\n".join(lines) + "\n"
 
     @classmethod
-    def generate_table_chars(cls, tables_on_page, page):
+    def table_to_tsv(cls, table: DocumentTable):
+        grid = DocumentAnalysisParser.table_grid(table)
+        return (
+            "\n"
+            + "\n".join(
+                "\t".join(" ".join(content.split()) for content in row) for row in grid
+            )
+            + "\n"
+        )
+
+    @classmethod
+    def index_tables_by_page(
+        cls, doc_intelligence_results
+    ) -> Dict[int, List[DocumentTable]]:
+        """
+        Groups the tables of the analyze result by the (zero based) page where they start, in a single pass.
+        """
+        tables_by_page = {}
+        for table in doc_intelligence_results.tables or []:
+            if table.bounding_regions:
+                page_num = table.bounding_regions[0].page_number - 1
+                tables_by_page.setdefault(page_num, []).append(table)
+        return tables_by_page
+
+    @classmethod
+    def generate_table_spans(cls, tables_on_page, page) -> List[Tuple[int, int, int]]:
+        """
+        Finds the parts of the page covered by tables, in a single sweep over the intervals sorted by start.
+        The tables whose intervals cover the current position are kept in a heap by table_id.
+
+        Returns:
+            List[Tuple[int, int, int]]: Sorted, non overlapping (start, end, table_id) intervals relative to the page offset.
+            Where the spans of several tables overlap, the table that comes last owns the characters.
+        """
         page_offset = page.spans[0].offset
         page_length = page.spans[0].length
-        table_chars = [-1] * page_length
+        intervals = []
         for table_id, table in enumerate(tables_on_page):
             for span in table.spans:
-                for i in range(span.length):
-                    idx = span.offset - page_offset + i
-                    if idx >= 0 and idx < page_length:
-                        table_chars[idx] = table_id
-        return table_chars, page_offset
+                start = max(span.offset - page_offset, 0)
+                end = min(span.offset - page_offset + span.length, page_length)
+                if start < end:
+                    intervals.append((start, end, table_id))
+
+        intervals.sort()
+        boundaries = sorted(
+            {boundary for start, end, _ in intervals for boundary in (start, end)}
+        )
+        table_spans = []
+        covering = []
+        cursor = 0
+        for start, end in zip(boundaries, boundaries[1:]):
+            while cursor < len(intervals) and intervals[cursor][0] <= start:
+                _, interval_end, table_id = intervals[cursor]
+                heapq.heappush(covering, (-table_id, interval_end))
+                cursor += 1
+            # The intervals that end before the position are dropped when they reach the top
+            while covering and covering[0][1] <= start:
+                heapq.heappop(covering)
+            if not covering:
+                continue
+            table_id = -covering[0][0]
+            if (
+                table_spans
+                and table_spans[-1][1] == start
+                and table_spans[-1][2] == table_id
+            ):
+                table_spans[-1] = (table_spans[-1][0], end, table_id)
+            else:
+                table_spans.append((start, end, table_id))
+        return table_spans
 
     @classmethod
     def generate_page_text(
-        cls, doc_intelligence_results, page_offset, table_chars, tables_on_page
+        cls,
+        doc_intelligence_results,
+        page,
+        table_spans,
+        tables_on_page,
+        table_format: str = "html",
     ):
-        page_text = ""
+        """
+        Builds the text of the page copying the runs of text between tables as slices of the
+        document content, and replacing every table by its rendering the first time it appears.
+        """
+        content = doc_intelligence_results.content
+        page_offset = page.spans[0].offset
+        page_length = page.spans[0].length
+        parts = []
         added_tables = set()
-        for idx, table_id in enumerate(table_chars):
-            if table_id == -1:
-                page_text += doc_intelligence_results.content[page_offset + idx]
-            elif table_id not in added_tables:
-                page_text += DocumentAnalysisParser.table_to_html(
-                    tables_on_page[table_id]
+        position = 0
+        for start, end, table_id in table_spans:
+            if position < start:
+                parts.append(content[page_offset + position : page_offset + start])
+            if table_id not in added_tables:
+                parts.append(
+                    DocumentAnalysisParser.render_table(
+                        tables_on_page[table_id], table_format
+                    )
                 )
                 added_tables.add(table_id)
-        return page_text
+            position = end
+        if position < page_length:
+            parts.append(content[page_offset + position : page_offset + page_length])
+        return "".join(parts)
@@ -1,3 +1,12 @@
-from .textsplitter import SentenceTextSplitter
+from .encoder import get_encoder, prefetch_encoder, use_encoder_cache_dir
+from .parallel_splitter import ParallelTextSplitter
+from .textsplitter import PageLocator, SentenceTextSplitter
 
-__all__ = ["SentenceTextSplitter"]
+__all__ = [
+    "PageLocator",
+    "ParallelTextSplitter",
+    "SentenceTextSplitter",
+    "get_encoder",
+    "prefetch_encoder",
+    "use_encoder_cache_dir",
+]
@@ -0,0 +1,57 @@
+import logging
+import os
+import sys
+import time
+from functools import lru_cache
+from typing import Optional
+
+import tiktoken
+
+logger = logging.getLogger("ingester")
+
+ENCODING_MODEL = "text-embedding-3-large"
+
+# tiktoken reads and writes the BPE ranks in the directory of this environment variable
+CACHE_DIR_VARIABLE = "TIKTOKEN_CACHE_DIR"
+
+
+@lru_cache
+def get_encoder() -> tiktoken.Encoding:
+    """
+    Returns the BPE encoder of the embedding model, loading it the first time it is needed. The
+    encoder is shared by the whole process.
+    """
+    start_time = time.perf_counter()
+    encoder = tiktoken.encoding_for_model(ENCODING_MODEL)
+    logger.info(
+        "Loaded the %s encoder in %.2fs",
+        encoder.name,
+        time.perf_counter() - start_time,
+    )
+    return encoder
+
+
+def use_encoder_cache_dir(cache_dir: Optional[str]):
+    """
+    Makes tiktoken load the BPE ranks from cache_dir, and store them there when they are downloaded.
+    With the ranks already in the directory the encoder is loaded without network access. Must be called
+    before the encoder is loaded; processes started afterwards inherit the setting.
+    """
+    if cache_dir:
+        os.environ[CACHE_DIR_VARIABLE] = cache_dir
+
+
+def prefetch_encoder(cache_dir: str):
+    """
+    Downloads the BPE ranks into cache_dir, for instance while building the image of air-gapped workers.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    use_encoder_cache_dir(cache_dir)
+    get_encoder()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    prefetch_encoder(sys.argv[1])
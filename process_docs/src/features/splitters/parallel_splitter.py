@@ -0,0 +1,131 @@
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Generator, List, Literal, Optional, Tuple
+
+from features.parsers import Page, SplitPage
+
+from .encoder import get_encoder
+from .textsplitter import PageLocator, SentenceTextSplitter
+
+logger = logging.getLogger("ingester")
+
+DEFAULT_SECTIONS_PER_TASK = 64
+# Tasks submitted per worker process before the chunks of the first one are consumed
+DEFAULT_TASKS_IN_FLIGHT_PER_PROCESS = 2
+
+# Splitter of the worker process, created once by initialize_worker
+worker_splitter: Optional[SentenceTextSplitter] = None
+
+
+def initialize_worker(max_tokens_per_section: int):
+    """
+    Runs once in every worker process: creates the splitter of the worker and loads the BPE
+    encoder, so the tasks never pay for it.
+    """
+    global worker_splitter
+    worker_splitter = SentenceTextSplitter(max_tokens_per_section)
+    get_encoder()
+
+
+def split_sections(
+    sections: List[Tuple[str, int]], page_locator: PageLocator
+) -> List[SplitPage]:
+    """
+    Tokenizes and splits a batch of sections in a worker process.
+
+    Args:
+        sections (List[Tuple[str, int]]): The text of every section and its offset in the document.
+        page_locator (PageLocator): The page locator of the document.
+
+    Returns:
+        List[SplitPage]: The chunks of the sections, in order.
+    """
+    return [
+        split_page
+        for text, offset in sections
+        for split_page in worker_splitter.split_page_by_max_tokens(
+            page_num=page_locator.find(offset),
+            text=text,
+            offset=offset,
+            page_locator=page_locator,
+        )
+    ]
+
+
+class ParallelTextSplitter(SentenceTextSplitter):
+    """
+    Sentence splitter that tokenizes the sections on a pool of processes, so that splitting is not
+    bound to the one core the GIL allows. The section boundaries of a document are found in the calling
+    process (they depend on each other but not on the tokens), then batches of sections are tokenized
+    and split in the workers and the chunks are yielded in document order. The output is the same as the
+    output of SentenceTextSplitter
+    The sections are batched as they are found and at most max_tasks_in_flight batches are submitted
+    ahead of the consumer, so a slow consumer pauses the splitting instead of letting the chunks of the
+    whole document pile up
+    """
+
+    def __init__(
+        self,
+        max_tokens_per_section: int = 500,
+        processes: int = 2,
+        sections_per_task: int = DEFAULT_SECTIONS_PER_TASK,
+        table_format: Literal["html", "markdown", "tsv"] = "html",
+        max_tasks_in_flight: Optional[int] = None,
+    ):
+        super().__init__(max_tokens_per_section, table_format)
+        self.processes = processes
+        self.sections_per_task = sections_per_task
+        self.max_tasks_in_flight = (
+            max_tasks_in_flight or DEFAULT_TASKS_IN_FLIGHT_PER_PROCESS * processes
+        )
+        # Spawned workers do not inherit the locks held by the threads of the ingestion pipeline
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initialize_worker,
+            initargs=(max_tokens_per_section,),
+        )
+
+    def split_pages(self, pages: List[Page]) -> Generator[SplitPage, None, None]:
+        all_text = "".join(page.text for page in pages)
+        page_locator = PageLocator(pages)
+        # The tasks are consumed in the order they were submitted, so the chunks come out in document order
+        pending: Deque[Future] = deque()
+        try:
+            for batch in self.section_batches(all_text, page_locator):
+                pending.append(
+                    self.executor.submit(split_sections, batch, page_locator)
+                )
+                if len(pending) >= self.max_tasks_in_flight:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def section_batches(
+        self, all_text: str, page_locator: PageLocator
+    ) -> Generator[List[Tuple[str, int]], None, None]:
+        """
+        Yields the text and the offset of the sections of the document, in batches of sections_per_task.
+        """
+        batch = []
+        for start, end in self.section_ranges(all_text, page_locator):
+            batch.append((all_text[start:end], start))
+            if len(batch) == self.sections_per_task:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,15 +1,16 @@
 import logging
+import re
 from abc import ABC
-from typing import Generator, List
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Generator, List, Literal, Optional, Tuple
 
-import tiktoken
+from features.parsers import Page, SplitPage, is_table_row
 
-from features.parsers import Page, SplitPage
+from .encoder import get_encoder
 
 logger = logging.getLogger("ingester")
 
-ENCODING_MODEL = "text-embedding-3-large"
-
 STANDARD_WORD_BREAKS = [",", ";", ":", " ", "(", ")", "[", "]", "{", "}", "\t", "\n"]
 
 CJK_WORD_BREAKS = [
@@ -59,12 +60,119 @@ STANDARD_SENTENCE_ENDINGS = [".", "!", "?"]
 
 CJK_SENTENCE_ENDINGS = ["。", "！", "？", "‼", "⁇", "⁈", "⁉"]
 
-bpe = tiktoken.encoding_for_model(ENCODING_MODEL)
-
 DEFAULT_OVERLAP_PERCENT = 10
 DEFAULT_SECTION_LENGTH = 1000
 
 
+def count_tokens_in_range(token_offsets: List[int], start: int, end: int) -> int:
+    """
+    Counts the tokens that overlap the characters between start and end, given the character
+    offset where every token of the text starts.
+    """
+    if start >= end:
+        return 0
+    first_token = max(bisect_right(token_offsets, start) - 1, 0)
+    return bisect_left(token_offsets, end) - first_token
+
+
+class BoundaryIndex:
+    """
+    Sorted positions of the sentence endings and word breaks of a text, built once per document
+    with a compiled regex, so that the splitter finds section boundaries by binary search instead of
+    scanning the text one character at a time
+    """
+
+    def __init__(self, text: str, sentence_endings: List[str], word_breaks: List[str]):
+        self.sentence_endings = positions_of(text, sentence_endings)
+        self.word_breaks = positions_of(text, word_breaks)
+
+    def first_sentence_ending(self, start: int, end: int) -> int:
+        """
+        Returns the first sentence ending in [start, end), or -1 if there is none.
+        """
+        index = bisect_left(self.sentence_endings, start)
+        if index < len(self.sentence_endings) and self.sentence_endings[index] < end:
+            return self.sentence_endings[index]
+        return -1
+
+    def last_sentence_ending(self, start: int, end: int) -> int:
+        """
+        Returns the last sentence ending in [start, end), or -1 if there is none.
+        """
+        index = bisect_left(self.sentence_endings, end) - 1
+        if index >= 0 and self.sentence_endings[index] >= start:
+            return self.sentence_endings[index]
+        return -1
+
+    def first_word_break(self, start: int, end: int) -> int:
+        """
+        Returns the first word break in [start, end), or -1 if there is none.
+        """
+        index = bisect_left(self.word_breaks, start)
+        if index < len(self.word_breaks) and self.word_breaks[index] < end:
+            return self.word_breaks[index]
+        return -1
+
+    def last_word_break(self, start: int, end: int) -> int:
+        """
+        Returns the last word break in [start, end), or -1 if there is none.
+        """
+        index = bisect_left(self.word_breaks, end) - 1
+        if index >= 0 and self.word_breaks[index] >= start:
+            return self.word_breaks[index]
+        return -1
+
+
+def find_unclosed_table(text: str, table_format: str = "html") -> int:
+    """
+    Finds the start of the table that the text ends in. An HTML table is open until its closing tag, and
+    a markdown or TSV table while the last line of the text is one of its rows.
+
+    Returns:
+        int: The offset of the table in the text, -1 if the text does not end in a table.
+    """
+    if table_format == "html":
+        last_table_start = text.rfind("<table")
+        return last_table_start if last_table_start > text.rfind("</table") else -1
+    table_start = -1
+    line_end = len(text) - 1 if text.endswith("\n") else len(text)
+    while line_end >= 0:
+        line_start = text.rfind("\n", 0, line_end) + 1
+        if not is_table_row(text[line_start:line_end], table_format):
+            break
+        table_start = line_start
+        line_end = line_start - 1
+    return table_start
+
+
+def positions_of(text: str, characters: List[str]) -> array:
+    pattern = re.compile("[" + "".join(re.escape(char) for char in characters) + "]")
+    return array("q", (match.start() for match in pattern.finditer(text)))
+
+
+class PageLocator:
+    """
+    Resolves the page of an offset in the concatenated text of a document by binary search
+    over the page offsets, which are computed once per document
+    """
+
+    def __init__(self, pages: List[Page]):
+        self.offsets = [page.offset for page in pages]
+        self.page_nums = [page.page_num for page in pages]
+
+    def find(self, offset: int) -> int:
+        index = bisect_right(self.offsets, offset) - 1
+        if index < 0:
+            return self.page_nums[-1]
+        return self.page_nums[index]
+
+    def find_range(self, start: int, end: int) -> Tuple[int, int]:
+        """
+        Returns the first and last pages of the text between the start and end offsets.
+        """
+        return self.find(start), self.find(max(start, end - 1))
+
+
 class TextSplitter(ABC):
     """
     Splits a list of pages into smaller chunks
@@ -82,7 +190,12 @@ class SentenceTextSplitter(TextSplitter):
     Class that splits pages into smaller chunks. This is required because embedding models may not be able to analyze an entire page at once
     """
 
-    def __init__(self, max_tokens_per_section: int = 500):
+    def __init__(
+        self,
+        max_tokens_per_section: int = 500,
+        table_format: Literal["html", "markdown", "tsv"] = "html",
+    ):
+        self.table_format = table_format
         self.sentence_endings = STANDARD_SENTENCE_ENDINGS + CJK_SENTENCE_ENDINGS
         self.word_breaks = STANDARD_WORD_BREAKS + CJK_WORD_BREAKS
         self.max_section_length = DEFAULT_SECTION_LENGTH
@@ -93,125 +206,241 @@ class SentenceTextSplitter(TextSplitter):
         )
 
     def split_page_by_max_tokens(
-        self, page_num: int, text: str
+        self,
+        page_num: int,
+        text: str,
+        offset: Optional[int] = None,
+        page_locator: Optional[PageLocator] = None,
     ) -> Generator[SplitPage, None, None]:
         """
         Recursively splits page by maximum number of tokens to better handle languages with higher token/word ratios.
+        The text is tokenized once: the token counts of the halves are computed from the character offsets of the tokens.
+        When the offset of the text in the document and the page locator are given, the last page of every chunk is reported too.
         """
+        bpe = get_encoder()
         tokens = bpe.encode(text)
         if len(tokens) <= self.max_tokens_per_section:
-            yield SplitPage(page_num=page_num, text=text)
-        else:
-            start = int(len(text) // 2)
-            pos = 0
-            boundary = int(len(text) // 3)
-            split_position = -1
-            while start - pos > boundary:
-                if text[start - pos] in self.sentence_endings:
-                    split_position = start - pos
-                    break
-                elif text[start + pos] in self.sentence_endings:
-                    split_position = start + pos
-                    break
-                else:
-                    pos += 1
-
-            if split_position > 0:
-                first_half = text[: split_position + 1]
-                second_half = text[split_position + 1 :]
+            yield self.build_split_page(
+                page_num, text, len(tokens), offset, page_locator
+            )
+            return
+
+        _, token_offsets = bpe.decode_with_offsets(tokens)
+        yield from self.split_range_by_max_tokens(
+            page_num, text, 0, len(text), token_offsets, offset, page_locator
+        )
+
+    def split_range_by_max_tokens(
+        self,
+        page_num: int,
+        text: str,
+        range_start: int,
+        range_end: int,
+        token_offsets: List[int],
+        offset: Optional[int] = None,
+        page_locator: Optional[PageLocator] = None,
+    ) -> Generator[SplitPage, None, None]:
+        """
+        Splits text[range_start:range_end] in halves until every chunk fits in the maximum number of tokens.
+        """
+        token_count = count_tokens_in_range(token_offsets, range_start, range_end)
+        if token_count <= self.max_tokens_per_section:
+            yield self.build_split_page(
+                page_num,
+                text[range_start:range_end],
+                token_count,
+                offset + range_start if offset is not None else None,
+                page_locator,
+            )
+            return
+
+        length = range_end - range_start
+        start = int(length // 2)
+        pos = 0
+        boundary = int(length // 3)
+        split_position = -1
+        while start - pos > boundary:
+            if text[range_start + start - pos] in self.sentence_endings:
+                split_position = start - pos
+                break
+            elif text[range_start + start + pos] in self.sentence_endings:
+                split_position = start + pos
+                break
             else:
-                middle = int(len(text) // 2)
-                overlap = int(len(text) * (DEFAULT_OVERLAP_PERCENT / 100))
-                first_half = text[: middle + overlap]
-                second_half = text[middle - overlap :]
-            yield from self.split_page_by_max_tokens(page_num, first_half)
-            yield from self.split_page_by_max_tokens(page_num, second_half)
+                pos += 1
+
+        if split_position > 0:
+            first_half_end = range_start + split_position + 1
+            second_half_start = range_start + split_position + 1
+        else:
+            middle = int(length // 2)
+            overlap = int(length * (DEFAULT_OVERLAP_PERCENT / 100))
+            first_half_end = min(range_start + middle + overlap, range_end)
+            second_half_start = range_start + middle - overlap
+        yield from self.split_range_by_max_tokens(
+            page_num,
+            text,
+            range_start,
+            first_half_end,
+            token_offsets,
+            offset,
+            page_locator,
+        )
+        yield from self.split_range_by_max_tokens(
+            page_num,
+            text,
+            second_half_start,
+            range_end,
+            token_offsets,
+            offset,
+            page_locator,
+        )
+
+    def build_split_page(
+        self,
+        page_num: int,
+        text: str,
+        token_count: int,
+        offset: Optional[int] = None,
+        page_locator: Optional[PageLocator] = None,
+    ) -> SplitPage:
+        end_page_num = None
+        if offset is not None and page_locator is not None:
+            end_page_num = page_locator.find(max(offset, offset + len(text) - 1))
+        return SplitPage(
+            page_num=page_num,
+            text=text,
+            end_page_num=end_page_num,
+            token_count=token_count,
+        )
 
     def find_page(self, pages, offset):
-        num_pages = len(pages)
-        for i in range(num_pages - 1):
-            if offset >= pages[i].offset and offset < pages[i + 1].offset:
-                return pages[i].page_num
-        return pages[num_pages - 1].page_num
+        return PageLocator(pages).find(offset)
 
     def split_pages(self, pages: List[Page]) -> Generator[SplitPage, None, None]:
         all_text = "".join(page.text for page in pages)
+        page_locator = PageLocator(pages)
+        for start, end in self.section_ranges(all_text, page_locator):
+            yield from self.split_page_by_max_tokens(
+                page_num=page_locator.find(start),
+                text=all_text[start:end],
+                offset=start,
+                page_locator=page_locator,
+            )
+
+    def section_ranges(
+        self, all_text: str, page_locator: PageLocator
+    ) -> Generator[Tuple[int, int], None, None]:
+        """
+        Yields the start and end offsets of the sections of the text, in order. The sections are
+        found by character positions only, so they can be computed before any of them is tokenized.
+        """
         if len(all_text.strip()) == 0:
             return
 
+        boundary_index = BoundaryIndex(
+            all_text, self.sentence_endings, self.word_breaks
+        )
         length = len(all_text)
         if length <= self.max_section_length:
-            yield from self.split_page_by_max_tokens(
-                page_num=self.find_page(pages, 0), text=all_text
-            )
+            yield 0, length
             return
 
         start = 0
         end = length
         while start + self.section_overlap < length:
-            end = self.find_section_end(all_text, start, length)
-            start = self.adjust_start_for_next_section(all_text, start, end)
-            section_text = all_text[start:end]
-            yield from self.split_page_by_max_tokens(
-                page_num=self.find_page(pages, start), text=section_text
+            end = self.find_section_end(all_text, start, length, boundary_index)
+            start = self.adjust_start_for_next_section(
+                all_text, start, end, boundary_index
             )
+            yield start, end
 
-            start = self.handle_unclosed_tables(pages, section_text, start, end)
+            start = self.handle_unclosed_tables(
+                page_locator, all_text[start:end], start, end
+            )
 
         if start + self.section_overlap < end:
-            yield from self.split_page_by_max_tokens(
-                page_num=self.find_page(pages, start), text=all_text[start:end]
-            )
+            yield start, end
 
-    def find_section_end(self, all_text, start, length):
-        last_word = -1
+    def find_section_end(
+        self,
+        all_text,
+        start,
+        length,
+        boundary_index: Optional[BoundaryIndex] = None,
+    ):
+        """
+        Finds the end of the section that starts at start: the first sentence ending within the search
+        limit after the maximum section length or, failing that, the last word break within the limit.
+        """
+        if boundary_index is None:
+            boundary_index = BoundaryIndex(
+                all_text, self.sentence_endings, self.word_breaks
+            )
         end = start + self.max_section_length
 
         if end > length:
             end = length
         else:
-            while (
-                end < length
-                and (end - start - self.max_section_length) < self.sentence_search_limit
-                and all_text[end] not in self.sentence_endings
-            ):
-                if all_text[end] in self.word_breaks:
-                    last_word = end
-                end += 1
-            if (
-                end < length
-                and all_text[end] not in self.sentence_endings
-                and last_word > 0
-            ):
-                end = last_word
+            search_end = min(length, end + self.sentence_search_limit)
+            sentence_ending = boundary_index.first_sentence_ending(end, search_end)
+            if sentence_ending >= 0:
+                end = sentence_ending
+            else:
+                last_word = boundary_index.last_word_break(end, search_end)
+                end = search_end
+                if (
+                    end < length
+                    and all_text[end] not in self.sentence_endings
+                    and last_word > 0
+                ):
+                    end = last_word
         if end < length:
             end += 1
         return end
 
-    def adjust_start_for_next_section(self, all_text, start, end):
-        last_word = -1
-        while (
-            start > 0
-            and start > end - self.max_section_length - 2 * self.sentence_search_limit
-            and all_text[start] not in self.sentence_endings
-        ):
-            if all_text[start] in self.word_breaks:
-                last_word = start
-            start -= 1
-        if all_text[start] not in self.sentence_endings and last_word > 0:
-            start = last_word
+    def adjust_start_for_next_section(
+        self,
+        all_text,
+        start,
+        end,
+        boundary_index: Optional[BoundaryIndex] = None,
+    ):
+        """
+        Moves the start of the section back to the last sentence ending within the search limit
+        or, failing that, to the first word break within the limit.
+        """
+        if boundary_index is None:
+            boundary_index = BoundaryIndex(
+                all_text, self.sentence_endings, self.word_breaks
+            )
+        search_start = max(
+            0, end - self.max_section_length - 2 * self.sentence_search_limit
+        )
+        if start > search_start:
+            sentence_ending = boundary_index.last_sentence_ending(
+                search_start + 1, start + 1
+            )
+            if sentence_ending >= 0:
+                start = sentence_ending
+            else:
+                first_word = boundary_index.first_word_break(
+                    search_start + 1, start + 1
+                )
+                start = search_start
+                if all_text[start] not in self.sentence_endings and first_word > 0:
+                    start = first_word
         if start > 0:
             start += 1
         return start
 
-    def handle_unclosed_tables(self, pages, section_text, start, end):
-        last_table_start = section_text.rfind("<table")
-        if (
-            last_table_start > 2 * self.sentence_search_limit
-            and last_table_start > section_text.rfind("</table")
-        ):
+    def handle_unclosed_tables(
+        self, page_locator: PageLocator, section_text, start, end
+    ):
+        last_table_start = find_unclosed_table(section_text, self.table_format)
+        if last_table_start > 2 * self.sentence_search_limit:
             logger.info(
-                f"Section ends with unclosed table, starting next section with the table at page {self.find_page(pages, start)} offset {start} table start {last_table_start}"
+                f"Section ends with unclosed table, starting next section with the table at page {page_locator.find(start)} offset {start} table start {last_table_start}"
             )
             start = min(end - self.section_overlap, start + last_table_start)
         else:
@@ -1,3 +1,4 @@
 from .azure_storage_account import AzureStorageAccount
+from .section_sink import SectionSink
 
-__all__ = ["AzureStorageAccount"]
+__all__ = ["AzureStorageAccount", "SectionSink"]
@@ -1,16 +1,27 @@
 from pydantic.dataclasses import dataclass
-from azure.storage.blob import BlobServiceClient
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobProperties, BlobServiceClient
 
+import dataclasses
 import logging
 import os
 import json
+import re
+import shutil
 import tempfile
+import threading
 
-from typing import List, Dict
+from functools import partial
+from typing import Any, Callable, Collection, List, Dict, Generator, Optional
 from features.parsers import File
+from features.transport import SharedHttpTransport
 
 logger = logging.getLogger("ingester")
 
+SUPPORTED_EXTENSIONS = ["pdf", "docx", "pptx"]
+DEFAULT_MAX_IN_FLIGHT = 8
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+
 
 @dataclass(config=dict(arbitrary_types_allowed=True))
 class AzureStorageAccount:
@@ -21,54 +32,228 @@ class AzureStorageAccount:
     storage_account_name: str
     storage_container_name: str
     connection_string: str
+    spool_dir: Optional[str] = None
+    download_chunk_size: int = DEFAULT_CHUNK_SIZE
+    download_max_concurrency: int = 1
+    http_transport: Optional[SharedHttpTransport] = None
+    service_client: Optional[Any] = dataclasses.field(
+        default=None, init=False, repr=False
+    )
+    container_client: Optional[Any] = dataclasses.field(
+        default=None, init=False, repr=False
+    )
+    lock: Any = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
 
     def get_service_client(self):
-        return BlobServiceClient.from_connection_string(self.connection_string)
+        """
+        Returns the long-lived service client of the account, creating it on first use.
+        """
+        with self.lock:
+            if self.service_client is None:
+                transport_kwargs = (
+                    self.http_transport.client_kwargs() if self.http_transport else {}
+                )
+                # Blobs larger than the chunk size are downloaded with ranged reads of that size
+                self.service_client = BlobServiceClient.from_connection_string(
+                    self.connection_string,
+                    max_single_get_size=self.download_chunk_size,
+                    max_chunk_get_size=self.download_chunk_size,
+                    **transport_kwargs,
+                )
+            return self.service_client
 
     def get_container_client(self):
         service_client = self.get_service_client()
-        return service_client.get_container_client(self.storage_container_name)
+        with self.lock:
+            if self.container_client is None:
+                self.container_client = service_client.get_container_client(
+                    self.storage_container_name
+                )
+            return self.container_client
+
+    def close(self):
+        with self.lock:
+            if self.service_client is not None:
+                self.service_client.close()
+            self.service_client = None
+            self.container_client = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
 
     def list_blobs(self) -> List[str]:
         container_client = self.get_container_client()
         return [blob.name for blob in container_client.list_blobs()]
 
-    def download_files(self) -> List[File]:
+    def list_documents(self) -> List[BlobProperties]:
+        """
+        Lists the properties of the blobs that can be processed, i.e. the ones with a supported extension.
+        """
         container_client = self.get_container_client()
-        files = []
-        for blob_name in self.list_blobs():
-            if blob_name.split(".")[-1] not in ["pdf", "docx", "pptx"]:
-                continue
-            temp_file_path = os.path.join(
-                tempfile.gettempdir(), os.path.basename(blob_name)
-            )
+        return [
+            blob
+            for blob in container_client.list_blobs()
+            if blob.name.split(".")[-1] in SUPPORTED_EXTENSIONS
+        ]
+
+    def download_files(
+        self, documents: Optional[List[BlobProperties]] = None
+    ) -> List[File]:
+        """
+        Downloads the given documents to temporary files. Prefer iter_files for large containers,
+        as every downloaded file is kept on disk and open until it is closed.
+
+        Args:
+            documents (Optional[List[BlobProperties]]): The documents to download. All the supported documents in the container are downloaded if not provided.
+        """
+        return list(self.iter_files(documents, max_in_flight=None))
+
+    def iter_files(
+        self,
+        documents: Optional[List[BlobProperties]] = None,
+        max_in_flight: Optional[int] = DEFAULT_MAX_IN_FLIGHT,
+        on_error: Optional[Callable[[str, Exception], None]] = None,
+    ) -> Generator[File, None, None]:
+        """
+        Lazily downloads the given documents to temporary files in the spool directory.
+        At most max_in_flight files are kept on disk at the same time: the generator waits until a
+        previously yielded file is closed before downloading the next one. Closing a file removes its
+        temporary copy.
+
+        Args:
+            documents (Optional[List[BlobProperties]]): The documents to download. All the supported documents in the container are downloaded if not provided.
+            max_in_flight (Optional[int]): Maximum number of downloaded files that have not been closed yet. Unbounded if None.
+            on_error (Optional[Callable[[str, Exception], None]]): Called with the name of every blob that could not be downloaded, which is skipped.
+        """
+        container_client = self.get_container_client()
+        if documents is None:
+            documents = self.list_documents()
+        spool_dir = self.spool_dir or tempfile.gettempdir()
+        os.makedirs(spool_dir, exist_ok=True)
+        in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        for document in documents:
+            blob_name = document.name
+            if in_flight:
+                in_flight.acquire()
+            # Each file gets its own directory so that blobs with the same basename in
+            # different folders do not collide, while keeping the original filename
+            temp_dir = tempfile.mkdtemp(prefix="ingest-", dir=spool_dir)
+            release = partial(self.release_spooled_file, temp_dir, in_flight)
+            temp_file_path = os.path.join(temp_dir, os.path.basename(blob_name))
             try:
                 blob_client = container_client.get_blob_client(blob_name)
                 with open(temp_file_path, "wb") as temp_file:
-                    downloader = blob_client.download_blob()
+                    downloader = blob_client.download_blob(
+                        max_concurrency=self.download_max_concurrency
+                    )
                     downloader.readinto(temp_file)
-                files.append(
-                    File(content=open(temp_file_path, "rb"), url=blob_client.url)
+                file = File(
+                    content=open(temp_file_path, "rb"),
+                    url=blob_client.url,
+                    blob_name=blob_name,
+                    etag=document.etag,
+                    content_md5=content_md5_hex(document),
+                    on_close=release,
                 )
             except Exception as storage_exception:
                 logger.error(
                     f"\tGot an error while reading {blob_name} -> {storage_exception} --> skipping file"
                 )
-                try:
-                    os.remove(temp_file_path)
-                except Exception as file_delete_exception:
-                    logger.error(
-                        f"\tGot an error while deleting {temp_file_path} -> {file_delete_exception}"
-                    )
-        return files
+                release()
+                if on_error:
+                    on_error(blob_name, storage_exception)
+                continue
+            yield file
+
+    @staticmethod
+    def release_spooled_file(
+        temp_dir: str, in_flight: Optional[threading.BoundedSemaphore]
+    ):
+        try:
+            shutil.rmtree(temp_dir)
+        except Exception as file_delete_exception:
+            logger.error(
+                f"\tGot an error while deleting {temp_dir} -> {file_delete_exception}"
+            )
+        finally:
+            if in_flight:
+                in_flight.release()
 
-    def upload_blob(self, data: List[Dict], blob_name: str) -> None:
+    def delete_blobs(
+        self,
+        prefix: str,
+        keep: Collection[str] = (),
+        pattern: Optional[re.Pattern] = None,
+    ) -> int:
+        """
+        Deletes the blobs whose name starts with the prefix, except the ones in keep.
+        With a pattern, only the blobs whose whole name matches it are deleted.
+
+        Returns:
+            int: The number of blobs deleted.
+        """
+        container_client = self.get_container_client()
+        deleted = 0
+        for blob in container_client.list_blobs(name_starts_with=prefix):
+            if blob.name in keep or (pattern and not pattern.fullmatch(blob.name)):
+                continue
+            try:
+                container_client.delete_blob(blob.name)
+                deleted += 1
+            except ResourceNotFoundError:
+                pass
+        return deleted
+
+    def download_json(self, blob_name: str) -> Optional[Dict]:
+        """
+        Downloads and deserializes a JSON blob from the Azure Blob Storage container.
+
+        Returns:
+            Optional[Dict]: The deserialized blob, or None if the blob does not exist.
+        """
+        container_client = self.get_container_client()
+        try:
+            blob_client = container_client.get_blob_client(blob_name)
+            return json.loads(blob_client.download_blob().readall())
+        except ResourceNotFoundError:
+            return None
+
+    def upload_data(self, data: str, blob_name: str) -> bool:
+        """
+        Uploads already serialized data as a blob to the Azure Blob Storage container.
+
+        Args:
+            data (str): The content of the blob.
+            blob_name (str): The name of the blob in the container.
+
+        Returns:
+            bool: Whether the blob was uploaded.
+        """
+        container_client = self.get_container_client()
+        try:
+            blob_client = container_client.get_blob_client(blob_name)
+            blob_client.upload_blob(data.encode("utf-8"), overwrite=True)
+            logger.info(f"Successfully uploaded data as {blob_name}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to upload data as {blob_name} -> {e}")
+            return False
+
+    def upload_blob(self, data: List[Dict], blob_name: str) -> bool:
         """
         Uploads a list of dictionaries as a JSON blob to the Azure Blob Storage container.
 
         Args:
             data (List[Dict]): The list of dictionaries to be uploaded.
             blob_name (str): The name of the blob in the container.
+
+        Returns:
+            bool: Whether the blob was uploaded.
         """
         container_client = self.get_container_client()
         try:
@@ -76,5 +261,14 @@ class AzureStorageAccount:
             json_data = json.dumps(data, indent=4)
             blob_client.upload_blob(json_data, overwrite=True)
             logger.info(f"Successfully uploaded data as {blob_name}")
+            return True
         except Exception as e:
             logger.error(f"Failed to upload data as {blob_name} -> {e}")
+            return False
+
+
+def content_md5_hex(blob: BlobProperties) -> Optional[str]:
+    content_settings = blob.content_settings
+    if content_settings is None or not content_settings.content_md5:
+        return None
+    return bytes(content_settings.content_md5).hex()
@@ -0,0 +1,185 @@
+import json
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Collection,
+    Dict,
+    Generator,
+    Iterable,
+    Literal,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from pydantic.dataclasses import dataclass
+
+from features.indexing import TOKEN_COUNT_FIELD, delete_file_documents
+from features.parsers import File
+
+from .azure_storage_account import AzureStorageAccount
+
+logger = logging.getLogger("ingester")
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class SectionSink:
+    """
+    Writes the processed sections of a document to the Azure Storage Account
+
+    Attributes:
+        storage_account (AzureStorageAccount): The storage account the sections are written to
+        mode (str): "json" writes one blob per section, "jsonl" writes JSON Lines blobs with several sections each
+        batch_size (int): Number of sections per JSON Lines blob. 0 writes a single blob per document
+        max_concurrency (int): Number of blobs uploaded concurrently
+        max_pending (int): Maximum number of serialized blobs of a document waiting to be uploaded
+        search_client (Optional[SearchClient]): Client of the index fed by the indexer from the written blobs. When set,
+            the previous sections of a document are also deleted from the index, as the indexer does not detect deleted blobs
+    """
+
+    storage_account: AzureStorageAccount
+    mode: Literal["json", "jsonl"] = "json"
+    batch_size: int = 0
+    max_concurrency: int = 8
+    max_pending: int = 16
+    search_client: Optional[Any] = None
+
+    def __post_init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+
+    def config_values(self) -> Tuple:
+        """
+        The settings of the sink that determine the written blobs.
+        """
+        return self.mode, self.batch_size
+
+    def write(self, file: File, documents: Iterable[Dict]) -> int:
+        """
+        Serializes and uploads the documents of a file as they are produced. At most max_pending blobs
+        wait to be uploaded, so a slow upload pauses the producer of the documents instead of letting them
+        pile up in memory. Raises a RuntimeError if any of the blobs could not be uploaded.
+
+        Returns:
+            int: The number of documents written.
+        """
+        pending = threading.BoundedSemaphore(self.max_pending)
+
+        def upload(data: str, blob_name: str) -> bool:
+            try:
+                return self.storage_account.upload_data(data, blob_name)
+            finally:
+                pending.release()
+
+        futures = []
+        written = 0
+        for data, blob_name, document_count in self.serialize(file, documents):
+            pending.acquire()
+            futures.append(self.executor.submit(upload, data, blob_name))
+            written += document_count
+        failed = [future.result() for future in futures].count(False)
+        if failed:
+            raise RuntimeError(
+                f"{failed} of {len(futures)} blobs could not be uploaded"
+            )
+        return written
+
+    def serialize(
+        self, file: File, documents: Iterable[Dict]
+    ) -> Generator[Tuple[str, str, int], None, None]:
+        """
+        Serializes the documents as they are produced.
+
+        Returns:
+            Generator[Tuple[str, str, int], None, None]: Every serialized blob, with its name and the number of documents it contains.
+        """
+        if self.mode == "json":
+            for index, document in enumerate(documents):
+                yield to_compact_json(document), self.blob_name(file, index, "json"), 1
+            return
+        lines = []
+        index = 0
+        for document in documents:
+            lines.append(to_compact_json(document))
+            if len(lines) == self.batch_size:
+                yield "\n".join(lines), self.blob_name(file, index, "jsonl"), len(lines)
+                lines = []
+                index += 1
+        if lines:
+            yield "\n".join(lines), self.blob_name(file, index, "jsonl"), len(lines)
+
+    def delete(self, file: File, keep_ids: Collection[str] = ()) -> int:
+        """
+        Deletes the blobs of the file that were not written again, in any mode, and its other documents in
+        the index when the search client is set, so that a document with fewer sections than before does
+        not leave the extra ones behind.
+
+        Args:
+            file (File): The file whose blobs are deleted.
+            keep_ids (Collection[str]): The ids of the documents just written for the file, in order.
+
+        Returns:
+            int: The number of blobs deleted.
+        """
+        if self.search_client is not None:
+            delete_file_documents(self.search_client, file, keep=keep_ids)
+        deleted = self.storage_account.delete_blobs(
+            self.blob_prefix(file), keep=self.blob_names(file, len(keep_ids))
+        )
+        # The blobs of the layout without the hash of the url, written before PROCESSING_VERSION 2,
+        # are only found the first time the document is processed with the current layout
+        legacy_prefix = self.legacy_blob_prefix(file)
+        return deleted + self.storage_account.delete_blobs(
+            legacy_prefix,
+            pattern=re.compile(re.escape(legacy_prefix) + r"\d+-parsed\.json"),
+        )
+
+    def blob_names(self, file: File, documents: int) -> Set[str]:
+        """
+        The names of the blobs that write gives to the given number of documents of the file.
+        """
+        if self.mode == "json":
+            return {self.blob_name(file, index, "json") for index in range(documents)}
+        batch_size = self.batch_size or max(documents, 1)
+        blobs = -(-documents // batch_size)
+        return {self.blob_name(file, index, "jsonl") for index in range(blobs)}
+
+    @staticmethod
+    def blob_prefix(file: File) -> str:
+        """
+        The beginning of the names of the processed blobs of the file. The hash of the source url keeps
+        the names of documents with the same filename in different folders apart.
+        """
+        prefix = "/".join(file.url.split("/")[4:7])
+        return f"{prefix}/processed/{file.filename()}-{file.url_hash()[:8]}-"
+
+    @staticmethod
+    def legacy_blob_prefix(file: File) -> str:
+        """
+        The beginning of the names of the blobs of the file in the previous layout,
+        {filename}-{index}-parsed.json, which did not tell apart the documents with the same filename.
+        """
+        prefix = "/".join(file.url.split("/")[4:7])
+        return f"{prefix}/processed/{file.filename()}-"
+
+    @staticmethod
+    def blob_name(file: File, index: int, extension: str) -> str:
+        """
+        Builds the name of a processed blob. The index is unique within the document.
+        """
+        return f"{SectionSink.blob_prefix(file)}{index:05d}-parsed.{extension}"
+
+    def close(self):
+        self.executor.shutdown()
+        if self.search_client is not None:
+            self.search_client.close()
+
+
+def to_compact_json(document: Dict) -> str:
+    return json.dumps(
+        {key: value for key, value in document.items() if key != TOKEN_COUNT_FIELD},
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
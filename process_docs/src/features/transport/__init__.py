@@ -0,0 +1,3 @@
+from .http_transport import SharedHttpTransport
+
+__all__ = ["SharedHttpTransport"]
@@ -0,0 +1,69 @@
+import dataclasses
+import threading
+from typing import Any, Dict, Optional
+
+import requests
+from azure.core.pipeline.transport import RequestsTransport
+from pydantic.dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+
+
+@dataclass(config=dict(arbitrary_types_allowed=True))
+class SharedHttpTransport:
+    """
+    HTTP connection pool shared by the Azure SDK clients, so that they reuse connections
+    instead of opening new ones (and doing new TLS handshakes) for every client
+
+    Attributes:
+        pool_size (int): Maximum number of connections kept alive per host
+        connection_timeout (float): Seconds to wait for a connection to be established
+        read_timeout (float): Seconds to wait for data from the server
+        retry_total (int): Total number of retries of a failed request
+        retry_backoff_factor (float): Backoff factor applied between retries
+        retry_backoff_max (float): Maximum backoff between retries in seconds
+    """
+
+    pool_size: int = 16
+    connection_timeout: float = 30
+    read_timeout: float = 300
+    retry_total: int = 5
+    retry_backoff_factor: float = 0.8
+    retry_backoff_max: float = 60
+    session: Optional[Any] = dataclasses.field(default=None, init=False, repr=False)
+    lock: Any = dataclasses.field(
+        default_factory=threading.Lock, init=False, repr=False
+    )
+
+    def get_session(self) -> requests.Session:
+        with self.lock:
+            if self.session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size, pool_maxsize=self.pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self.session = session
+            return self.session
+
+    def client_kwargs(self) -> Dict:
+        """
+        Keyword arguments for the constructor of an Azure SDK client that make it use the shared pool.
+        The clients do not own the session, so closing them leaves the pool open for the other clients.
+        """
+        return {
+            "transport": RequestsTransport(
+                session=self.get_session(), session_owner=False
+            ),
+            "connection_timeout": self.connection_timeout,
+            "read_timeout": self.read_timeout,
+            "retry_total": self.retry_total,
+            "retry_backoff_factor": self.retry_backoff_factor,
+            "retry_backoff_max": self.retry_backoff_max,
+        }
+
+    def close(self):
+        with self.lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
@@ -1,26 +1,135 @@
-import os
-import re
-from typing import List
-
-from features.parsers import DocumentAnalysisParser, Section, File
-from features.splitters import SentenceTextSplitter
-from features.configuration import get_app_settings
-from features.storage import AzureStorageAccount
+import logging
+from typing import Optional
+
+from features.parsers import (
+    AnalyzeJobScheduler,
+    AnalyzeResultCache,
+    DocumentAnalysisParser,
+)
+from features.splitters import (
+    ParallelTextSplitter,
+    SentenceTextSplitter,
+    use_encoder_cache_dir,
+)
+from features.configuration import Settings, get_app_settings
+from features.deduplication import SectionDeduplicator
+from features.embeddings import BatchEmbedder, EmbeddingCache, TokenBudget
+from features.indexing import SearchIndexSink, get_alias_index
+from features.storage import AzureStorageAccount, SectionSink
+from features.ingestion import IngestionPipeline
+from features.transport import SharedHttpTransport
 from azure.core.credentials import AzureKeyCredential
+from azure.search.documents import SearchClient
+from azure.search.documents.indexes import SearchIndexClient
+from openai import AzureOpenAI
+
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+)
+
+
+def get_live_index_name(
+    settings: Settings, http_transport: SharedHttpTransport
+) -> Optional[str]:
+    """
+    The index that AZURE_SEARCH_INDEX_NAME points to when it is the alias of the versioned indexes
+    deployed by aisrch, None if it is an index.
+    """
+    client = SearchIndexClient(
+        endpoint=settings.azure_search_endpoint,
+        credential=AzureKeyCredential(settings.azure_search_admin_key),
+        **http_transport.client_kwargs(),
+    )
+    try:
+        return get_alias_index(
+            client,
+            settings.azure_search_index_name,
+            settings.azure_search_alias_api_version,
+        )
+    finally:
+        client.close()
 
-def parse_file(
-    file: File, parser: DocumentAnalysisParser, splitter: SentenceTextSplitter
-) -> List[Section]:
-    pages = [
-        page
-        for page in parser.parse(
-            content=file.content,
+
+def build_search_index_sink(
+    settings: Settings, http_transport: SharedHttpTransport
+) -> SearchIndexSink:
+    required = {
+        "AZURE_SEARCH_ENDPOINT": settings.azure_search_endpoint,
+        "AZURE_SEARCH_ADMIN_KEY": settings.azure_search_admin_key,
+        "AZURE_SEARCH_INDEX_NAME": settings.azure_search_index_name,
+        "OPENAI_RESOURCE_URI": settings.openai_resource_uri,
+        "OPENAI_API_KEY": settings.openai_api_key,
+        "OPENAI_EMBEDDINGS_DEPLOYMENT_ID": settings.openai_embeddings_deployment_id,
+    }
+    missing = [name for name, value in required.items() if not value]
+    if missing:
+        raise ValueError(f"SINK_MODE=push requires {', '.join(missing)}")
+    live_index = get_live_index_name(settings, http_transport)
+    if live_index is not None:
+        # The sections pushed to a version are not in the blobs, so the next version would lose them
+        raise ValueError(
+            f"SINK_MODE=push cannot write to '{settings.azure_search_index_name}', an alias of the "
+            f"versioned index '{live_index}'. Use SINK_MODE=json or jsonl with versioned indexes."
         )
-    ]
-    sections = [
-        Section(split_page, content=file) for split_page in splitter.split_pages(pages)
-    ]
-    return sections
+
+    embedder = BatchEmbedder(
+        AzureOpenAI(
+            azure_endpoint=settings.openai_resource_uri,
+            api_key=settings.openai_api_key,
+            api_version=settings.openai_api_version,
+            max_retries=settings.http_retry_total,
+            timeout=settings.http_read_timeout,
+        ),
+        deployment=settings.openai_embeddings_deployment_id,
+        dimensions=settings.openai_embeddings_dimensions or None,
+        batch_size=settings.embedding_batch_size,
+        max_batch_tokens=settings.embedding_max_batch_tokens,
+        max_concurrency=settings.embedding_max_concurrency,
+        token_budget=(
+            TokenBudget(settings.embedding_tokens_per_minute)
+            if settings.embedding_tokens_per_minute > 0
+            else None
+        ),
+        cache=(
+            EmbeddingCache(
+                settings.embedding_cache_dir,
+                max_bytes=settings.embedding_cache_max_bytes,
+            )
+            if settings.embedding_cache_dir
+            else None
+        ),
+    )
+    return SearchIndexSink(
+        settings.azure_search_endpoint,
+        AzureKeyCredential(settings.azure_search_admin_key),
+        settings.azure_search_index_name,
+        embedder,
+        batch_size=settings.search_upload_batch_size,
+        http_transport=http_transport,
+    )
+
+
+def build_index_search_client(
+    settings: Settings, http_transport: SharedHttpTransport
+) -> Optional[SearchClient]:
+    """
+    Client of the index fed by the indexer, used to delete the previous sections of the changed documents.
+    When the index is versioned, the sections are deleted from the live version; the next versions are
+    built from the blobs, which no longer have them. None if the search settings are not set.
+    """
+    if not (
+        settings.azure_search_endpoint
+        and settings.azure_search_admin_key
+        and settings.azure_search_index_name
+    ):
+        return None
+    return SearchClient(
+        endpoint=settings.azure_search_endpoint,
+        index_name=get_live_index_name(settings, http_transport)
+        or settings.azure_search_index_name,
+        credential=AzureKeyCredential(settings.azure_search_admin_key),
+        **http_transport.client_kwargs(),
+    )
 
 
 def main():
@@ -32,54 +141,113 @@ def main():
     storage_account_container = settings.storage_account_container
     storage_account_connection_string = settings.storage_account_connection_string
 
+    http_transport = SharedHttpTransport(
+        pool_size=settings.http_pool_size,
+        connection_timeout=settings.http_connection_timeout,
+        read_timeout=settings.http_read_timeout,
+        retry_total=settings.http_retry_total,
+        retry_backoff_factor=settings.http_retry_backoff_factor,
+    )
+
+    analysis_cache = (
+        AnalyzeResultCache(
+            settings.analysis_cache_dir, max_bytes=settings.analysis_cache_max_bytes
+        )
+        if settings.analysis_cache_dir
+        else None
+    )
+
     parser = DocumentAnalysisParser(
-        docintelligence_endpoint, AzureKeyCredential(docintelligence_api_key)
+        docintelligence_endpoint,
+        AzureKeyCredential(docintelligence_api_key),
+        table_format=settings.docintelligence_table_format,
+        api_version=settings.docintelligence_api_version,
+        http_transport=http_transport,
+        analysis_cache=analysis_cache,
+    )
+    analysis_scheduler = (
+        AnalyzeJobScheduler(
+            parser,
+            max_concurrency=settings.analysis_max_concurrency,
+            max_retries=settings.analysis_max_retries,
+            polling_interval=settings.analysis_polling_interval,
+        )
+        if settings.analysis_scheduler_enabled
+        else None
+    )
+    use_encoder_cache_dir(settings.tiktoken_cache_dir)
+    splitter = (
+        ParallelTextSplitter(
+            processes=settings.splitter_processes,
+            table_format=settings.docintelligence_table_format,
+        )
+        if settings.splitter_processes > 0
+        else SentenceTextSplitter(table_format=settings.docintelligence_table_format)
     )
-    splitter = SentenceTextSplitter()
 
     storage_account = AzureStorageAccount(
         storage_account_name,
         storage_account_container,
         storage_account_connection_string,
+        spool_dir=settings.ingestion_spool_dir,
+        download_chunk_size=settings.storage_download_chunk_size,
+        download_max_concurrency=settings.storage_download_max_concurrency,
+        http_transport=http_transport,
     )
 
-    files = storage_account.download_files()
-    files = [files[0], files[1]]
-
-    for file in files:
-        sections = parse_file(file, parser, splitter)
-        print(file.filename())
-        if sections:
-            MAX_BATCH_SIZE = 1000
-            section_batches = [
-                sections[i : i + MAX_BATCH_SIZE]
-                for i in range(0, len(sections), MAX_BATCH_SIZE)
-            ]
-
-            for batch_index, batch in enumerate(section_batches):
-                for section_index, section in enumerate(batch):
-                    document = {
-                        "id": f"{section.content.filename_to_id()}-page-{section_index + batch_index * MAX_BATCH_SIZE}",
-                        "subject": file.url.split("/")[6],
-                        "type": file.url.split("/")[7],
-                        "storage_url": file.url,
-                        "title": section.content.filename(),
-                        "chapter": "",
-                        "section": "",
-                        "page": str(section.split_page.page_num),
-                        "content": re.sub(
-                            r"<[^>]*>|<!--.*?-->|\\n+",
-                            " ",
-                            section.split_page.text,
-                            flags=re.DOTALL,
-                        )
-                        .strip()
-                        .replace("\n", " "),
-                    }
-                    storage_account.upload_blob(
-                        data=document,
-                        blob_name=f"{ "/".join(file.url.split("/")[4:7])}/processed/{section.content.filename()}-{section_index}-parsed.json",
-                    )
+    sink = (
+        build_search_index_sink(settings, http_transport)
+        if settings.sink_mode == "push"
+        else SectionSink(
+            storage_account,
+            mode=settings.sink_mode,
+            batch_size=settings.sink_batch_size,
+            max_concurrency=settings.sink_max_concurrency,
+            max_pending=settings.sink_max_pending,
+            search_client=build_index_search_client(settings, http_transport),
+        )
+    )
+
+    deduplicator = (
+        SectionDeduplicator(
+            policy=settings.dedup_policy, threshold=settings.dedup_threshold
+        )
+        if settings.dedup_enabled
+        else None
+    )
+
+    pipeline = IngestionPipeline(
+        parser=parser,
+        splitter=splitter,
+        storage_account=storage_account,
+        sink=sink,
+        max_workers=settings.ingestion_max_workers,
+        max_in_flight=settings.ingestion_max_in_flight,
+        analysis_scheduler=analysis_scheduler,
+        deduplicator=deduplicator,
+    )
+
+    try:
+        summary = pipeline.run_incremental(
+            manifest_blob_name=settings.ingestion_manifest_blob,
+            full_refresh=settings.ingestion_full_refresh,
+        )
+    finally:
+        sink.close()
+        parser.close()
+        if isinstance(splitter, ParallelTextSplitter):
+            splitter.close()
+        storage_account.close()
+        http_transport.close()
+    summary.log()
+    if deduplicator is not None:
+        deduplicator.log()
+    if isinstance(sink, SearchIndexSink):
+        sink.embedder.log()
+        if sink.embedder.cache is not None:
+            sink.embedder.cache.log()
+    if analysis_cache is not None:
+        analysis_cache.log()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,228 @@
+"""
+The page assembly and splitting algorithms of the first version of the ingestion, kept as the reference
+of the differential tests. They scan the text one character at a time, so they are only fit for small inputs.
+"""
+
+import html
+from typing import Generator, List
+
+from features.parsers import Page, SplitPage
+from features.splitters import get_encoder
+from features.splitters.textsplitter import (
+    CJK_SENTENCE_ENDINGS,
+    CJK_WORD_BREAKS,
+    DEFAULT_OVERLAP_PERCENT,
+    DEFAULT_SECTION_LENGTH,
+    STANDARD_SENTENCE_ENDINGS,
+    STANDARD_WORD_BREAKS,
+)
+
+
+def table_to_html(table) -> str:
+    table_html = "<table>"
+    rows = [
+        sorted(
+            [cell for cell in table.cells if cell.row_index == i],
+            key=lambda cell: cell.column_index,
+        )
+        for i in range(table.row_count)
+    ]
+    for row_cells in rows:
+        table_html += "<tr>"
+        for cell in row_cells:
+            tag = (
+                "th"
+                if (cell.kind == "columnHeader" or cell.kind == "rowHeader")
+                else "td"
+            )
+            cell_spans = ""
+            if cell.column_span is not None and cell.column_span > 1:
+                cell_spans += f" colSpan={cell.column_span}"
+            if cell.row_span is not None and cell.row_span > 1:
+                cell_spans += f" rowSpan={cell.row_span}"
+            table_html += f"<{tag}{cell_spans}>{html.escape(cell.content)}</{tag}>"
+        table_html += "</tr>"
+    table_html += "</table>"
+    return table_html
+
+
+def find_tables_on_page(doc_intelligence_results, page_num):
+    return [
+        table
+        for table in (doc_intelligence_results.tables or [])
+        if table.bounding_regions
+        and table.bounding_regions[0].page_number == page_num + 1
+    ]
+
+
+def generate_table_chars(tables_on_page, page):
+    page_offset = page.spans[0].offset
+    page_length = page.spans[0].length
+    table_chars = [-1] * page_length
+    for table_id, table in enumerate(tables_on_page):
+        for span in table.spans:
+            for i in range(span.length):
+                idx = span.offset - page_offset + i
+                if idx >= 0 and idx < page_length:
+                    table_chars[idx] = table_id
+    return table_chars, page_offset
+
+
+def generate_page_text(
+    doc_intelligence_results, page_offset, table_chars, tables_on_page
+):
+    page_text = ""
+    added_tables = set()
+    for idx, table_id in enumerate(table_chars):
+        if table_id == -1:
+            page_text += doc_intelligence_results.content[page_offset + idx]
+        elif table_id not in added_tables:
+            page_text += table_to_html(tables_on_page[table_id])
+            added_tables.add(table_id)
+    return page_text
+
+
+def pages_from_result(doc_intelligence_results) -> List[Page]:
+    offset = 0
+    pages = []
+    for page_num, page in enumerate(doc_intelligence_results.pages):
+        tables_on_page = find_tables_on_page(doc_intelligence_results, page_num)
+        table_chars, page_offset = generate_table_chars(tables_on_page, page)
+        page_text = generate_page_text(
+            doc_intelligence_results, page_offset, table_chars, tables_on_page
+        )
+        pages.append(Page(page_num=page_num, offset=offset, text=page_text))
+        offset += len(page_text)
+    return pages
+
+
+class SentenceTextSplitter:
+    def __init__(self, max_tokens_per_section: int = 500):
+        self.sentence_endings = STANDARD_SENTENCE_ENDINGS + CJK_SENTENCE_ENDINGS
+        self.word_breaks = STANDARD_WORD_BREAKS + CJK_WORD_BREAKS
+        self.max_section_length = DEFAULT_SECTION_LENGTH
+        self.sentence_search_limit = 100
+        self.max_tokens_per_section = max_tokens_per_section
+        self.section_overlap = int(
+            self.max_section_length * DEFAULT_OVERLAP_PERCENT / 100
+        )
+
+    def split_page_by_max_tokens(
+        self, page_num: int, text: str
+    ) -> Generator[SplitPage, None, None]:
+        tokens = get_encoder().encode(text)
+        if len(tokens) <= self.max_tokens_per_section:
+            yield SplitPage(page_num=page_num, text=text)
+        else:
+            start = int(len(text) // 2)
+            pos = 0
+            boundary = int(len(text) // 3)
+            split_position = -1
+            while start - pos > boundary:
+                if text[start - pos] in self.sentence_endings:
+                    split_position = start - pos
+                    break
+                elif text[start + pos] in self.sentence_endings:
+                    split_position = start + pos
+                    break
+                else:
+                    pos += 1
+
+            if split_position > 0:
+                first_half = text[: split_position + 1]
+                second_half = text[split_position + 1 :]
+            else:
+                middle = int(len(text) // 2)
+                overlap = int(len(text) * (DEFAULT_OVERLAP_PERCENT / 100))
+                first_half = text[: middle + overlap]
+                second_half = text[middle - overlap :]
+            yield from self.split_page_by_max_tokens(page_num, first_half)
+            yield from self.split_page_by_max_tokens(page_num, second_half)
+
+    def find_page(self, pages, offset):
+        num_pages = len(pages)
+        for i in range(num_pages - 1):
+            if offset >= pages[i].offset and offset < pages[i + 1].offset:
+                return pages[i].page_num
+        return pages[num_pages - 1].page_num
+
+    def split_pages(self, pages: List[Page]) -> Generator[SplitPage, None, None]:
+        all_text = "".join(page.text for page in pages)
+        if len(all_text.strip()) == 0:
+            return
+
+        length = len(all_text)
+        if length <= self.max_section_length:
+            yield from self.split_page_by_max_tokens(
+                page_num=self.find_page(pages, 0), text=all_text
+            )
+            return
+
+        start = 0
+        end = length
+        while start + self.section_overlap < length:
+            end = self.find_section_end(all_text, start, length)
+            start = self.adjust_start_for_next_section(all_text, start, end)
+            section_text = all_text[start:end]
+            yield from self.split_page_by_max_tokens(
+                page_num=self.find_page(pages, start), text=section_text
+            )
+
+            start = self.handle_unclosed_tables(pages, section_text, start, end)
+
+        if start + self.section_overlap < end:
+            yield from self.split_page_by_max_tokens(
+                page_num=self.find_page(pages, start), text=all_text[start:end]
+            )
+
+    def find_section_end(self, all_text, start, length):
+        last_word = -1
+        end = start + self.max_section_length
+
+        if end > length:
+            end = length
+        else:
+            while (
+                end < length
+                and (end - start - self.max_section_length) < self.sentence_search_limit
+                and all_text[end] not in self.sentence_endings
+            ):
+                if all_text[end] in self.word_breaks:
+                    last_word = end
+                end += 1
+            if (
+                end < length
+                and all_text[end] not in self.sentence_endings
+                and last_word > 0
+            ):
+                end = last_word
+        if end < length:
+            end += 1
+        return end
+
+    def adjust_start_for_next_section(self, all_text, start, end):
+        last_word = -1
+        while (
+            start > 0
+            and start > end - self.max_section_length - 2 * self.sentence_search_limit
+            and all_text[start] not in self.sentence_endings
+        ):
+            if all_text[start] in self.word_breaks:
+                last_word = start
+            start -= 1
+        if all_text[start] not in self.sentence_endings and last_word > 0:
+            start = last_word
+        if start > 0:
+            start += 1
+        return start
+
+    def handle_unclosed_tables(self, pages, section_text, start, end):
+        last_table_start = section_text.rfind("<table")
+        if (
+            last_table_start > 2 * self.sentence_search_limit
+            and last_table_start > section_text.rfind("</table")
+        ):
+            start = min(end - self.section_overlap, start + last_table_start)
+        else:
+            start = end - self.section_overlap
+        return start
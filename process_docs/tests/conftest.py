@@ -0,0 +1,57 @@
+import pytest
+import tiktoken
+
+from azure.core.credentials import AzureKeyCredential
+
+from features.splitters import get_encoder
+from features.storage import AzureStorageAccount
+
+from fakes import FakeAnalysisParser, FakeContainerClient
+
+# Split pattern of cl100k_base. Without merges every byte is a token, which keeps the counts
+# predictable and needs no download of the BPE ranks
+PAT_STR = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+
+
+@pytest.fixture(autouse=True, scope="session")
+def byte_encoder():
+    """
+    Replaces the BPE ranks of the embedding model, downloaded on first use, with a byte level encoder.
+    """
+    encoder = tiktoken.Encoding(
+        name="bytes",
+        pat_str=PAT_STR,
+        mergeable_ranks={bytes([byte]): byte for byte in range(256)},
+        special_tokens={},
+    )
+    patch = pytest.MonkeyPatch()
+    patch.setattr(tiktoken, "encoding_for_model", lambda model_name: encoder)
+    get_encoder.cache_clear()
+    yield encoder
+    patch.undo()
+    get_encoder.cache_clear()
+
+
+@pytest.fixture
+def container() -> FakeContainerClient:
+    return FakeContainerClient()
+
+
+@pytest.fixture
+def storage_account(container, tmp_path) -> AzureStorageAccount:
+    storage_account = AzureStorageAccount(
+        storage_account_name="account",
+        storage_container_name="documents",
+        connection_string="UseDevelopmentStorage=true",
+        spool_dir=str(tmp_path / "spool"),
+    )
+    storage_account.container_client = container
+    storage_account.service_client = container
+    return storage_account
+
+
+@pytest.fixture
+def parser() -> FakeAnalysisParser:
+    return FakeAnalysisParser(
+        endpoint="https://di.local", credential=AzureKeyCredential("key")
+    )
@@ -0,0 +1,156 @@
+"""
+In-memory stand-ins of the Azure services used by the ingestion, so that the pipeline runs without network access.
+"""
+
+import io
+import threading
+from typing import Dict, List, Optional, Set
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import BlobProperties
+
+from features.parsers import DocumentAnalysisParser, Page
+
+ACCOUNT_URL = "https://account.blob.core.windows.net/documents"
+
+# Separates the pages of the fake documents
+PAGE_BREAK = "\f"
+
+
+class FakeDownloader:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def readinto(self, stream) -> int:
+        stream.write(self.data)
+        return len(self.data)
+
+    def readall(self) -> bytes:
+        return self.data
+
+
+class FakeBlobClient:
+    def __init__(self, container: "FakeContainerClient", name: str):
+        self.container = container
+        self.name = name
+        self.url = f"{ACCOUNT_URL}/{name}"
+
+    def download_blob(self, max_concurrency: int = 1) -> FakeDownloader:
+        with self.container.lock:
+            if self.name in self.container.failing:
+                raise ConnectionError(f"Connection reset while reading {self.name}")
+            if self.name not in self.container.blobs:
+                raise ResourceNotFoundError(f"Blob {self.name} not found")
+            return FakeDownloader(self.container.blobs[self.name])
+
+    def upload_blob(self, data, overwrite: bool = False):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with self.container.lock:
+            self.container.blobs[self.name] = data
+            self.container.etags[self.name] = (
+                f'"{len(self.container.etags)}-{len(data)}"'
+            )
+
+
+class FakeContainerClient:
+    """
+    Container client that keeps the blobs in a dictionary. The downloads of the blobs in failing raise
+    a ConnectionError.
+    """
+
+    def __init__(self, blobs: Optional[Dict[str, bytes]] = None):
+        self.lock = threading.Lock()
+        self.blobs: Dict[str, bytes] = {}
+        self.etags: Dict[str, str] = {}
+        self.failing: Set[str] = set()
+        self.deleted: List[str] = []
+        for name, data in (blobs or {}).items():
+            self.get_blob_client(name).upload_blob(data)
+
+    def get_blob_client(self, name: str) -> FakeBlobClient:
+        return FakeBlobClient(self, name)
+
+    def list_blobs(self, name_starts_with: Optional[str] = None):
+        with self.lock:
+            names = sorted(self.blobs)
+        for name in names:
+            if name_starts_with is None or name.startswith(name_starts_with):
+                blob = BlobProperties(name=name)
+                blob.etag = self.etags[name]
+                yield blob
+
+    def delete_blob(self, name: str):
+        with self.lock:
+            if name not in self.blobs:
+                raise ResourceNotFoundError(f"Blob {name} not found")
+            del self.blobs[name]
+            self.deleted.append(name)
+
+    def close(self):
+        pass
+
+
+class FakeAnalysisParser(DocumentAnalysisParser):
+    """
+    Parser that reads the pages of plain text documents, separated by form feeds, instead of analyzing them.
+    """
+
+    def parse(self, content: io.BufferedReader) -> List[Page]:
+        pages = []
+        offset = 0
+        for page_num, text in enumerate(
+            content.read().decode("utf-8").split(PAGE_BREAK)
+        ):
+            pages.append(Page(page_num=page_num, offset=offset, text=text))
+            offset += len(text)
+        return pages
+
+
+class IndexingResult:
+    def __init__(self, key: str, succeeded: bool = True, status_code: int = 200):
+        self.key = key
+        self.succeeded = succeeded
+        self.status_code = status_code
+        self.error_message = None
+
+
+class FakeSearchClient:
+    """
+    Documents client of a search index that keeps the documents in a dictionary by id.
+    """
+
+    def __init__(self, documents: Optional[List[Dict]] = None):
+        self.documents = {document["id"]: document for document in documents or []}
+        self.filters: List[str] = []
+
+    def search(self, search_text: str = "*", filter: Optional[str] = None, **kwargs):
+        self.filters.append(filter)
+        conditions = [
+            condition.split(" eq ")
+            for condition in (filter or "").split(" and ")
+            if condition
+        ]
+        for document in list(self.documents.values()):
+            if all(
+                document.get(field) is None
+                if value == "null"
+                else str(document.get(field)) == value.strip("'").replace("''", "'")
+                for field, value in conditions
+            ):
+                yield {"id": document["id"]}
+
+    def merge_or_upload_documents(self, documents: List[Dict]) -> List[IndexingResult]:
+        for document in documents:
+            self.documents[document["id"]] = {
+                **self.documents.get(document["id"], {}),
+                **document,
+            }
+        return [IndexingResult(document["id"]) for document in documents]
+
+    def delete_documents(self, documents: List[Dict]):
+        for document in documents:
+            self.documents.pop(document["id"], None)
+
+    def close(self):
+        pass
@@ -0,0 +1,99 @@
+import io
+import json
+from typing import Dict, List, Tuple
+
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+from urllib3.response import HTTPResponse
+
+from features.configuration import Settings
+from features.transport import SharedHttpTransport
+from main import build_index_search_client, build_search_index_sink
+
+ENDPOINT = "https://search.local"
+
+
+class FakeAliasesAdapter(BaseAdapter):
+    """
+    Aliases endpoint of Azure AI Search, answering the requests of a requests session.
+    """
+
+    def __init__(self, aliases: Dict[str, List[str]]):
+        super().__init__()
+        self.aliases = aliases
+        self.requests: List[Tuple[str, str]] = []
+
+    def send(self, request, **kwargs):
+        self.requests.append((request.method, request.url))
+        name = request.path_url.split("'")[1]
+        if name in self.aliases:
+            status = 200
+            body = {"name": name, "indexes": self.aliases[name]}
+        else:
+            status = 404
+            body = {"error": {"code": "", "message": f"No alias {name}"}}
+        content = json.dumps(body).encode("utf-8")
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.status_code = status
+        response.headers["Content-Type"] = "application/json"
+        response.raw = HTTPResponse(
+            body=io.BytesIO(content),
+            status=status,
+            headers={"Content-Type": "application/json"},
+            preload_content=False,
+        )
+        return response
+
+    def close(self):
+        pass
+
+
+def settings(**kwargs) -> Settings:
+    return Settings(
+        docintelligence_api_endpoint="https://di.local",
+        docintelligence_api_key="key",
+        storage_account_name="account",
+        storage_account_container="documents",
+        storage_account_connection_string="UseDevelopmentStorage=true",
+        azure_search_endpoint=ENDPOINT,
+        azure_search_admin_key="key",
+        azure_search_index_name="tutoria-index",
+        openai_resource_uri="https://openai.local",
+        openai_api_key="key",
+        openai_embeddings_deployment_id="embeddings",
+        **kwargs,
+    )
+
+
+def transport(adapter: BaseAdapter) -> SharedHttpTransport:
+    http_transport = SharedHttpTransport(retry_total=0)
+    http_transport.get_session().mount(ENDPOINT, adapter)
+    return http_transport
+
+
+def test_the_sections_are_deleted_from_the_live_version():
+    adapter = FakeAliasesAdapter({"tutoria-index": ["tutoria-index-v3"]})
+
+    client = build_index_search_client(settings(), transport(adapter))
+
+    assert client._index_name == "tutoria-index-v3"
+    method, url = adapter.requests[0]
+    assert method == "GET"
+    assert "/aliases('tutoria-index')" in url
+    assert "api-version=2024-05-01-preview" in url
+
+
+def test_an_index_without_versions_is_used_as_is():
+    client = build_index_search_client(settings(), transport(FakeAliasesAdapter({})))
+
+    assert client._index_name == "tutoria-index"
+
+
+def test_push_mode_refuses_an_alias():
+    adapter = FakeAliasesAdapter({"tutoria-index": ["tutoria-index-v3"]})
+
+    with pytest.raises(ValueError, match="alias of the versioned index"):
+        build_search_index_sink(settings(sink_mode="push"), transport(adapter))
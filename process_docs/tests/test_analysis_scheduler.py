@@ -0,0 +1,217 @@
+import asyncio
+import json
+import time
+from typing import Dict, List
+
+import pytest
+from aiohttp import web
+from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
+
+from features.parsers import AnalyzeJobScheduler, DocumentAnalysisParser, File
+from features.parsers.analysis_scheduler import retry_after_seconds
+
+ANALYZE_PATH = "/documentintelligence/documentModels/{model}:analyze"
+RESULT_PATH = "/documentintelligence/documentModels/{model}/analyzeResults/{operation}"
+
+
+class FakeDocumentIntelligence:
+    """
+    Document Intelligence service that answers the first analyze requests with the given responses and
+    accepts the rest. Every accepted analysis succeeds on its first poll.
+    """
+
+    def __init__(self, responses: List[web.Response] = ()):
+        self.responses = list(responses)
+        self.requests: List[float] = []
+        self.running = 0
+        self.max_running = 0
+        self.operations: Dict[str, str] = {}
+        self.base_url = ""
+
+    async def analyze(self, request: web.Request) -> web.Response:
+        content = (await request.read()).decode("utf-8")
+        self.requests.append(time.monotonic())
+        if self.responses:
+            return self.responses.pop(0)
+        operation = str(len(self.operations))
+        self.operations[operation] = content
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        location = f"{self.base_url}{request.path.replace(':analyze', '')}/analyzeResults/{operation}"
+        return web.Response(status=202, headers={"Operation-Location": location})
+
+    async def result(self, request: web.Request) -> web.Response:
+        content = self.operations[request.match_info["operation"]]
+        self.running -= 1
+        return web.json_response(
+            {
+                "status": "succeeded",
+                "analyzeResult": {
+                    "apiVersion": "2024-02-29-preview",
+                    "modelId": "prebuilt-layout",
+                    "content": content,
+                    "pages": [
+                        {
+                            "pageNumber": 1,
+                            "spans": [{"offset": 0, "length": len(content)}],
+                        }
+                    ],
+                },
+            }
+        )
+
+
+def throttled(headers: Dict[str, str]) -> web.Response:
+    return web.Response(
+        status=429,
+        headers=headers,
+        content_type="application/json",
+        text=json.dumps({"error": {"code": "429", "message": "Too many requests"}}),
+    )
+
+
+def analyze_files(service: FakeDocumentIntelligence, files: List[File], **kwargs):
+    """
+    Serves the fake service on a local port and runs the scheduler against it.
+    """
+
+    async def run():
+        app = web.Application()
+        app.router.add_post(ANALYZE_PATH, service.analyze)
+        app.router.add_get(RESULT_PATH, service.result)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        service.base_url = f"http://127.0.0.1:{port}"
+        scheduler = AnalyzeJobScheduler(
+            parser=DocumentAnalysisParser(
+                endpoint=service.base_url, credential=AzureKeyCredential("key")
+            ),
+            polling_interval=0.01,
+            **kwargs,
+        )
+        try:
+            results = [result async for result in scheduler.analyze_all(files)]
+        finally:
+            await runner.cleanup()
+        return scheduler, {file.filename(): result for file, result in results}
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def files(tmp_path) -> List[File]:
+    files = []
+    for n in range(6):
+        path = tmp_path / f"document-{n}.pdf"
+        path.write_text(f"Document {n}.")
+        files.append(File(content=open(path, "rb")))
+    yield files
+    for file in files:
+        file.close()
+
+
+def test_every_document_is_analyzed(files):
+    service = FakeDocumentIntelligence()
+
+    scheduler, results = analyze_files(service, files, max_concurrency=2)
+
+    assert {name: result.content for name, result in results.items()} == {
+        f"document-{n}.pdf": f"Document {n}." for n in range(6)
+    }
+    assert service.max_running <= 2
+    assert scheduler.throttled_requests == 0
+
+
+def test_throttled_requests_wait_for_retry_after(files):
+    service = FakeDocumentIntelligence([throttled({"Retry-After": "1"})])
+
+    scheduler, results = analyze_files(service, files[:1])
+
+    assert results["document-0.pdf"].content == "Document 0."
+    assert scheduler.throttled_requests == 1
+    assert service.requests[1] - service.requests[0] >= 1.0
+
+
+def test_throttled_requests_are_retried(files):
+    service = FakeDocumentIntelligence(
+        [throttled({"retry-after-ms": "50"}) for _ in range(2)]
+    )
+
+    scheduler, results = analyze_files(service, files, max_concurrency=4)
+
+    assert all(not isinstance(result, Exception) for result in results.values())
+    assert scheduler.throttled_requests == 2
+    assert len(service.requests) == len(files) + 2
+    # The concurrency grows back with the successful analyses
+    assert scheduler.concurrency_limit == 4
+
+
+def test_throttling_halves_the_concurrency():
+    scheduler = AnalyzeJobScheduler(
+        parser=DocumentAnalysisParser(
+            endpoint="https://di.local", credential=AzureKeyCredential("key")
+        ),
+        max_concurrency=8,
+        initial_backoff=1.0,
+        max_backoff=4.0,
+    )
+    scheduler.concurrency_limit = scheduler.max_concurrency
+    scheduler.backoff = scheduler.initial_backoff
+
+    async def throttle(times: int) -> List[float]:
+        return [scheduler.on_throttled(None) for _ in range(times)]
+
+    delays = asyncio.run(throttle(4))
+
+    assert scheduler.concurrency_limit == 1
+    assert [int(delay) for delay in delays] == [1, 2, 4, 4]
+    for _ in range(3):
+        scheduler.on_success()
+    assert scheduler.concurrency_limit == 4
+    assert scheduler.backoff == 1.0
+
+
+def test_retries_are_bounded(files):
+    service = FakeDocumentIntelligence(
+        [throttled({"retry-after-ms": "10"}) for _ in range(3)]
+    )
+
+    scheduler, results = analyze_files(service, files[:1], max_retries=2)
+
+    assert isinstance(results["document-0.pdf"], HttpResponseError)
+    assert len(service.requests) == 3
+
+
+def test_client_errors_are_not_retried(files):
+    service = FakeDocumentIntelligence(
+        [web.json_response({"error": {"code": "InvalidRequest"}}, status=400)]
+    )
+
+    scheduler, results = analyze_files(service, files[:2], max_concurrency=1)
+
+    assert isinstance(results["document-0.pdf"], HttpResponseError)
+    assert results["document-1.pdf"].content == "Document 1."
+    assert scheduler.throttled_requests == 0
+
+
+class Response:
+    def __init__(self, headers: Dict[str, str]):
+        self.headers = headers
+
+
+@pytest.mark.parametrize(
+    "headers, seconds",
+    [
+        ({"retry-after-ms": "1500"}, 1.5),
+        ({"x-ms-retry-after-ms": "250"}, 0.25),
+        ({"Retry-After": "3"}, 3.0),
+        ({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}, None),
+        ({}, None),
+    ],
+)
+def test_retry_after_seconds(headers, seconds):
+    assert retry_after_seconds(Response(headers)) == seconds
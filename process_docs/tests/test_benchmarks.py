@@ -0,0 +1,66 @@
+from benchmarks.suite import STAGES, find_regressions, find_scaling_regressions
+from benchmarks.synthetic import DEFAULT_CORPORA
+
+
+def corpus_report(pages: int, pages_per_second: float, **corpus) -> dict:
+    stage = {
+        "pages_per_second": pages_per_second,
+        "chars_per_second": pages_per_second * 3000,
+        "sections_per_second": pages_per_second * 3,
+        "peak_memory_bytes": pages * 1000,
+    }
+    return {"pages": pages, **corpus, **{name: dict(stage) for name in STAGES}}
+
+
+def test_long_book_is_a_regression_case():
+    corpora = {corpus.name: corpus for corpus in DEFAULT_CORPORA}
+    long_book = corpora["long_book"]
+
+    assert long_book.pages == 1000
+    assert long_book.reference == "book"
+    assert long_book.tolerance is not None
+    assert long_book.scaled(0.5).tolerance == long_book.tolerance
+
+
+def test_stages_must_scale_linearly():
+    report = {
+        "corpora": {
+            "book": corpus_report(300, 1000.0),
+            "long_book": corpus_report(1000, 850.0, tolerance=0.1, reference="book"),
+        }
+    }
+
+    regressions = find_scaling_regressions(report, tolerance=0.2)
+
+    assert len(regressions) == len(STAGES)
+    assert regressions[0].startswith("long_book/parse: 850 pages/s for 1,000 pages")
+
+
+def test_scaling_is_not_checked_without_the_reference():
+    report = {
+        "corpora": {
+            "long_book": corpus_report(1000, 10.0, tolerance=0.1, reference="book")
+        }
+    }
+
+    assert find_scaling_regressions(report) == []
+
+
+def test_corpus_tolerance_overrides_the_run_tolerance():
+    baseline = {
+        "corpora": {
+            "book": corpus_report(300, 1000.0),
+            "long_book": corpus_report(1000, 1000.0, tolerance=0.1),
+        }
+    }
+    report = {
+        "corpora": {
+            "book": corpus_report(300, 850.0),
+            "long_book": corpus_report(1000, 850.0, tolerance=0.1),
+        }
+    }
+
+    regressions = find_regressions(report, baseline, tolerance=0.2)
+
+    assert regressions
+    assert all(regression.startswith("long_book/") for regression in regressions)
@@ -0,0 +1,222 @@
+import io
+import json
+import random
+import string
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import pytest
+
+from features.deduplication import SectionDeduplicator
+from features.ingestion import IngestionPipeline
+from features.parsers import File
+from features.splitters import SentenceTextSplitter
+from features.storage import SectionSink
+
+from fakes import PAGE_BREAK
+
+MANIFEST = "manifests/ingestion-manifest.json"
+ALGEBRA = "course/2024/math/books/algebra.pdf"
+ALGEBRA_COPY = "course/2024/math/books/second-algebra.pdf"
+GEOMETRY = "course/2024/math/books/geometry.pdf"
+
+
+def text(topic: str, sentences: int = 40) -> str:
+    rnd = random.Random(topic)
+    words = ["".join(rnd.choices(string.ascii_lowercase, k=6)) for _ in range(50)]
+    return " ".join(
+        " ".join(rnd.choices(words, k=8)).capitalize() + "." for _ in range(sentences)
+    )
+
+
+def book(topic: str) -> bytes:
+    content = text(topic)
+    return PAGE_BREAK.join([content[:1500], content[1500:]]).encode("utf-8")
+
+
+def document(document_id: str, content: str, page: int = 0) -> Dict:
+    return {"id": document_id, "content": content, "page": str(page)}
+
+
+def file(name: str) -> File:
+    return File(
+        content=io.BufferedReader(io.BytesIO()),
+        url=f"https://account/documents/{name}",
+        blob_name=name,
+    )
+
+
+def ids(documents: List[Dict]) -> List[str]:
+    return [document["id"] for document in documents]
+
+
+@pytest.fixture
+def pipeline(parser, storage_account) -> IngestionPipeline:
+    sink = SectionSink(storage_account=storage_account)
+    yield IngestionPipeline(
+        parser=parser,
+        splitter=SentenceTextSplitter(max_tokens_per_section=200),
+        storage_account=storage_account,
+        sink=sink,
+        max_workers=4,
+        deduplicator=SectionDeduplicator(),
+    )
+    sink.close()
+
+
+def processed(container, name: str):
+    prefix = "/".join(name.split("/")[:3]) + "/processed/" + name.split("/")[-1]
+    return sorted(blob for blob in container.blobs if blob.startswith(prefix))
+
+
+def test_dropped_groups_do_not_make_duplicates_in_other_files():
+    deduplicator = SectionDeduplicator(policy="drop")
+    first, second = file(ALGEBRA), file(GEOMETRY)
+    deduplicator.start([first, second], across_files=True)
+
+    kept = list(
+        deduplicator.filter(
+            first,
+            [
+                document("a-0", text("footers"), page=1),
+                document("a-1", text("algebra")),
+                document("a-2", text("footers"), page=2),
+            ],
+        )
+    )
+    kept_second = list(
+        deduplicator.filter(
+            second, [document("g-0", text("footers")), document("g-1", text("algebra"))]
+        )
+    )
+
+    assert ids(kept) == ["a-1"]
+    assert ids(kept_second) == ["g-0"]
+    assert deduplicator.duplicate_of(second) == [ALGEBRA]
+    assert deduplicator.sections_dropped == 3
+
+
+def test_merged_sections_keep_the_pages_of_their_group():
+    deduplicator = SectionDeduplicator(policy="merge_metadata")
+    deduplicator.start([], across_files=True)
+
+    kept = list(
+        deduplicator.filter(
+            file(ALGEBRA),
+            [
+                document("a-0", text("footers"), page=1),
+                document("a-1", text("algebra"), page=2),
+                document("a-2", text("footers"), page=3),
+            ],
+        )
+    )
+
+    assert [(d["id"], d["page"]) for d in kept] == [("a-0", "1"), ("a-1", "2")]
+    assert [d.get("duplicate_pages") for d in kept] == [["3"], None]
+    assert deduplicator.sections_merged == 1
+
+
+def test_files_are_only_compared_with_each_other_in_full_runs():
+    deduplicator = SectionDeduplicator()
+    first, second = file(ALGEBRA), file(GEOMETRY)
+    deduplicator.start([first, second], across_files=False)
+
+    list(deduplicator.filter(first, [document("a-0", text("algebra"))]))
+    kept = list(
+        deduplicator.filter(
+            second,
+            [
+                document("g-0", text("algebra")),
+                document("g-1", text("geometry")),
+                document("g-2", text("geometry")),
+            ],
+        )
+    )
+
+    assert ids(kept) == ["g-0", "g-1"]
+    assert deduplicator.duplicate_of(second) == []
+
+
+def test_the_first_blob_keeps_the_shared_sections(
+    pipeline, parser, container, monkeypatch
+):
+    container.get_blob_client(ALGEBRA).upload_blob(book("algebra"))
+    container.get_blob_client(ALGEBRA_COPY).upload_blob(book("algebra"))
+    parse = parser.parse
+
+    def slow_parse(content):
+        # The copy would be deduplicated first if the files did not take turns
+        if content.name.endswith("/algebra.pdf"):
+            time.sleep(0.2)
+        return parse(content)
+
+    monkeypatch.setattr(parser, "parse", slow_parse)
+
+    summary = pipeline.run_incremental(MANIFEST)
+
+    assert summary.files_processed == 2
+    assert processed(container, ALGEBRA)
+    assert processed(container, ALGEBRA_COPY) == []
+    manifest = json.loads(container.blobs[MANIFEST])["documents"]
+    assert manifest[ALGEBRA_COPY]["duplicate_of"] == [ALGEBRA]
+    assert manifest[ALGEBRA]["duplicate_of"] == []
+
+
+def test_dropped_sections_are_written_when_their_document_changes(pipeline, container):
+    container.get_blob_client(ALGEBRA).upload_blob(book("algebra"))
+    container.get_blob_client(ALGEBRA_COPY).upload_blob(book("algebra"))
+    container.get_blob_client(GEOMETRY).upload_blob(book("geometry"))
+    pipeline.run_incremental(MANIFEST)
+    assert processed(container, ALGEBRA_COPY) == []
+
+    container.get_blob_client(ALGEBRA).upload_blob(book("calculus"))
+    summary = pipeline.run_incremental(MANIFEST)
+
+    assert summary.files_processed == 2
+    assert summary.files_skipped == [GEOMETRY]
+    assert processed(container, ALGEBRA_COPY)
+    manifest = json.loads(container.blobs[MANIFEST])["documents"]
+    assert manifest[ALGEBRA_COPY]["duplicate_of"] == []
+
+
+def test_dropped_sections_are_written_when_their_document_is_deleted(
+    pipeline, container
+):
+    container.get_blob_client(ALGEBRA).upload_blob(book("algebra"))
+    container.get_blob_client(ALGEBRA_COPY).upload_blob(book("algebra"))
+    pipeline.run_incremental(MANIFEST)
+
+    container.delete_blob(ALGEBRA)
+    summary = pipeline.run_incremental(MANIFEST)
+
+    assert summary.files_processed == 1
+    assert processed(container, ALGEBRA_COPY)
+
+
+def test_the_next_file_does_not_wait_for_the_sections_to_be_written():
+    deduplicator = SectionDeduplicator()
+    first, second = file(ALGEBRA), file(GEOMETRY)
+    list(deduplicator.start([first, second], across_files=True))
+    first_kept = deduplicator.filter(
+        first, [document("a-0", text("algebra")), document("a-1", text("footers"))]
+    )
+
+    # The first file is still being written when the second one is deduplicated
+    assert next(first_kept)["id"] == "a-0"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        second_kept = executor.submit(
+            lambda: list(
+                deduplicator.filter(
+                    second,
+                    [
+                        document("g-0", text("footers")),
+                        document("g-1", text("geometry")),
+                    ],
+                )
+            )
+        ).result(timeout=5)
+
+    assert ids(second_kept) == ["g-1"]
+    assert ids(first_kept) == ["a-1"]
+    assert deduplicator.duplicate_of(second) == [ALGEBRA]
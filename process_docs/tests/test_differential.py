@@ -0,0 +1,189 @@
+"""
+Checks that the page assembly and the splitter produce the same output as the first version of the
+ingestion (tests/baseline.py) on randomized inputs.
+"""
+
+import random
+from typing import List
+
+import pytest
+from azure.ai.documentintelligence.models import AnalyzeResult
+from azure.core.credentials import AzureKeyCredential
+
+import baseline
+from benchmarks.synthetic import SyntheticCorpus, generate_analyze_result
+from features.parsers import DocumentAnalysisParser, Page
+from features.splitters import SentenceTextSplitter
+
+CHARACTERS = list("abcdefgh    ,;:()\n.!?<>&") + ["。", "，", "！", "心", "理"]
+
+WORDS = ["alpha", "beta.", "gamma,", "delta!", "eps;", "zeta?", "(eta)", "theta:"]
+
+CJK_WORDS = ["心理学", "研究。", "记忆，", "注意！", "学习（", "）", "认知？"]
+
+
+def random_analyze_result(rnd: random.Random) -> AnalyzeResult:
+    """
+    Analyze result with random content and tables whose spans may overlap each other, cross the
+    boundaries of their page or start on another page, and whose cells may span rows and columns.
+    """
+    length = rnd.choice([0, 1, 40, 400, 3000])
+    content = "".join(rnd.choices(CHARACTERS, k=length))
+    breaks = sorted(
+        rnd.sample(range(1, length), max(0, min(rnd.randint(0, 6), length - 1)))
+    )
+    bounds = [0, *breaks, length] if length else [0, 0]
+    pages = [
+        {"pageNumber": number, "spans": [{"offset": start, "length": end - start}]}
+        for number, (start, end) in enumerate(zip(bounds, bounds[1:]), start=1)
+    ]
+    tables = []
+    for _ in range(rnd.randint(0, 8)):
+        rows, columns = rnd.randint(1, 4), rnd.randint(1, 4)
+        cells = [
+            {
+                "kind": rnd.choice(["content", "columnHeader", "rowHeader"]),
+                "rowIndex": rnd.randrange(rows + 1),
+                "columnIndex": rnd.randrange(columns),
+                "rowSpan": rnd.choice([None, 1, 2]),
+                "columnSpan": rnd.choice([None, 1, 3]),
+                "content": "".join(rnd.choices(CHARACTERS, k=rnd.randint(0, 6))),
+                "spans": [],
+            }
+            for _ in range(rnd.randint(0, rows * columns))
+        ]
+        spans = []
+        for _ in range(rnd.randint(1, 3)):
+            offset = rnd.randint(-5, length + 5)
+            spans.append({"offset": offset, "length": rnd.randint(0, 60)})
+        tables.append(
+            {
+                "rowCount": rows,
+                "columnCount": columns,
+                "cells": cells,
+                "boundingRegions": (
+                    [{"pageNumber": rnd.randint(1, len(pages)), "polygon": []}]
+                    if rnd.random() < 0.9
+                    else []
+                ),
+                "spans": spans,
+            }
+        )
+    return AnalyzeResult(
+        {
+            "apiVersion": "2024-02-29-preview",
+            "modelId": "prebuilt-layout",
+            "content": content,
+            "pages": pages,
+            "tables": tables,
+        }
+    )
+
+
+def random_pages(rnd: random.Random) -> List[Page]:
+    words = WORDS + (CJK_WORDS if rnd.random() < 0.5 else [])
+    tables = rnd.random() < 0.4
+    pages = []
+    offset = 0
+    for page_num in range(rnd.randint(1, 12)):
+        parts = []
+        page_length = 0
+        while page_length < rnd.choice([0, 10, 300, 2500]):
+            word = rnd.choice(words)
+            if tables and rnd.random() < 0.005:
+                word = (
+                    "<table><tr><td>"
+                    + "x " * rnd.randrange(10, 400)
+                    + "</td></tr></table>"
+                )
+            elif rnd.random() < 0.01:
+                word = "a" * rnd.randrange(50, 300)
+            elif rnd.random() < 0.01:
+                word = " " * rnd.randrange(1, 200)
+            parts.append(word)
+            page_length += len(word) + 1
+        text = " ".join(parts)
+        pages.append(Page(page_num=page_num, offset=offset, text=text))
+        offset += len(text)
+    return pages
+
+
+@pytest.fixture
+def parser() -> DocumentAnalysisParser:
+    return DocumentAnalysisParser(
+        endpoint="https://di.local", credential=AzureKeyCredential("key")
+    )
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_page_text_matches_the_baseline(parser, seed):
+    result = random_analyze_result(random.Random(seed))
+
+    assert parser.pages_from_result(result) == baseline.pages_from_result(result)
+
+
+@pytest.mark.parametrize(
+    "corpus",
+    [
+        SyntheticCorpus(name="book", pages=5, chars_per_page=3000, seed=1),
+        SyntheticCorpus(
+            name="tables",
+            pages=5,
+            chars_per_page=2000,
+            tables_per_page=3,
+            table_rows=10,
+            table_columns=5,
+            seed=2,
+        ),
+    ],
+    ids=lambda corpus: corpus.name,
+)
+def test_synthetic_page_text_matches_the_baseline(parser, corpus):
+    result = generate_analyze_result(corpus)
+
+    assert parser.pages_from_result(result) == baseline.pages_from_result(result)
+
+
+@pytest.mark.parametrize("max_tokens_per_section", [500, 60])
+@pytest.mark.parametrize("seed", range(40))
+def test_split_pages_matches_the_baseline(seed, max_tokens_per_section):
+    pages = random_pages(random.Random(seed))
+    splitter = SentenceTextSplitter(max_tokens_per_section=max_tokens_per_section)
+    reference = baseline.SentenceTextSplitter(
+        max_tokens_per_section=max_tokens_per_section
+    )
+
+    split_pages = [
+        (split_page.page_num, split_page.text)
+        for split_page in splitter.split_pages(pages)
+    ]
+
+    assert split_pages == [
+        (split_page.page_num, split_page.text)
+        for split_page in reference.split_pages(pages)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_section_boundaries_match_the_baseline(seed):
+    rnd = random.Random(seed)
+    alphabet = ["a", "b", ".", " ", "!", "\n", "x", "。", ",", ";"]
+    text = "".join(
+        rnd.choices(
+            alphabet,
+            weights=[rnd.random() for _ in alphabet],
+            k=rnd.choice([1, 5, 50, 500, 1500, 3000]),
+        )
+    )
+    splitter = SentenceTextSplitter()
+    reference = baseline.SentenceTextSplitter()
+
+    for _ in range(5):
+        start = rnd.randrange(len(text))
+        end = rnd.randint(start, len(text))
+        assert splitter.find_section_end(
+            text, start, len(text)
+        ) == reference.find_section_end(text, start, len(text))
+        assert splitter.adjust_start_for_next_section(
+            text, start, end
+        ) == reference.adjust_start_for_next_section(text, start, end)
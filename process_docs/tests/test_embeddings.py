@@ -0,0 +1,184 @@
+import json
+import threading
+from typing import List
+
+import httpx
+import pytest
+from azure.core.credentials import AzureKeyCredential
+from openai import AzureOpenAI
+
+import features.embeddings.batch_embedder as batch_embedder
+from features.embeddings import BatchEmbedder, EmbeddingCache
+from features.indexing import TOKEN_COUNT_FIELD, SearchIndexSink
+from features.ingestion import IngestionPipeline
+from features.splitters import SentenceTextSplitter
+
+from fakes import PAGE_BREAK, FakeSearchClient
+
+BOOK = "course/2024/math/books/algebra.pdf"
+
+
+class FakeEmbeddings:
+    """
+    Embeddings endpoint of Azure OpenAI. The embedding of a text is its length and its number of words,
+    and the answers to the first requests can be replaced by throttling responses.
+    """
+
+    def __init__(self, throttled: int = 0):
+        self.throttled = throttled
+        self.inputs: List[List[str]] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        with self.lock:
+            if self.throttled:
+                self.throttled -= 1
+                return httpx.Response(
+                    429,
+                    headers={"retry-after-ms": "10"},
+                    json={"error": {"code": "429", "message": "Rate limit"}},
+                )
+            texts = json.loads(request.content)["input"]
+            self.inputs.append(texts)
+        return httpx.Response(
+            200,
+            json={
+                "object": "list",
+                "model": "text-embedding-3-large",
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": index,
+                        "embedding": [float(len(text)), float(len(text.split()))],
+                    }
+                    for index, text in enumerate(texts)
+                ],
+                "usage": {"prompt_tokens": 1, "total_tokens": len(texts)},
+            },
+        )
+
+
+@pytest.fixture
+def endpoint() -> FakeEmbeddings:
+    return FakeEmbeddings()
+
+
+@pytest.fixture
+def embedder(endpoint):
+    embedder = BatchEmbedder(
+        AzureOpenAI(
+            azure_endpoint="https://openai.local",
+            api_key="key",
+            api_version="2024-02-01",
+            max_retries=2,
+            http_client=httpx.Client(transport=httpx.MockTransport(endpoint)),
+        ),
+        deployment="embeddings",
+        batch_size=4,
+        max_batch_tokens=100,
+        max_concurrency=2,
+    )
+    yield embedder
+    embedder.close()
+
+
+@pytest.fixture
+def no_tokenizer(monkeypatch):
+    def get_encoder():
+        raise AssertionError("The texts were tokenized again")
+
+    monkeypatch.setattr(batch_embedder, "get_encoder", get_encoder)
+
+
+def test_token_counts_batch_the_requests(embedder, endpoint, no_tokenizer):
+    texts = [f"text {n}" for n in range(10)]
+
+    embeddings = embedder.embed(texts, [30] * 10)
+
+    assert embeddings == [[6.0, 2.0]] * 10
+    # The requests run concurrently, so they can reach the endpoint in any order
+    assert sorted(len(inputs) for inputs in endpoint.inputs) == [1, 3, 3, 3]
+    assert embedder.requests == 4
+
+
+def test_texts_without_token_count_are_tokenized(embedder, endpoint):
+    texts = ["x" * 60, "y" * 60, "z" * 10]
+
+    embedder.embed(texts, [None, 60, None])
+
+    # The byte level encoder of the tests counts one token per character
+    assert sorted(endpoint.inputs) == [["x" * 60], ["y" * 60, "z" * 10]]
+
+
+def test_throttled_requests_are_retried(embedder, no_tokenizer):
+    endpoint = FakeEmbeddings(throttled=2)
+    embedder.client = AzureOpenAI(
+        azure_endpoint="https://openai.local",
+        api_key="key",
+        api_version="2024-02-01",
+        max_retries=2,
+        http_client=httpx.Client(transport=httpx.MockTransport(endpoint)),
+    )
+
+    assert embedder.embed(["some text"], [2]) == [[9.0, 2.0]]
+    assert endpoint.inputs == [["some text"]]
+
+
+def test_cached_embeddings_are_not_requested(
+    endpoint, embedder, tmp_path, no_tokenizer
+):
+    embedder.cache = EmbeddingCache(directory=str(tmp_path / "cache"))
+    embedder.embed(["first", "second"], [1, 1])
+
+    embeddings = embedder.embed(["second", "third", "third"], [1, 1, 1])
+
+    assert embeddings == [[6.0, 1.0], [5.0, 1.0], [5.0, 1.0]]
+    assert endpoint.inputs == [["first", "second"], ["third"]]
+
+
+def test_texts_with_different_whitespace_are_cached_apart(
+    endpoint, embedder, tmp_path, no_tokenizer
+):
+    embedder.cache = EmbeddingCache(directory=str(tmp_path / "cache"))
+    table = "| a | b |\n|---|---|\n| 1 | 2 |"
+    composed, decomposed = "caf\u00e9 au lait", "cafe\u0301 au lait"
+    embedder.embed([table, composed], [1, 1])
+
+    embedder.embed([table.replace("\n", " "), decomposed], [1, 1])
+
+    assert endpoint.inputs == [[table, composed], [table.replace("\n", " ")]]
+
+
+def test_push_sink_embeds_with_the_token_counts_of_the_splitter(
+    parser, storage_account, container, embedder, endpoint, no_tokenizer
+):
+    text = " ".join(f"Sentence number {n} of the book." for n in range(80))
+    container.get_blob_client(BOOK).upload_blob(
+        PAGE_BREAK.join([text[:1000], text[1000:]]).encode("utf-8")
+    )
+    index = FakeSearchClient()
+    sink = SearchIndexSink(
+        endpoint="https://search.local",
+        credential=AzureKeyCredential("key"),
+        index_name="index",
+        embedder=embedder,
+    )
+    sink.client = index
+    pipeline = IngestionPipeline(
+        parser=parser,
+        splitter=SentenceTextSplitter(max_tokens_per_section=200),
+        storage_account=storage_account,
+        sink=sink,
+    )
+
+    summary = pipeline.run(storage_account.iter_files())
+
+    assert summary.files_processed == 1
+    assert len(index.documents) == summary.sections > 1
+    for document in index.documents.values():
+        assert TOKEN_COUNT_FIELD not in document
+        assert document["embeddings"] == [
+            float(len(document["content"])),
+            float(len(document["content"].split())),
+        ]
+    assert sum(len(inputs) for inputs in endpoint.inputs) == summary.sections
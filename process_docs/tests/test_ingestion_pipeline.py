@@ -0,0 +1,222 @@
+import json
+
+import pytest
+
+from features.indexing import delete_file_documents
+from features.ingestion import IngestionPipeline
+from features.splitters import SentenceTextSplitter
+from features.storage import SectionSink
+
+from fakes import PAGE_BREAK, FakeSearchClient
+
+MANIFEST = "manifests/ingestion-manifest.json"
+BOOK = "course/2024/math/books/algebra.pdf"
+NOTES = "course/2024/math/notes/groups.pdf"
+
+
+def book(sentences: int, pages: int = 2) -> bytes:
+    text = " ".join(f"Sentence number {n} of the book." for n in range(sentences))
+    size = len(text) // pages + 1
+    return PAGE_BREAK.join(
+        text[start : start + size] for start in range(0, len(text), size)
+    ).encode("utf-8")
+
+
+@pytest.fixture
+def pipeline(parser, storage_account) -> IngestionPipeline:
+    sink = SectionSink(storage_account=storage_account)
+    yield IngestionPipeline(
+        parser=parser,
+        splitter=SentenceTextSplitter(max_tokens_per_section=200),
+        storage_account=storage_account,
+        sink=sink,
+        max_workers=2,
+    )
+    sink.close()
+
+
+def processed(container, name: str):
+    prefix = "/".join(name.split("/")[:3]) + "/processed/" + name.split("/")[-1]
+    return sorted(blob for blob in container.blobs if blob.startswith(prefix))
+
+
+def test_failed_downloads_are_counted_and_retried(pipeline, container):
+    container.get_blob_client(BOOK).upload_blob(book(20))
+    container.get_blob_client(NOTES).upload_blob(book(5))
+    container.failing.add(NOTES)
+
+    summary = pipeline.run_incremental(MANIFEST)
+
+    assert summary.files_processed == 1
+    assert summary.files_failed == [NOTES]
+    manifest = json.loads(container.blobs[MANIFEST])
+    assert list(manifest["documents"]) == [BOOK]
+
+    container.failing.clear()
+    summary = pipeline.run_incremental(MANIFEST)
+
+    assert summary.files_processed == 1
+    assert summary.files_failed == []
+    assert summary.files_skipped == [BOOK]
+    assert processed(container, NOTES)
+
+
+def test_stale_sections_are_deleted_after_writing(pipeline, container):
+    container.get_blob_client(BOOK).upload_blob(book(60))
+    pipeline.run_incremental(MANIFEST)
+    before = processed(container, BOOK)
+
+    container.get_blob_client(BOOK).upload_blob(book(10, pages=1))
+    summary = pipeline.run_incremental(MANIFEST)
+
+    after = processed(container, BOOK)
+    assert summary.files_processed == 1
+    assert 0 < len(after) < len(before)
+    assert set(before) - set(after) <= set(container.deleted)
+    assert summary.sections == len(after)
+
+
+def test_stale_json_lines_blobs_are_deleted(pipeline, container):
+    pipeline.sink.mode = "jsonl"
+    pipeline.sink.batch_size = 2
+    container.get_blob_client(BOOK).upload_blob(book(60))
+    pipeline.run_incremental(MANIFEST)
+    before = processed(container, BOOK)
+
+    container.get_blob_client(BOOK).upload_blob(book(10, pages=1))
+    summary = pipeline.run_incremental(MANIFEST)
+
+    after = processed(container, BOOK)
+    assert len(after) == -(-summary.sections // 2)
+    assert set(after) < set(before)
+    assert set(container.deleted) == set(before) - set(after)
+
+
+def test_stale_sections_are_deleted_from_the_index(pipeline, container):
+    container.get_blob_client(BOOK).upload_blob(book(60))
+    container.get_blob_client(NOTES).upload_blob(book(5))
+    pipeline.run_incremental(MANIFEST)
+    index = FakeSearchClient(
+        [
+            json.loads(data)
+            for name, data in container.blobs.items()
+            if "/processed/" in name
+        ]
+    )
+    pipeline.sink.search_client = index
+    notes = [
+        document for document in index.documents.values() if document["type"] == "notes"
+    ]
+    before = [id for id in index.documents if id.startswith("file-algebra")]
+
+    container.get_blob_client(BOOK).upload_blob(book(10, pages=1))
+    pipeline.run_incremental(MANIFEST)
+
+    written = [
+        json.loads(container.blobs[name])["id"] for name in processed(container, BOOK)
+    ]
+    assert 0 < len(written) < len(before)
+    assert sorted(index.documents) == sorted(
+        [document["id"] for document in notes] + written
+    )
+    assert len(index.filters) == 2
+    assert index.filters[0].startswith("source_id eq '")
+
+
+def test_only_the_documents_of_the_file_are_deleted(storage_account, container):
+    # Same subject, type and filename, in another folder
+    other = "course/2024/math/books/old/algebra.pdf"
+    container.get_blob_client(BOOK).upload_blob(book(5))
+    container.get_blob_client(other).upload_blob(book(5))
+    files = {file.blob_name: file for file in storage_account.iter_files()}
+    index = FakeSearchClient(
+        [
+            {"id": "1", "source_id": files[BOOK].url_hash()},
+            {"id": "2", "source_id": files[other].url_hash()},
+        ]
+    )
+
+    assert delete_file_documents(index, files[BOOK]) == 1
+
+    assert list(index.documents) == ["2"]
+    for file in files.values():
+        file.close()
+
+
+def test_sections_report_their_page_range(pipeline, container):
+    container.get_blob_client(BOOK).upload_blob(book(60, pages=3))
+
+    pipeline.run_incremental(MANIFEST)
+
+    documents = [
+        json.loads(container.blobs[name]) for name in processed(container, BOOK)
+    ]
+    ranges = {(document["page"], document["end_page"]) for document in documents}
+    assert {("0", "1"), ("1", "2")} <= ranges
+    assert all(int(page) <= int(end_page) for page, end_page in ranges)
+
+
+def test_a_failed_write_keeps_the_previous_sections(pipeline, container):
+    container.get_blob_client(BOOK).upload_blob(book(60))
+    pipeline.run_incremental(MANIFEST)
+    before = {name: container.blobs[name] for name in processed(container, BOOK)}
+
+    def fail(file, documents):
+        next(iter(documents))
+        raise RuntimeError("1 of 1 blobs could not be uploaded")
+
+    pipeline.sink.write = fail
+    container.get_blob_client(BOOK).upload_blob(book(10, pages=1))
+    summary = pipeline.run_incremental(MANIFEST)
+
+    assert summary.files_failed == ["algebra.pdf"]
+    assert {
+        name: container.blobs[name] for name in processed(container, BOOK)
+    } == before
+    assert not container.deleted
+
+
+def test_documents_with_the_same_name_have_different_ids(pipeline, container):
+    other = "course/2024/math/books/old/algebra.pdf"
+    container.get_blob_client(BOOK).upload_blob(book(20))
+    container.get_blob_client(other).upload_blob(book(20))
+
+    pipeline.run_incremental(MANIFEST)
+
+    ids = [
+        json.loads(data)["id"]
+        for name, data in container.blobs.items()
+        if "/processed/" in name
+    ]
+    assert len(ids) == len(set(ids))
+    assert len({id.rsplit("-page-", 1)[0] for id in ids}) == 2
+
+
+def test_the_sections_of_the_legacy_layout_are_deleted(pipeline, container):
+    legacy = [
+        f"course/2024/math/processed/algebra.pdf-{n}-parsed.json" for n in (0, 12)
+    ]
+    # The legacy blobs of another document whose filename starts the same way
+    other = "course/2024/math/processed/algebra.pdf-2.pdf-0-parsed.json"
+    for name in legacy + [other]:
+        container.get_blob_client(name).upload_blob(b"{}")
+    index = FakeSearchClient(
+        [
+            {
+                "id": f"file-{title}-page-0",
+                "subject": "math",
+                "type": "books",
+                "title": title,
+            }
+            for title in ("algebra.pdf", "geometry.pdf")
+        ]
+    )
+    pipeline.sink.search_client = index
+    container.get_blob_client(BOOK).upload_blob(book(20))
+
+    summary = pipeline.run_incremental(MANIFEST)
+
+    assert summary.files_processed == 1
+    assert sorted(container.deleted) == legacy
+    assert other in container.blobs
+    assert list(index.documents) == ["file-geometry.pdf-page-0"]
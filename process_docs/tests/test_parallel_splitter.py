@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from features.parsers import Page
+from features.splitters import ParallelTextSplitter, SentenceTextSplitter
+from features.splitters import parallel_splitter
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """
+    Runs the tasks in threads, which share the encoder of the tests, and counts the tasks that were
+    submitted and whose chunks were not consumed yet.
+    """
+
+    def __init__(self):
+        super().__init__(max_workers=2)
+        self.unconsumed = 0
+        self.max_unconsumed = 0
+
+    def submit(self, fn, *args):
+        self.unconsumed += 1
+        self.max_unconsumed = max(self.max_unconsumed, self.unconsumed)
+        future = super().submit(fn, *args)
+        result = future.result
+
+        def consume(timeout=None):
+            self.unconsumed -= 1
+            return result(timeout)
+
+        future.result = consume
+        return future
+
+
+@pytest.fixture
+def splitter():
+    splitter = ParallelTextSplitter(
+        max_tokens_per_section=100, processes=2, sections_per_task=2
+    )
+    splitter.executor.shutdown()
+    parallel_splitter.initialize_worker(100)
+    splitter.executor = CountingExecutor()
+    yield splitter
+    splitter.close()
+
+
+def pages(count: int):
+    texts = [
+        " ".join(f"Sentence {n} of page {page_num}." for n in range(40))
+        for page_num in range(count)
+    ]
+    offsets = [sum(len(text) for text in texts[:page_num]) for page_num in range(count)]
+    return [
+        Page(page_num=page_num, offset=offset, text=text)
+        for page_num, (offset, text) in enumerate(zip(offsets, texts))
+    ]
+
+
+def test_the_chunks_are_the_ones_of_the_sequential_splitter(splitter):
+    document = pages(10)
+
+    assert list(splitter.split_pages(document)) == list(
+        SentenceTextSplitter(max_tokens_per_section=100).split_pages(document)
+    )
+
+
+def test_the_tasks_in_flight_are_bounded(splitter):
+    chunks = splitter.split_pages(pages(20))
+
+    next(chunks)
+
+    assert splitter.executor.max_unconsumed == splitter.max_tasks_in_flight == 4
+    assert len(list(chunks)) > 4 * 2
+    assert splitter.executor.max_unconsumed == 4
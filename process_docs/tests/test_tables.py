@@ -0,0 +1,70 @@
+import pytest
+
+from features.ingestion.pipeline import CLEAN_PATTERN, clean_text
+from features.splitters import PageLocator, SentenceTextSplitter
+from features.splitters.textsplitter import find_unclosed_table
+from features.parsers import Page
+
+MARKDOWN_TABLE = "\n| Year | Cases |\n|---|---|\n| 2020 | 12 |\n| 2021 | 15 |\n"
+TSV_TABLE = "\nYear\tCases\n2020\t12\n\t15\n"
+
+
+def test_html_text_is_flattened_as_before():
+    text = "Results\n<table><tr><td>2020</td></tr></table>\\n<!-- note -->\nEnd."
+    expected = CLEAN_PATTERN.sub(" ", text).strip().replace("\n", " ")
+    assert clean_text(text) == expected
+    assert "\n" not in clean_text(text, "html")
+
+
+@pytest.mark.parametrize(
+    "table_format, table",
+    [("markdown", MARKDOWN_TABLE), ("tsv", TSV_TABLE)],
+)
+def test_table_rows_are_not_flattened(table_format, table):
+    text = "The cases\nper <b>year</b>:" + table + "Cases grow\nevery year."
+
+    cleaned = clean_text(text, table_format)
+
+    assert cleaned.split("\n") == [
+        "The cases per  year :",
+        *table.strip("\n").split("\n"),
+        "Cases grow every year.",
+    ]
+
+
+@pytest.mark.parametrize(
+    "table_format, text, expected",
+    [
+        ("html", "Intro <table><tr><td>1", 6),
+        ("html", "Intro <table><tr><td>1</td></tr></table> end", -1),
+        ("markdown", "Intro" + MARKDOWN_TABLE[:-6], 6),
+        ("markdown", "Intro" + MARKDOWN_TABLE, 6),
+        ("markdown", "Intro" + MARKDOWN_TABLE + "Outro", -1),
+        ("tsv", "Intro" + TSV_TABLE[:-3], 6),
+        ("tsv", "Intro" + TSV_TABLE + "Outro", -1),
+        ("tsv", "Intro <table><tr><td>1", -1),
+    ],
+)
+def test_find_unclosed_table(table_format, text, expected):
+    assert find_unclosed_table(text, table_format) == expected
+
+
+@pytest.mark.parametrize("table_format", ["markdown", "tsv"])
+def test_next_section_starts_with_the_unclosed_table(table_format):
+    rows = [f"| {n} | value {n} |" for n in range(200)]
+    if table_format == "tsv":
+        rows = [f"{n}\tvalue {n}" for n in range(200)]
+    table = "\n" + "\n".join(rows) + "\n"
+    text = "Some prose before the table. " * 30 + table + "And after it."
+    table_start = text.index(table) + 1
+    splitter = SentenceTextSplitter(table_format=table_format)
+
+    sections = list(
+        splitter.section_ranges(
+            text, PageLocator([Page(page_num=0, offset=0, text=text)])
+        )
+    )
+
+    # The start of the next section goes back to the last sentence ending before the table
+    assert sections[0][1] > table_start
+    assert table_start - splitter.sentence_search_limit <= sections[1][0] <= table_start